@@ -0,0 +1,121 @@
+"""
+Compara o insert_or_update atual com a versão anterior (read_sql + to_sql +
+um UPDATE por município) num ano sintético de 5.570 municípios, em SQLite.
+
+    python -m benchmarks.bench_insert_or_update
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+for variavel in ("DB_USER", "DB_PASS", "DB_HOST"):
+    os.environ.setdefault(variavel, "")
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database import Base, ProducaoMunicipios
+from src.view import insert_or_update
+
+ANO = 2020
+TOTAL_MUNICIPIOS = 5570
+
+# a versão anterior envia tipos numpy direto ao driver
+sqlite3.register_adapter(np.int64, int)
+
+
+def insert_or_update_legado(year, df_atualizado, db: Session) -> None:
+    consulta = (
+        db.query(ProducaoMunicipios).filter(ProducaoMunicipios.pm_ano == year).statement
+    )
+    df = pd.read_sql(consulta, db.bind)
+    if df.empty:
+        df_atualizado.to_sql(
+            "producao_municipios", db.bind, if_exists="append", index=False
+        )
+        return
+
+    df_insert = df_atualizado[
+        ~df_atualizado["pm_municipio_id"].isin(df["pm_municipio_id"])
+    ]
+    if not df_insert.empty:
+        df_insert.to_sql(
+            "producao_municipios", db.bind, if_exists="append", index=False
+        )
+
+    df_update = df_atualizado.merge(
+        df, on="pm_municipio_id", how="inner", suffixes=("_novo", "_database")
+    )
+    df_update_diff = df_update[
+        (df_update["pm_area_novo"] != df_update["pm_area_database"])
+        | (df_update["pm_quantidade_novo"] != df_update["pm_quantidade_database"])
+    ]
+    for index, row in df_update_diff.iterrows():
+        db.query(ProducaoMunicipios).filter(
+            ProducaoMunicipios.pm_municipio_id == row["pm_municipio_id"],
+            ProducaoMunicipios.pm_ano == row["pm_ano_database"],
+        ).update(
+            {"pm_area": row["pm_area_novo"], "pm_quantidade": row["pm_quantidade_novo"]}
+        )
+    db.commit()
+
+
+def ano_sintetico(semente: int) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame(
+        {
+            "pm_municipio_id": np.arange(1100000, 1100000 + TOTAL_MUNICIPIOS),
+            "pm_ano": ANO,
+            "pm_area": rng.integers(0, 500_000, TOTAL_MUNICIPIOS),
+            "pm_quantidade": rng.integers(0, 1_500_000, TOTAL_MUNICIPIOS),
+        }
+    )
+
+
+def medir(funcao, cenarios):
+    with tempfile.TemporaryDirectory() as diretorio:
+        engine = create_engine(f"sqlite:///{diretorio}/bench.sqlite3")
+        Base.metadata.create_all(engine)
+        instrucoes = []
+        event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda *args, **kwargs: instrucoes.append(1),
+        )
+        db = sessionmaker(bind=engine)()
+        resultados = []
+        for nome, df in cenarios:
+            instrucoes.clear()
+            inicio = time.perf_counter()
+            funcao(ANO, df.copy(), db)
+            resultados.append((nome, time.perf_counter() - inicio, len(instrucoes)))
+        db.close()
+        engine.dispose()
+    return resultados
+
+
+def main():
+    carga_inicial = ano_sintetico(1)
+    reprocessamento = carga_inicial.copy()
+    alterados = reprocessamento.sample(frac=0.1, random_state=2).index
+    reprocessamento.loc[alterados, "pm_quantidade"] += 1
+    cenarios = [
+        ("carga inicial", carga_inicial),
+        ("10% alterados", reprocessamento),
+        ("sem alterações", reprocessamento),
+    ]
+
+    print(f"{'cenário':<16}{'função':<26}{'tempo (ms)':>12}{'instruções':>12}")
+    for funcao in (insert_or_update_legado, insert_or_update):
+        for nome, segundos, instrucoes in medir(funcao, cenarios):
+            print(
+                f"{nome:<16}{funcao.__name__:<26}{segundos * 1000:>12.1f}{instrucoes:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
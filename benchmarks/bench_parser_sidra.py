@@ -0,0 +1,116 @@
+"""
+Compara a leitura atual do retorno do SIDRA (json + pydantic + DataFrame de
+13 colunas) com o LeitorSidra, num ano sintético de 5.570 municípios montado a
+partir das fixtures de tests/.
+
+    python -m benchmarks.bench_parser_sidra
+"""
+
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+from src.parser_sidra import ColunasSidra, ler_retorno_sidra
+from src.schemas import RetornoConsultaPlantacoes
+
+TOTAL_MUNICIPIOS = 5570
+REPETICOES = 5
+TAMANHO_BLOCO = 64 * 1024
+
+
+def payload_sintetico(fixture: str) -> bytes:
+    with open(f"./tests/{fixture}.json") as f:
+        cabecalho, *linhas = json.load(f)
+    retorno = [cabecalho]
+    for i in range(TOTAL_MUNICIPIOS):
+        linha = dict(linhas[i % len(linhas)])
+        linha["D1C"] = str(1100000 + i)
+        retorno.append(linha)
+    return json.dumps(retorno, ensure_ascii=False).encode("utf-8")
+
+
+def caminho_anterior(area: bytes, quantidade: bytes) -> pd.DataFrame:
+    df_area_colhida = pd.DataFrame(
+        RetornoConsultaPlantacoes.model_validate(json.loads(area)).model_dump()
+    )
+    df_quantidade_produzida = pd.DataFrame(json.loads(quantidade))
+
+    df_area_colhida = df_area_colhida.drop(0)
+    df_area_colhida["V"] = (
+        pd.to_numeric(df_area_colhida["V"], errors="coerce").fillna(0).astype(int)
+    )
+    df_area_colhida["D1C"] = (
+        pd.to_numeric(df_area_colhida["D1C"], errors="coerce").fillna(0).astype(int)
+    )
+    df_ac = df_area_colhida.loc[:, ["D1C", "V", "D3C"]].rename(
+        columns={"V": "pm_area", "D1C": "pm_municipio_id", "D3C": "pm_ano"}
+    )
+    df_quantidade_produzida = df_quantidade_produzida.drop(0)
+    df_quantidade_produzida["V"] = (
+        pd.to_numeric(df_quantidade_produzida["V"], errors="coerce")
+        .fillna(0)
+        .astype(int)
+    )
+    df_quantidade_produzida["D1C"] = (
+        pd.to_numeric(df_quantidade_produzida["D1C"], errors="coerce")
+        .fillna(0)
+        .astype(int)
+    )
+    df_qp = df_quantidade_produzida.loc[:, ["D1C", "V"]].rename(
+        columns={"V": "pm_quantidade", "D1C": "pm_municipio_id"}
+    )
+    return df_ac.merge(df_qp, on="pm_municipio_id", how="inner")
+
+
+def caminho_streaming(area: bytes, quantidade: bytes) -> pd.DataFrame:
+    def blocos(conteudo: bytes):
+        for inicio in range(0, len(conteudo), TAMANHO_BLOCO):
+            yield conteudo[inicio : inicio + TAMANHO_BLOCO]
+
+    area_colhida: ColunasSidra = ler_retorno_sidra(blocos(area))
+    quantidade_produzida: ColunasSidra = ler_retorno_sidra(blocos(quantidade))
+    df_ac = pd.DataFrame(
+        {
+            "pm_municipio_id": area_colhida.municipios,
+            "pm_area": area_colhida.valores,
+            "pm_ano": area_colhida.anos,
+        }
+    )
+    df_qp = pd.DataFrame(
+        {
+            "pm_municipio_id": quantidade_produzida.municipios,
+            "pm_quantidade": quantidade_produzida.valores,
+        }
+    )
+    return df_ac.merge(df_qp, on="pm_municipio_id", how="inner")
+
+
+def medir(funcao, area: bytes, quantidade: bytes):
+    inicio = time.perf_counter()
+    for _ in range(REPETICOES):
+        df = funcao(area, quantidade)
+    tempo = (time.perf_counter() - inicio) / REPETICOES
+
+    tracemalloc.start()
+    funcao(area, quantidade)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, tempo, pico
+
+
+def main():
+    area = payload_sintetico("area_colhida")
+    quantidade = payload_sintetico("quantidade_produzida")
+    print(f"payload: {(len(area) + len(quantidade)) / 2**20:.1f} MiB por ano")
+    print(f"{'caminho':<12}{'tempo (ms)':>12}{'pico (MiB)':>12}{'linhas':>8}")
+    for funcao in (caminho_anterior, caminho_streaming):
+        df, tempo, pico = medir(funcao, area, quantidade)
+        print(
+            f"{funcao.__name__[8:]:<12}{tempo * 1000:>12.1f}{pico / 2**20:>12.2f}{len(df):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Montagem da matriz ano x município de quantidade produzida para 1, 100 e 10000
+células, comparando o pivot_table do pandas (implementação anterior) com a
+montagem direta a partir das linhas.
+
+    python -m benchmarks.bench_quantidade_produzida
+"""
+
+import os
+import random
+import statistics
+import time
+
+for variavel in ("DB_USER", "DB_PASS", "DB_HOST"):
+    os.environ.setdefault(variavel, "")
+
+import pandas as pd
+
+from src.view import montar_matriz_quantidades
+
+CELULAS = ((1, 1), (20, 5), (2000, 5))
+REPETICOES = 50
+
+
+def montar_matriz_pivot(linhas):
+    df = pd.DataFrame(
+        linhas, columns=["pm_municipio_id", "pm_ano", "pm_area", "pm_quantidade"]
+    )
+    df_transformado = df.pivot_table(
+        index="pm_ano", columns="pm_municipio_id", values="pm_quantidade"
+    )
+    return df_transformado.to_dict(orient="index")
+
+
+def gerar_linhas(total_municipios: int, total_anos: int):
+    return [
+        (
+            1100000 + municipio,
+            2018 + ano,
+            random.randint(1, 10**5),
+            random.randint(1, 10**7),
+        )
+        for municipio in range(total_municipios)
+        for ano in range(total_anos)
+    ]
+
+
+def medir(funcao, linhas) -> float:
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao(linhas)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def main():
+    print(f"{'células':>8} {'pivot_table (ms)':>18} {'direto (ms)':>12}")
+    for total_municipios, total_anos in CELULAS:
+        linhas = gerar_linhas(total_municipios, total_anos)
+        pivot = medir(montar_matriz_pivot, linhas)
+        direto = medir(montar_matriz_quantidades, linhas)
+        print(f"{len(linhas):>8} {pivot:>18.3f} {direto:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
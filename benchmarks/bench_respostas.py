@@ -0,0 +1,110 @@
+"""
+CPU por requisição para serializar as respostas de leitura: caminho anterior
+(modelos pydantic por linha, model_dump, validação pelo response_model e
+JSONResponse) contra o caminho atual (dicts codificados direto com orjson).
+
+    python -m benchmarks.bench_respostas
+"""
+
+import os
+import time
+from decimal import Decimal
+
+for variavel in ("DB_USER", "DB_PASS", "DB_HOST"):
+    os.environ.setdefault(variavel, "")
+
+from fastapi.responses import JSONResponse
+
+from src.respostas import padrao_retorno
+from src.schemas import (
+    ProducaoMunicipios,
+    ProdutividadePorEstado,
+    RetornoMunicipios,
+    RetornoProdutividades,
+    RetornoQuantidadeProduziaMunicipioPorAno,
+)
+from src.utils import UFS_IBGE
+
+REPETICOES = 2000
+
+
+def municipio_anterior(linhas):
+    dados = [ProducaoMunicipios(**linha) for linha in linhas]
+    conteudo = RetornoMunicipios(
+        success=True, data=[dado.model_dump() for dado in dados]
+    ).model_dump()
+    return JSONResponse(
+        RetornoMunicipios.model_validate(conteudo).model_dump(mode="json")
+    )
+
+
+def produtividade_anterior(linhas):
+    dados = [
+        ProdutividadePorEstado(
+            estado=linha["estado"], produtividade=float(linha["produtividade"])
+        )
+        for linha in linhas
+    ]
+    conteudo = RetornoProdutividades(
+        success=True, data=[dado.model_dump() for dado in dados]
+    ).model_dump()
+    return JSONResponse(
+        RetornoProdutividades.model_validate(conteudo).model_dump(mode="json")
+    )
+
+
+def matriz_anterior(matriz):
+    conteudo = RetornoQuantidadeProduziaMunicipioPorAno(
+        success=True, data=matriz
+    ).model_dump()
+    return JSONResponse(
+        RetornoQuantidadeProduziaMunicipioPorAno.model_validate(conteudo).model_dump(
+            mode="json"
+        )
+    )
+
+
+def medir(funcao, dados, repeticoes) -> float:
+    inicio = time.process_time()
+    for _ in range(repeticoes):
+        funcao(dados)
+    return (time.process_time() - inicio) / repeticoes * 1e6
+
+
+def main():
+    municipio = [
+        {
+            "municipio_id": 3550308,
+            "ano": ano,
+            "area_colhida": 1000 + ano,
+            "quantidade_produzida": 30000 + ano,
+        }
+        for ano in range(2018, 2024)
+    ]
+    produtividade = [
+        {"estado": sigla, "produtividade": Decimal(repr(3.1234567 * codigo))}
+        for codigo, sigla in UFS_IBGE.items()
+    ]
+    matriz = {
+        ano: {1100000 + municipio: municipio * ano for municipio in range(2000)}
+        for ano in range(2018, 2023)
+    }
+    casos = (
+        ("municipio (6 linhas)", municipio_anterior, municipio, REPETICOES),
+        (
+            "produtividade (27 estados)",
+            produtividade_anterior,
+            produtividade,
+            REPETICOES,
+        ),
+        ("quantidade_produzida (10000 células)", matriz_anterior, matriz, 20),
+    )
+    print(f"{'resposta':<38} {'anterior (µs)':>14} {'orjson (µs)':>12}")
+    for nome, anterior, dados, repeticoes in casos:
+        antes = medir(anterior, dados, repeticoes)
+        depois = medir(padrao_retorno, dados, repeticoes)
+        print(f"{nome:<38} {antes:>14.1f} {depois:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
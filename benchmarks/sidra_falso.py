@@ -0,0 +1,167 @@
+"""
+Servidor HTTP local que imita a API do SIDRA (tabela 5457) para os benchmarks.
+
+Gera, de forma determinística, o retorno de cada variável/ano para os
+municípios de scripts_db.py/dct_municipio_uf.csv, com o mesmo formato e
+tamanho do retorno real (inclusive linhas "-" e "..."). Responde ETag e 304.
+Incrementar `rodada` muda todos os valores, simulando uma revisão do IBGE.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# não importa src.municipios: isso montaria o engine de src.database antes de
+# o benchmark configurar o ambiente
+ARQUIVO_MUNICIPIOS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts_db.py",
+    "dct_municipio_uf.csv",
+)
+# n6/all ou uma UF (n6/in n3 XX, com SIDRA_POR_UF=1)
+_ROTA = re.compile(
+    r"^/values/t/5457/n6/(?:all|in%20n3%20(\d{2}))/v/(\d+)/p/(\d+)/c782/40124"
+)
+_VARIAVEIS = {
+    "214": ("Quantidade produzida", "1017", "Toneladas"),
+    "216": ("Área colhida", "1006", "Hectares"),
+}
+_CABECALHO = {
+    "NC": "Nível Territorial (Código)",
+    "NN": "Nível Territorial",
+    "MC": "Unidade de Medida (Código)",
+    "MN": "Unidade de Medida",
+    "V": "Valor",
+    "D1C": "Município (Código)",
+    "D1N": "Município",
+    "D2C": "Variável (Código)",
+    "D2N": "Variável",
+    "D3C": "Ano (Código)",
+    "D3N": "Ano",
+    "D4C": "Produto das lavouras temporárias e permanentes (Código)",
+    "D4N": "Produto das lavouras temporárias e permanentes",
+}
+
+
+def carregar_municipios() -> List[Tuple[int, str, str]]:
+    with open(ARQUIVO_MUNICIPIOS, encoding="iso-8859-1", newline="") as arquivo:
+        return [
+            (int(linha["id_municipio_ibge"]), linha["nm_municipio"], linha["sg_uf"])
+            for linha in csv.DictReader(arquivo, delimiter=";")
+        ]
+
+
+def valor(municipio_id: int, variavel: str, ano: int, rodada: int) -> str:
+    aleatorio = random.Random(f"{municipio_id}-{ano}-{rodada}")
+    sorteio = aleatorio.random()
+    if sorteio < 0.3:
+        return "-"
+    if sorteio < 0.32:
+        return "..."
+    area = aleatorio.randint(1, 200000)
+    if variavel == "216":
+        return str(area)
+    return str(int(area * aleatorio.uniform(2.5, 4)))
+
+
+def gerar_retorno(
+    municipios: List[Tuple[int, str, str]], variavel: str, ano: int, rodada: int
+) -> bytes:
+    nome_variavel, codigo_unidade, unidade = _VARIAVEIS[variavel]
+    linhas = [_CABECALHO] + [
+        {
+            "NC": "6",
+            "NN": "Município",
+            "MC": codigo_unidade,
+            "MN": unidade,
+            "V": valor(municipio_id, variavel, ano, rodada),
+            "D1C": str(municipio_id),
+            "D1N": f"{nome} - {uf}",
+            "D2C": variavel,
+            "D2N": nome_variavel,
+            "D3C": str(ano),
+            "D3N": str(ano),
+            "D4C": "40124",
+            "D4N": "Soja (em grão)",
+        }
+        for municipio_id, nome, uf in municipios
+    ]
+    return json.dumps(linhas, ensure_ascii=False, indent=1).encode()
+
+
+class SidraFalso:
+    def __init__(self, municipios: List[Tuple[int, str, str]]):
+        self.municipios = municipios
+        self.rodada = 1
+        self.requisicoes = 0
+        self._retornos: Dict[tuple, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._tratador())
+        self._thread = threading.Thread(
+            target=self._servidor.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address
+        return f"http://{host}:{porta}"
+
+    def retorno(
+        self, variavel: str, ano: int, uf: Optional[str] = None
+    ) -> Tuple[bytes, str]:
+        chave = (variavel, ano, self.rodada, uf)
+        with self._lock:
+            if chave not in self._retornos:
+                municipios = [
+                    municipio
+                    for municipio in self.municipios
+                    if uf is None or str(municipio[0]).startswith(uf)
+                ]
+                corpo = gerar_retorno(municipios, variavel, ano, self.rodada)
+                etag = f'"{hashlib.sha256(corpo).hexdigest()[:16]}"'
+                self._retornos[chave] = (corpo, etag)
+            return self._retornos[chave]
+
+    def _tratador(self):
+        sidra = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                sidra.requisicoes += 1
+                rota = _ROTA.match(self.path)
+                if rota is None or rota.group(2) not in _VARIAVEIS:
+                    self.send_error(404)
+                    return
+                corpo, etag = sidra.retorno(
+                    rota.group(2), int(rota.group(3)), rota.group(1)
+                )
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        return Tratador
+
+    def iniciar(self) -> "SidraFalso":
+        self._thread.start()
+        return self
+
+    def encerrar(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -4,7 +4,9 @@ load_dotenv()
 import logging
 
 
+from contextlib import asynccontextmanager
 from typing import List
+from databases import Database
 from fastapi import FastAPI, Depends, HTTPException, Path, Query
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
@@ -12,13 +14,28 @@ from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from datetime import datetime
 from starlette import status
-from starlette.responses import RedirectResponse
-
-from src.autenticacao_jwt import create_jwt_token, decode_jwt_token, oauth2_scheme
-from src.exceptions import ProcessamentoException
-from src.utils import validar_solicitacao
-from src.database import get_db
+from starlette.responses import RedirectResponse, StreamingResponse
+
+from src.autenticacao_jwt import chaves_jwt, create_jwt_token, decode_jwt_token
+from src.compartilhado import dados_compartilhados
+from src.cache_http import CondicaoCache, ano_da_rota, cache_http
+from src.respostas import padrao_retorno, padrao_retorno_em_partes
+from src.exportacao import (
+    TIPOS_CONTEUDO,
+    estados_invalidos,
+    exportar_producao,
+    parquet_disponivel,
+)
+from src.utils import LIMITE_MUNICIPIOS, codigos_uf, validar_solicitacao
+from src.database import SessionLocal, database, engine, get_database, get_db
+from src.metricas import instrumentar, resposta_metricas
+from src.migracoes import aplicar_migracoes
+from src.municipios import carregar_municipios
+from src.produtos import PRODUTO_PADRAO, get_municipio_produto
+from src.analises import JANELA_PADRAO
 from src.schemas import (
+    FormatoExportacao,
+    InputLoteMunicipios,
     PadraoRetorno,
     ProdutividadeAnoEstados,
     RetornoProdutividades,
@@ -26,22 +43,72 @@ from src.schemas import (
     InputAnosMunicipios,
     RetornoQuantidadeProduziaMunicipioPorAno,
     RetornoAreaColhida,
+    RetornoAnalise,
 )
+from src.cache import cache_municipios
+from src.tarefas import fila_tarefas
+from src.versoes import versoes_dados, versoes_produtos
 from src.view import (
+    aquecer_cache,
+    get_analise,
+    obter_matriz_analises,
+    carregar_motor_memoria,
     get_municipio,
-    processar_dados_plantacoes,
     delete,
     get_municipio_por_ano,
     get_produtividade_estados_por_ano,
     get_municipios_quantidade_produzida,
-    processar_dados_plantacoes_por_ano,
+    get_producao_em_lote,
 )
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    chaves_jwt.carregar()
+    if dados_compartilhados.ativo:
+        # worker de src.servidor: o processo principal prepara o banco, publica
+        # os dados e executa as tarefas
+        dados_compartilhados.sincronizar(forcar=True)
+        await database.connect()
+        fila_tarefas.iniciar(executar=False)
+    else:
+        aplicar_migracoes(engine)
+        with SessionLocal() as db:
+            carregar_municipios(db)
+            versoes_dados.carregar(db)
+            versoes_produtos.carregar(db)
+        await database.connect()
+        await carregar_motor_memoria(database)
+        await aquecer_cache(database)
+        await obter_matriz_analises(database)
+        fila_tarefas.iniciar()
+    yield
+    fila_tarefas.encerrar()
+    await database.disconnect()
+
+
+app = FastAPI(lifespan=lifespan)
+instrumentar(app, engine, database)
+
+if dados_compartilhados.ativo:
+
+    @app.middleware("http")
+    async def sincronizar_dados(request, call_next):
+        dados_compartilhados.sincronizar()
+        return await call_next(request)
+
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 ano_limite = datetime.now().year - 1
+DESCRICAO_PRODUTO = (
+    "Código do produto na classificação 782 do SIDRA (padrão 40124, soja em grão;"
+    " os demais produtos vêm da carga configurada em PRODUTOS_SIDRA)"
+)
+DESCRICAO_SUBSTITUIR = (
+    "Troca o ano inteiro pelo retorno do SIDRA de uma vez, mesmo sem mudanças"
+    " desde a última carga; municípios que não vieram são removidos"
+)
 
 
 @app.exception_handler(Exception)
@@ -73,6 +140,14 @@ def redirect():
     return RedirectResponse(url="/docs")
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    resposta = resposta_metricas()
+    if resposta is None:
+        raise HTTPException(status_code=404, detail="Métricas desativadas")
+    return resposta
+
+
 @app.post("/token")
 def login(request_form_user: OAuth2PasswordRequestForm = Depends()):
     """
@@ -96,35 +171,32 @@ def login(request_form_user: OAuth2PasswordRequestForm = Depends()):
 @app.post(
     "/municipio/processar",
     tags=["Processamento - municípios"],
-    summary=f"Processa os dados de municípios brasileiros de 2018 até {datetime.now().year - 1}",
+    summary=f"Agenda o processamento dos dados de municípios brasileiros de 2018 até {datetime.now().year - 1}",
     response_model=PadraoRetorno,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 def processar_dados(
-    db: Session = Depends(get_db), jwt_token: str = Depends(decode_jwt_token)
+    substituir: bool = Query(False, description=DESCRICAO_SUBSTITUIR),
+    jwt_token: str = Depends(decode_jwt_token),
 ):
-    try:
-        processar_dados_plantacoes(db)
-        PadraoRetorno(
-            success=True,
-            data=None,
-            message=f"Dados processados com sucesso de 2018 até {datetime.now().year - 1}",
-        ).model_dump()
-    except ProcessamentoException as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    except Exception as e:
-        logger.error(e)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro ao processar dados",
-        )
-    return
+    """
+    Agenda o processamento de todos os anos em segundo plano. O andamento é
+    consultado em /tarefas/{tarefa_id}.
+    """
+    tarefa = fila_tarefas.criar(range(2018, ano_limite + 1), substituir)
+    return PadraoRetorno(
+        success=True,
+        data=[tarefa.model_dump(mode="json")],
+        message=f"Processamento agendado de 2018 até {ano_limite}",
+    ).model_dump()
 
 
 @app.post(
     "/municipio/processar/{ano}",
     tags=["Processamento - municípios"],
-    summary="Processa os dados de municípios brasileiros em um ano",
+    summary="Agenda o processamento dos dados de municípios brasileiros em um ano",
     response_model=PadraoRetorno,
+    status_code=status.HTTP_202_ACCEPTED,
 )
 def processar_dados_por_ano(
     ano: int = Path(
@@ -133,24 +205,38 @@ def processar_dados_por_ano(
         ge=2018,
         le=datetime.now().year - 1,
     ),
-    db: Session = Depends(get_db),
+    substituir: bool = Query(False, description=DESCRICAO_SUBSTITUIR),
     jwt_token: str = Depends(decode_jwt_token),
 ):
-    try:
-        processar_dados_plantacoes_por_ano(ano, db)
-        return PadraoRetorno(
-            success=True,
-            data=None,
-            message=f"Dados processados com sucesso para o ano {ano}",
-        ).model_dump()
-    except ProcessamentoException as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    except Exception as e:
-        logger.error(e)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro ao processar dados",
-        )
+    """
+    Agenda o processamento de um ano em segundo plano. O andamento é
+    consultado em /tarefas/{tarefa_id}.
+    """
+    tarefa = fila_tarefas.criar([ano], substituir)
+    return PadraoRetorno(
+        success=True,
+        data=[tarefa.model_dump(mode="json")],
+        message=f"Processamento agendado para o ano {ano}",
+    ).model_dump()
+
+
+@app.get(
+    "/tarefas/{tarefa_id}",
+    tags=["Processamento - municípios"],
+    summary="Retorna o andamento de uma tarefa de processamento",
+    response_model=PadraoRetorno,
+)
+def consultar_tarefa(tarefa_id: str, jwt_token: str = Depends(decode_jwt_token)):
+    """
+    Retorna a situação da tarefa e, para cada ano, a situação, as linhas
+    inseridas/atualizadas/inalteradas e os tempos de execução.
+    """
+    tarefa = fila_tarefas.consultar(tarefa_id)
+    if tarefa is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return PadraoRetorno(
+        success=True, data=[tarefa.model_dump(mode="json")]
+    ).model_dump()
 
 
 @app.delete(
@@ -164,7 +250,7 @@ def deletar_dados_de_um_ano(
         ..., description="Ano de produção (até 4 dígitos)", ge=2018, le=ano_limite
     ),
     db: Session = Depends(get_db),
-    jwt_token: str = Depends(oauth2_scheme),
+    jwt_token: str = Depends(decode_jwt_token),
 ):
     if ano < 2018 or ano >= 2024:
         raise HTTPException(
@@ -177,24 +263,39 @@ def deletar_dados_de_um_ano(
     ).model_dump()
 
 
+@app.get(
+    "/cache/estatisticas",
+    tags=["Monitoramento"],
+    summary="Retorna os contadores do cache de municípios",
+    response_model=PadraoRetorno,
+)
+async def estatisticas_cache():
+    return PadraoRetorno(
+        success=True, data=[cache_municipios.estatisticas()]
+    ).model_dump()
+
+
 @app.get(
     "/municipio/{codigo_municipio}",
     tags=["Municípios"],
     summary="Retorna os dados de um município",
     response_model=RetornoMunicipios,
 )
-def consulta_dados_de_um_municipio(
+async def consulta_dados_de_um_municipio(
     codigo_municipio: int = Path(
         ..., description="Código do município (até 7 dígitos)"
     ),
-    db: Session = Depends(get_db),
+    produto: int = Query(PRODUTO_PADRAO, description=DESCRICAO_PRODUTO),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("municipio", produtos=True)),
 ):
-    municipios = get_municipio(codigo_municipio, db)
-    if not municipios:
-        raise HTTPException(status_code=404, detail="Municipio não encontrado")
-    return RetornoMunicipios(
-        success=True, data=[municipio.model_dump() for municipio in municipios.dados]
-    ).model_dump()
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    if produto != PRODUTO_PADRAO:
+        dados = await get_municipio_produto(produto, codigo_municipio, database)
+    else:
+        dados = await get_municipio(codigo_municipio, database)
+    return cache.aplicar(padrao_retorno(dados))
 
 
 @app.get(
@@ -203,21 +304,31 @@ def consulta_dados_de_um_municipio(
     response_model=RetornoMunicipios,
     summary="Retorna os dados de um município brasileiro em um ano",
 )
-def consulta_um_municipio_por_ano(
+async def consulta_um_municipio_por_ano(
     ano: int = Path(
         ..., description="Ano de produção (até 4 dígitos)", ge=2018, le=ano_limite
     ),
     codigo_municipio: int = Path(
         ..., description="Código do município (até 7 dígitos)"
     ),
-    db: Session = Depends(get_db),
+    produto: int = Query(PRODUTO_PADRAO, description=DESCRICAO_PRODUTO),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(
+        cache_http("municipio_ano", ano_da_rota, produtos=True)
+    ),
 ):
-    municipio = get_municipio_por_ano(ano, codigo_municipio, db)
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    if produto != PRODUTO_PADRAO:
+        municipio = next(
+            iter(await get_municipio_produto(produto, codigo_municipio, database, ano)),
+            None,
+        )
+    else:
+        municipio = await get_municipio_por_ano(ano, codigo_municipio, database)
     if not municipio:
         raise HTTPException(status_code=404, detail="Municipio não encontrado")
-    return RetornoMunicipios(
-        success=True, data=[municipio.dados[0].model_dump()]
-    ).model_dump()
+    return cache.aplicar(padrao_retorno([municipio]))
 
 
 @app.get(
@@ -226,14 +337,15 @@ def consulta_um_municipio_por_ano(
     summary="Retorna a área colhida de um município brasileiro em um ano",
     response_model=RetornoAreaColhida,
 )
-def consulta_area_colhida(
+async def consulta_area_colhida(
     ano: int = Path(
         ..., description="Ano de produção (até 4 dígitos)", ge=2018, le=ano_limite
     ),
     codigo_municipio: int = Path(
         ..., description="Código do município (até 7 dígitos)"
     ),
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("area_colhida", ano_da_rota)),
 ):
     """
     Endpoint para retornar o valor de área colhida informando UM município brasileiro em UM ano
@@ -243,13 +355,13 @@ def consulta_area_colhida(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Valide os valores informados",
         )
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
 
-    municipio = get_municipio_por_ano(ano, codigo_municipio, db)
+    municipio = await get_municipio_por_ano(ano, codigo_municipio, database)
     if not municipio:
         raise HTTPException(status_code=404, detail="Municipio não encontrado")
-    return RetornoAreaColhida(
-        success=True, data={"area_colhida": municipio.dados[0].area_colhida}
-    ).model_dump()
+    return cache.aplicar(padrao_retorno({"area_colhida": municipio["area_colhida"]}))
 
 
 @app.get(
@@ -258,14 +370,15 @@ def consulta_area_colhida(
     summary="Retorna a produtividade de estados brasileiros em um ano",
     response_model=RetornoProdutividades,
 )
-def produtividade_estados_ano(
+async def produtividade_estados_ano(
     ano: int = Path(
         ..., description="Ano de produção (até 4 dígitos)", ge=2018, le=ano_limite
     ),
     estados: List[str] = Query(
         None, description="Lista de siglas de estado. Ex: ['SC', 'RS', 'PR']"
     ),
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("produtividade", ano_da_rota)),
 ):
     """
     Endpoint para retornar o(s) valor(es) de produtividade informando UM ou MAIS
@@ -281,42 +394,223 @@ def produtividade_estados_ano(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Valide os valores informados",
         )
-    dados = get_produtividade_estados_por_ano(
-        ProdutividadeAnoEstados(ano=ano, estados=estados), db
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    dados = await get_produtividade_estados_por_ano(
+        ProdutividadeAnoEstados(ano=ano, estados=estados), database
     )
     if not dados:
         raise HTTPException(status_code=404, detail="Dados não encontrados")
-    return RetornoProdutividades(
-        success=True, data=[dado.model_dump() for dado in dados]
-    ).model_dump()
+    return cache.aplicar(padrao_retorno(dados))
+
+
+DESCRICAO_JANELA = "Anos da média móvel da quantidade produzida"
+
+
+async def _responder_analise(
+    nivel: str,
+    codigo,
+    ano_inicio: int,
+    ano_fim: int,
+    janela: int,
+    database: Database,
+    cache: CondicaoCache,
+):
+    if ano_inicio > ano_fim:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Valide os valores informados",
+        )
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    dados = await get_analise(nivel, codigo, ano_inicio, ano_fim, janela, database)
+    if dados is None:
+        raise HTTPException(status_code=404, detail="Dados não encontrados")
+    return cache.aplicar(padrao_retorno([dados]))
+
+
+@app.get(
+    "/analises/municipio/{codigo_municipio}",
+    tags=["Análises"],
+    summary="Retorna a série anual de um município com variação, produtividade, média móvel e CAGR",
+    response_model=RetornoAnalise,
+)
+async def analise_municipio(
+    codigo_municipio: int = Path(
+        ..., description="Código do município (até 7 dígitos)"
+    ),
+    ano_inicio: int = Query(2018, ge=2018, le=ano_limite),
+    ano_fim: int = Query(ano_limite, ge=2018, le=ano_limite),
+    janela: int = Query(JANELA_PADRAO, ge=2, le=10, description=DESCRICAO_JANELA),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("analises")),
+):
+    return await _responder_analise(
+        "municipio", codigo_municipio, ano_inicio, ano_fim, janela, database, cache
+    )
+
+
+@app.get(
+    "/analises/uf/{uf}",
+    tags=["Análises"],
+    summary="Retorna a série anual somada de um estado com variação, produtividade, média móvel e CAGR",
+    response_model=RetornoAnalise,
+)
+async def analise_uf(
+    uf: str = Path(..., description="Sigla do estado. Ex: SC"),
+    ano_inicio: int = Query(2018, ge=2018, le=ano_limite),
+    ano_fim: int = Query(ano_limite, ge=2018, le=ano_limite),
+    janela: int = Query(JANELA_PADRAO, ge=2, le=10, description=DESCRICAO_JANELA),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("analises")),
+):
+    if uf.upper() not in codigos_uf:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Valide os valores informados",
+        )
+    return await _responder_analise(
+        "uf", codigos_uf[uf.upper()], ano_inicio, ano_fim, janela, database, cache
+    )
+
+
+@app.get(
+    "/analises/brasil",
+    tags=["Análises"],
+    summary="Retorna a série anual somada do país com variação, produtividade, média móvel e CAGR",
+    response_model=RetornoAnalise,
+)
+async def analise_brasil(
+    ano_inicio: int = Query(2018, ge=2018, le=ano_limite),
+    ano_fim: int = Query(ano_limite, ge=2018, le=ano_limite),
+    janela: int = Query(JANELA_PADRAO, ge=2, le=10, description=DESCRICAO_JANELA),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("analises")),
+):
+    return await _responder_analise(
+        "brasil", None, ano_inicio, ano_fim, janela, database, cache
+    )
 
 
-# @todo forma diferente de fazer a consulta com um payload muito complexo/grande
 @app.post(
     "/municipios/quantidade_produzida",
     tags=["Municípios"],
     summary="Retorna os dados de quantidade produzida de municípios brasileiros em anos",
     response_model=RetornoQuantidadeProduziaMunicipioPorAno,
 )
-def quantidade_produzida_municipios_por_ano(
-    dados: InputAnosMunicipios, db: Session = Depends(get_db)
+async def quantidade_produzida_municipios_por_ano(
+    dados: InputAnosMunicipios, database: Database = Depends(get_database)
 ):
     """
     Endpoint para retornar múltiplos valores de “quantidade produzida” informando UM ou MAIS municípios E UM ou MAIS anos.
-    Limite para consulta de 100 dados simultaneamente. Isto é, a combinação de municípios e anos não resulte em mais do que 100 informações.
+    Limite para consulta de 10000 dados simultaneamente. Isto é, a combinação de municípios e anos não resulte em mais do que 10000 informações.
     Por exemplo:<br>
-    100 municípios com 1 ano = 100 dados<br>
-    20 municípios com 5 anos = 100 dados<br>
+    10000 municípios com 1 ano = 10000 dados<br>
+    2000 municípios com 5 anos = 10000 dados<br>
     1 município para 5 anos = 5 dados<br>
 
     """
     validar_solicitacao(dados)
-    resultado = get_municipios_quantidade_produzida(dados, db)
+    resultado = await get_municipios_quantidade_produzida(dados, database)
     if not resultado:
         raise HTTPException(status_code=404, detail="Dados não encontrados")
-    return RetornoQuantidadeProduziaMunicipioPorAno(
-        success=True, data=resultado
-    ).model_dump()
+    return padrao_retorno(resultado)
+
+
+@app.post(
+    "/municipios/producao",
+    tags=["Municípios"],
+    summary="Retorna área colhida e quantidade produzida de vários municípios em um intervalo de anos",
+    response_model=RetornoMunicipios,
+)
+async def producao_municipios_em_lote(
+    dados: InputLoteMunicipios, database: Database = Depends(get_database)
+):
+    """
+    Endpoint para retornar área colhida e quantidade produzida de UMA lista de
+    municípios OU de todos os municípios de UMA UF, em um intervalo de anos.
+    Limite de 10000 municípios por solicitação. O resultado é enviado em partes,
+    no mesmo formato de /municipio/{codigo_municipio}.
+
+    Parâmetros:
+    - **municipios**: Lista de códigos de município. Ex: [1100015, 1100023]
+    - **uf**: Sigla da UF, no lugar de municipios. Ex: "RO"
+    - **ano_inicio** / **ano_fim**: intervalo de anos, inclusivo.
+
+    """
+    ano_fim = ano_limite if dados.ano_fim is None else dados.ano_fim
+    if (
+        (dados.municipios is None) == (dados.uf is None)
+        or (dados.uf is not None and dados.uf not in codigos_uf)
+        or len(dados.municipios or []) > LIMITE_MUNICIPIOS
+        or not 2018 <= dados.ano_inicio <= ano_fim <= ano_limite
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Valide os valores informados",
+        )
+    blocos = get_producao_em_lote(
+        dados.municipios,
+        codigos_uf.get(dados.uf),
+        range(dados.ano_inicio, ano_fim + 1),
+        database,
+    )
+    return StreamingResponse(
+        padrao_retorno_em_partes(blocos), media_type="application/json"
+    )
+
+
+@app.get(
+    "/exportacao/producao",
+    tags=["Exportação"],
+    summary="Exporta a produção dos municípios em NDJSON, CSV ou Parquet",
+    response_class=StreamingResponse,
+)
+async def exportar_producao_municipios(
+    formato: FormatoExportacao = Query(
+        FormatoExportacao.ndjson, description="ndjson, csv ou parquet"
+    ),
+    ano_inicio: int = Query(2018, ge=2018, le=ano_limite),
+    ano_fim: int = Query(ano_limite, ge=2018, le=ano_limite),
+    estados: List[str] = Query(
+        None, description="Lista de siglas de estado. Ex: ['SC', 'RS', 'PR']"
+    ),
+    database: Database = Depends(get_database),
+    cache: CondicaoCache = Depends(cache_http("exportacao")),
+):
+    """
+    Endpoint para exportar os dados de produção de todos os municípios em um
+    intervalo de anos, opcionalmente filtrando por estados. O resultado é
+    enviado em partes, sem carregar a tabela inteira em memória.
+
+    Parâmetros:
+    - **formato**: ndjson (padrão), csv ou parquet (requer pyarrow).
+    - **ano_inicio** / **ano_fim**: intervalo de anos, inclusivo.
+    - **estados**: Lista de siglas de estado. Ex: ['SC', 'RS', 'PR']
+
+    """
+    if ano_inicio > ano_fim or (estados and estados_invalidos(estados)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Valide os valores informados",
+        )
+    if formato == FormatoExportacao.parquet and not parquet_disponivel():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Exportação em parquet requer o pacote pyarrow",
+        )
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    resposta = StreamingResponse(
+        exportar_producao(database, formato, ano_inicio, ano_fim, estados),
+        media_type=TIPOS_CONTEUDO[formato],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="producao_{ano_inicio}_{ano_fim}.{formato.value}"'
+            )
+        },
+    )
+    return cache.aplicar(resposta)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+"""
+Séries anuais de producao_municipios para as rotas /analises.
+
+A MatrizProducao alinha todos os municípios nos mesmos anos (uma linha por
+município, uma coluna por ano, NaN onde não há dado) e já guarda as somas por
+UF e do país. Ela é reconstruída só quando os dados mudam (versões dos anos
+ou troca do snapshot do motor em memória); cada consulta é uma fatia da
+matriz e operações vetorizadas sobre ela.
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.utils import UFS_IBGE
+
+JANELA_PADRAO = 3
+_CAMPOS = (
+    "area_colhida",
+    "quantidade_produzida",
+    "produtividade",
+    "variacao_quantidade",
+    "variacao_percentual",
+    "media_movel_quantidade",
+)
+
+
+def _somar_grupos(valores: np.ndarray, inicios: np.ndarray) -> np.ndarray:
+    """
+    Soma as linhas de cada grupo (linhas contíguas a partir de `inicios`).
+    Células ausentes contam como zero; um ano sem dado no grupo todo fica NaN.
+    """
+    presentes = np.add.reduceat(~np.isnan(valores), inicios, axis=0)
+    somas = np.add.reduceat(np.nan_to_num(valores), inicios, axis=0)
+    somas[presentes == 0] = np.nan
+    return somas
+
+
+class MatrizProducao:
+    def __init__(
+        self,
+        municipios: np.ndarray,
+        anos: np.ndarray,
+        areas: np.ndarray,
+        quantidades: np.ndarray,
+    ):
+        self.municipios = np.unique(municipios)
+        self.anos = np.unique(anos)
+        linhas = np.searchsorted(self.municipios, municipios)
+        colunas = np.searchsorted(self.anos, anos)
+        forma = (len(self.municipios), len(self.anos))
+        self.areas = np.full(forma, np.nan)
+        self.quantidades = np.full(forma, np.nan)
+        self.areas[linhas, colunas] = areas
+        self.quantidades[linhas, colunas] = quantidades
+
+        # municípios ordenados: os de cada UF são linhas contíguas
+        self.ufs, inicios = np.unique(self.municipios // 100000, return_index=True)
+        if len(self.municipios):
+            self.areas_uf = _somar_grupos(self.areas, inicios)
+            self.quantidades_uf = _somar_grupos(self.quantidades, inicios)
+            self.areas_brasil = _somar_grupos(self.areas, np.array([0]))[0]
+            self.quantidades_brasil = _somar_grupos(self.quantidades, np.array([0]))[0]
+        else:
+            self.areas_uf = self.quantidades_uf = np.empty((0, 0))
+            self.areas_brasil = self.quantidades_brasil = np.empty(0)
+
+    @classmethod
+    def de_linhas(cls, linhas: Sequence[tuple]) -> "MatrizProducao":
+        """Linhas (municipio, ano, area, quantidade)."""
+        colunas = np.array(linhas, dtype=np.float64).reshape(-1, 4)
+        return cls(
+            colunas[:, 0].astype(np.int64),
+            colunas[:, 1].astype(np.int64),
+            colunas[:, 2],
+            colunas[:, 3],
+        )
+
+    @classmethod
+    def de_snapshot(cls, snapshot) -> "MatrizProducao":
+        return cls(
+            np.asarray(snapshot.municipios, dtype=np.int64),
+            np.asarray(snapshot.anos, dtype=np.int64),
+            np.asarray(snapshot.areas, dtype=np.float64),
+            np.asarray(snapshot.quantidades, dtype=np.float64),
+        )
+
+    def serie(
+        self, nivel: str, codigo: Optional[int] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(áreas, quantidades) por ano de um município, de uma UF ou do país."""
+        if nivel == "brasil":
+            return (
+                (self.areas_brasil, self.quantidades_brasil) if len(self.anos) else None
+            )
+        if nivel == "uf":
+            referencia, areas, quantidades = (
+                self.ufs,
+                self.areas_uf,
+                self.quantidades_uf,
+            )
+        else:
+            referencia, areas, quantidades = (
+                self.municipios,
+                self.areas,
+                self.quantidades,
+            )
+        i = int(np.searchsorted(referencia, codigo))
+        if i == len(referencia) or referencia[i] != codigo:
+            return None
+        return areas[i], quantidades[i]
+
+
+def indicadores(
+    anos: np.ndarray, areas: np.ndarray, quantidades: np.ndarray, janela: int
+) -> Dict[str, np.ndarray]:
+    """
+    Produtividade, variação em relação ao ano anterior e média móvel da
+    quantidade em `janela` anos, para uma série (1-D) ou várias (2-D, uma por
+    linha). A variação e a média móvel só usam anos consecutivos.
+    """
+    areas = np.atleast_2d(areas)
+    quantidades = np.atleast_2d(quantidades)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        produtividade = np.where(areas > 0, quantidades / areas, np.nan)
+
+        anterior = np.full_like(quantidades, np.nan)
+        anterior[:, 1:] = quantidades[:, :-1]
+        anterior[:, np.r_[True, np.diff(anos) != 1]] = np.nan
+        variacao = quantidades - anterior
+        variacao_percentual = np.where(anterior > 0, variacao / anterior, np.nan)
+
+    media_movel = np.full_like(quantidades, np.nan)
+    if janela <= quantidades.shape[1]:
+        janelas = np.lib.stride_tricks.sliding_window_view(quantidades, janela, axis=1)
+        consecutivos = anos[janela - 1 :] - anos[: len(anos) - janela + 1] == janela - 1
+        medias = janelas.mean(axis=-1)
+        medias[:, ~consecutivos] = np.nan
+        media_movel[:, janela - 1 :] = medias
+    return {
+        "produtividade": produtividade,
+        "variacao_quantidade": variacao,
+        "variacao_percentual": variacao_percentual,
+        "media_movel_quantidade": media_movel,
+    }
+
+
+def cagr(anos: np.ndarray, quantidades: np.ndarray) -> np.ndarray:
+    """
+    Taxa de crescimento anual composta da quantidade entre o primeiro e o
+    último ano com dado de cada série (NaN sem dois anos ou com início zero).
+    """
+    quantidades = np.atleast_2d(quantidades)
+    validos = ~np.isnan(quantidades)
+    linhas = np.arange(len(quantidades))
+    primeiro = np.argmax(validos, axis=1)
+    ultimo = quantidades.shape[1] - 1 - np.argmax(validos[:, ::-1], axis=1)
+    inicio = quantidades[linhas, primeiro]
+    fim = quantidades[linhas, ultimo]
+    periodo = (anos[ultimo] - anos[primeiro]).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        taxa = np.power(fim / inicio, 1 / periodo) - 1
+    return np.where(validos.any(axis=1) & (periodo > 0) & (inicio > 0), taxa, np.nan)
+
+
+def _valor(valor: float, inteiro: bool = False):
+    if valor != valor:  # NaN
+        return None
+    return int(valor) if inteiro else round(float(valor), 6)
+
+
+def analisar(
+    matriz: MatrizProducao,
+    nivel: str,
+    codigo: Optional[int],
+    ano_inicio: int,
+    ano_fim: int,
+    janela: int = JANELA_PADRAO,
+) -> Optional[dict]:
+    """
+    Série anual de um município, UF ou do país entre ano_inicio e ano_fim.
+    Variação e média móvel usam também os anos anteriores a ano_inicio.
+    """
+    serie = matriz.serie(nivel, codigo)
+    if serie is None:
+        return None
+    areas, quantidades = serie
+    no_periodo = (matriz.anos >= ano_inicio) & (matriz.anos <= ano_fim)
+    no_periodo &= ~(np.isnan(areas) & np.isnan(quantidades))
+    if not no_periodo.any():
+        return None
+
+    calculados = indicadores(matriz.anos, areas, quantidades, janela)
+    anos = matriz.anos[no_periodo]
+    colunas = {nome: valores[0, no_periodo] for nome, valores in calculados.items()}
+    colunas["area_colhida"] = areas[no_periodo]
+    colunas["quantidade_produzida"] = quantidades[no_periodo]
+    inteiros = {"area_colhida", "quantidade_produzida", "variacao_quantidade"}
+    linhas: List[dict] = [{"ano": ano} for ano in anos.tolist()]
+    for nome in _CAMPOS:
+        for linha, valor in zip(linhas, colunas[nome].tolist()):
+            linha[nome] = _valor(valor, nome in inteiros)
+    return {
+        "nivel": nivel,
+        "codigo": UFS_IBGE.get(codigo) if nivel == "uf" else codigo,
+        "ano_inicio": int(anos[0]),
+        "ano_fim": int(anos[-1]),
+        "janela": janela,
+        "cagr_quantidade": _valor(cagr(anos, colunas["quantidade_produzida"])[0]),
+        "anos": linhas,
+    }
+
+
+class MatrizAnalises:
+    """
+    Mantém a MatrizProducao dos dados atuais. A matriz vale enquanto as
+    versões dos anos e o snapshot do motor em memória forem os mesmos de
+    quando ela foi montada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chave: Optional[tuple] = None
+        self._snapshot = None
+        self.matriz: Optional[MatrizProducao] = None
+
+    def atual(self, chave: tuple, snapshot) -> Optional[MatrizProducao]:
+        with self._lock:
+            if self._chave == chave and self._snapshot is snapshot:
+                return self.matriz
+        return None
+
+    def trocar(self, chave: tuple, snapshot, matriz: MatrizProducao) -> None:
+        with self._lock:
+            self._chave = chave
+            self._snapshot = snapshot
+            self.matriz = matriz
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._chave = self._snapshot = self.matriz = None
+
+
+matriz_analises = MatrizAnalises()
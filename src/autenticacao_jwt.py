@@ -1,29 +1,149 @@
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
 from jose import JWTError, jwt
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 
+from src.cache import AUSENTE, CacheLRU
+
 ALGORITHM = "HS256"
+KID_PADRAO = "padrao"
+JWT_CHAVES_ARQUIVO = os.environ.get("JWT_CHAVES_ARQUIVO")
+# segundos entre verificações de alteração do arquivo de chaves
+JWT_CHAVES_INTERVALO = float(os.environ.get("JWT_CHAVES_INTERVALO", 5))
+JWT_CACHE_MAX = int(os.environ.get("JWT_CACHE_MAX", 10000))
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+class ChavesJWT:
+    """
+    Chaves HMAC dos tokens, por kid, carregadas uma vez (no startup ou no
+    primeiro uso).
+
+    Sem arquivo, a única chave é SECRET_KEY. Com JWT_CHAVES_ARQUIVO, um JSON
+    {"atual": kid, "chaves": {kid: segredo}}, o arquivo é relido quando muda,
+    sem reiniciar: novos tokens são assinados com a chave atual e os emitidos
+    com as demais chaves listadas continuam válidos até expirar.
+    """
+
+    def __init__(self, arquivo: Optional[str], intervalo: float):
+        self.arquivo = arquivo
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._chaves: Optional[Dict[str, str]] = None
+        self._kid_atual: Optional[str] = None
+        self._modificado_em: Optional[float] = None
+        self._verificado_em = 0.0
+
+    def carregar(self) -> None:
+        if self.arquivo is None:
+            segredo = os.environ.get("SECRET_KEY")
+            chaves = {} if segredo is None else {KID_PADRAO: segredo}
+            kid_atual, modificado_em = KID_PADRAO, None
+        else:
+            modificado_em = os.stat(self.arquivo).st_mtime
+            with open(self.arquivo) as arquivo:
+                conteudo = json.load(arquivo)
+            chaves, kid_atual = conteudo["chaves"], conteudo["atual"]
+            if kid_atual not in chaves:
+                raise ValueError(f"Chave atual {kid_atual} não está em {self.arquivo}")
+        if not chaves:
+            logger.warning("Nenhuma chave JWT configurada (SECRET_KEY)")
+        with self._lock:
+            self._chaves, self._kid_atual = chaves, kid_atual
+            self._modificado_em = modificado_em
+            self._verificado_em = time.monotonic()
+        # tokens verificados com chaves que saíram da lista deixam de valer
+        cache_tokens.limpar()
+
+    def verificar_rotacao(self) -> None:
+        if self._chaves is None:
+            self.carregar()
+            return
+        if self.arquivo is None:
+            return
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo:
+            return
+        self._verificado_em = agora
+        try:
+            modificado_em = os.stat(self.arquivo).st_mtime
+            if modificado_em != self._modificado_em:
+                self.carregar()
+                logger.info("Chaves JWT recarregadas de %s", self.arquivo)
+        except (OSError, ValueError, KeyError) as e:
+            # mantém as chaves em uso se o arquivo novo estiver inválido
+            logger.error("Falha ao recarregar as chaves JWT: %s", e)
+
+    def atual(self) -> Tuple[str, str]:
+        self.verificar_rotacao()
+        segredo = self._chaves.get(self._kid_atual)
+        if segredo is None:
+            raise RuntimeError("Nenhuma chave JWT configurada")
+        return self._kid_atual, segredo
+
+    def segredo(self, kid: Optional[str]) -> Optional[str]:
+        return self._chaves.get(kid or self._kid_atual)
+
+
+cache_tokens = CacheLRU(JWT_CACHE_MAX)
+chaves_jwt = ChavesJWT(JWT_CHAVES_ARQUIVO, JWT_CHAVES_INTERVALO)
+
+
+def _credenciais_invalidas() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 def create_jwt_token(user: str):
+    kid, segredo = chaves_jwt.atual()
     return jwt.encode(
         {"sub": user, "exp": datetime.utcnow() + timedelta(minutes=10)},
-        os.environ["SECRET_KEY"],
+        segredo,
         algorithm=ALGORITHM,
+        headers={"kid": kid},
     )
 
 
-def decode_jwt_token(token: str = Depends(oauth2_scheme)):
+def verificar_token(token: str) -> dict:
+    """
+    Valida o token e devolve o payload. Tokens já verificados ficam em um LRU
+    pelo sha256 do token até expirarem, sem repetir a verificação da assinatura.
+    """
+    chaves_jwt.verificar_rotacao()
+    chave = hashlib.sha256(token.encode()).digest()
+    marca = cache_tokens.marca()
+    payload = cache_tokens.obter(chave)
+    if payload is not AUSENTE:
+        if payload["exp"] > time.time():
+            return payload
+        cache_tokens.invalidar([chave])
+        raise _credenciais_invalidas()
+
     try:
-        payload = jwt.decode(token, os.environ["SECRET_KEY"], algorithms=ALGORITHM)
-        return payload
-    except JWTError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        segredo = chaves_jwt.segredo(jwt.get_unverified_header(token).get("kid"))
+        if segredo is None:
+            raise _credenciais_invalidas()
+        payload = jwt.decode(token, segredo, algorithms=ALGORITHM)
+    except JWTError:
+        raise _credenciais_invalidas()
+    if isinstance(payload.get("exp"), (int, float)):
+        cache_tokens.gravar(chave, payload, (), marca)
+    return payload
+
+
+def decode_jwt_token(token: str = Depends(oauth2_scheme)):
+    return verificar_token(token)
@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Set
+
+AUSENTE = object()
+
+
+class CacheLRU:
+    """
+    Cache em memória limitado a max_entradas, com descarte do item usado há mais
+    tempo. Cada entrada é marcada com os anos que contém, para ser invalidada
+    por ano. Seguro entre threads: as leituras rodam no event loop e as
+    invalidações vêm das rotas de processamento, no threadpool.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._por_ano: Dict[int, Set[Hashable]] = {}
+        self._geracao = 0
+        self._lock = threading.Lock()
+
+    def marca(self) -> int:
+        """
+        Geração atual; quem lê do banco guarda a marca antes da consulta e a
+        repassa a gravar(), que ignora o valor se houve invalidação no meio.
+        """
+        return self._geracao
+
+    def obter(self, chave: Hashable):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                return AUSENTE
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada[0]
+
+    def gravar(self, chave: Hashable, valor, anos: Iterable[int], marca: int) -> None:
+        if self.max_entradas <= 0:
+            return
+        anos = frozenset(anos)
+        with self._lock:
+            if marca != self._geracao:
+                return
+            self._remover(chave)
+            self._entradas[chave] = (valor, anos)
+            for ano in anos:
+                self._por_ano.setdefault(ano, set()).add(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._remover(next(iter(self._entradas)))
+                self.descartes += 1
+
+    def invalidar(self, chaves: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._geracao += 1
+            for chave in chaves:
+                self._remover(chave)
+
+    def invalidar_ano(self, ano: int) -> None:
+        with self._lock:
+            self._geracao += 1
+            for chave in list(self._por_ano.get(ano, ())):
+                self._remover(chave)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._geracao += 1
+            self._entradas.clear()
+            self._por_ano.clear()
+
+    def estatisticas(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "max_entradas": self.max_entradas,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "descartes": self.descartes,
+        }
+
+    def _remover(self, chave: Hashable) -> None:
+        entrada = self._entradas.pop(chave, None)
+        if entrada is None:
+            return
+        for ano in entrada[1]:
+            chaves = self._por_ano.get(ano)
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_ano[ano]
+
+
+cache_municipios = CacheLRU(int(os.environ.get("CACHE_MUNICIPIOS_MAX", 50000)))
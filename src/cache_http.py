@@ -0,0 +1,112 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import Request
+from starlette.responses import Response
+
+from src.produtos import PRODUTO_PADRAO
+from src.versoes import versoes_dados, versoes_produtos
+
+# valor padrão do Cache-Control das rotas de leitura; cada rota pode ser
+# sobrescrita com CACHE_CONTROL_<ROTA>, ex.: CACHE_CONTROL_PRODUTIVIDADE
+CACHE_CONTROL = os.environ.get("CACHE_CONTROL", "no-cache")
+
+
+def _data_http(valor: str) -> Optional[datetime]:
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return data if data.tzinfo else data.replace(tzinfo=timezone.utc)
+
+
+class CondicaoCache:
+    def __init__(
+        self,
+        etag: str,
+        ultima_modificacao: Optional[datetime],
+        cache_control: str,
+        nao_modificado: bool,
+    ):
+        self.etag = etag
+        self.ultima_modificacao = ultima_modificacao
+        self.cache_control = cache_control
+        self.nao_modificado = nao_modificado
+
+    def cabecalhos(self) -> Dict[str, str]:
+        cabecalhos = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if self.ultima_modificacao is not None:
+            cabecalhos["Last-Modified"] = format_datetime(
+                self.ultima_modificacao, usegmt=True
+            )
+        return cabecalhos
+
+    def resposta_nao_modificada(self) -> Response:
+        return Response(status_code=304, headers=self.cabecalhos())
+
+    def aplicar(self, resposta: Response) -> Response:
+        resposta.headers.update(self.cabecalhos())
+        return resposta
+
+
+def ano_da_rota(request: Request) -> Iterable[int]:
+    ano = request.path_params.get("ano", "")
+    return [int(ano)] if str(ano).isdigit() else []
+
+
+def _produto_da_consulta(request: Request) -> bool:
+    """Indica se a consulta pede um produto diferente do padrão (?produto=)."""
+    produto = request.query_params.get("produto")
+    return produto is not None and produto != str(PRODUTO_PADRAO)
+
+
+def cache_http(
+    rota: str,
+    anos: Callable[[Request], Optional[Iterable[int]]] = lambda _: None,
+    produtos: bool = False,
+) -> Callable[[Request], CondicaoCache]:
+    """
+    Dependência das rotas de leitura. O ETag combina a URL com a versão dos
+    anos de que a resposta depende (todos, se `anos` retornar None), lida da
+    cópia em memória de versoes_anos: a resposta 304 não consulta o banco.
+    Com produtos=True, a consulta com ?produto= usa as versões de
+    versoes_produtos.
+    """
+    cache_control = os.environ.get(f"CACHE_CONTROL_{rota.upper()}", CACHE_CONTROL)
+
+    def condicao(request: Request) -> CondicaoCache:
+        if produtos and _produto_da_consulta(request):
+            versoes = versoes_produtos.versoes(anos(request))
+        else:
+            versoes = versoes_dados.versoes(anos(request))
+        assinatura = repr(
+            (request.url.path, request.url.query, sorted(versoes.items()))
+        ).encode()
+        etag = f'"{hashlib.sha256(assinatura).hexdigest()[:32]}"'
+        ultima_modificacao = max(
+            (
+                atualizado_em.replace(tzinfo=timezone.utc, microsecond=0)
+                for _, atualizado_em in versoes.values()
+            ),
+            default=None,
+        )
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            etags = {
+                valor.strip().replace("W/", "", 1) for valor in if_none_match.split(",")
+            }
+            nao_modificado = "*" in etags or etag in etags
+        else:
+            desde = _data_http(request.headers.get("if-modified-since"))
+            nao_modificado = (
+                ultima_modificacao is not None
+                and desde is not None
+                and ultima_modificacao <= desde
+            )
+        return CondicaoCache(etag, ultima_modificacao, cache_control, nao_modificado)
+
+    return condicao
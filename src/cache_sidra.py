@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+SIDRA_CACHE_DIR = os.environ.get("SIDRA_CACHE_DIR", ".cache/sidra")
+SIDRA_CACHE_TTL = int(os.environ.get("SIDRA_CACHE_TTL", 24 * 60 * 60))
+SIDRA_OFFLINE = os.environ.get("SIDRA_OFFLINE", "").lower() in ("1", "true", "sim")
+
+
+class EntradaCacheSidra(BaseModel):
+    chave: str
+    hash: str
+    buscado_em: float
+    etag: Optional[str] = None
+    ultima_modificacao: Optional[str] = None
+
+
+class GravadorCacheSidra:
+    """
+    Recebe o corpo da resposta em blocos, comprimindo em disco e calculando o
+    sha256 do conteúdo original, que passa a ser o nome do objeto no cache.
+    """
+
+    def __init__(self, cache: "CacheSidra", chave: str):
+        self._cache = cache
+        self._chave = chave
+        self._hash = hashlib.sha256()
+        descritor, self._temporario = tempfile.mkstemp(
+            dir=cache.diretorio_objetos, suffix=".tmp"
+        )
+        self._arquivo = gzip.GzipFile(
+            fileobj=os.fdopen(descritor, "wb"), mode="wb", mtime=0
+        )
+
+    def escrever(self, bloco: bytes) -> None:
+        self._hash.update(bloco)
+        self._arquivo.write(bloco)
+
+    def descartar(self) -> None:
+        self._fechar()
+        os.remove(self._temporario)
+
+    def concluir(
+        self, etag: Optional[str] = None, ultima_modificacao: Optional[str] = None
+    ) -> EntradaCacheSidra:
+        self._fechar()
+        conteudo_hash = self._hash.hexdigest()
+        os.replace(self._temporario, self._cache.caminho_objeto(conteudo_hash))
+        entrada = EntradaCacheSidra(
+            chave=self._chave,
+            hash=conteudo_hash,
+            buscado_em=time.time(),
+            etag=etag,
+            ultima_modificacao=ultima_modificacao,
+        )
+        self._cache.gravar_entrada(entrada)
+        return entrada
+
+    def _fechar(self) -> None:
+        arquivo = self._arquivo.fileobj
+        self._arquivo.close()
+        arquivo.close()
+
+
+class CacheSidra:
+    """
+    Cache em disco das respostas do SIDRA. Os payloads ficam comprimidos em
+    objetos/<sha256>.json.gz e cada consulta (tabela/variável/período/
+    classificação) tem um índice com o hash, a data da busca e os validadores
+    HTTP (ETag/Last-Modified) para revalidação condicional.
+    """
+
+    def __init__(self, diretorio: str, ttl: int, offline: bool = False):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.offline = offline
+        self.diretorio_objetos = os.path.join(diretorio, "objetos")
+        self.diretorio_indice = os.path.join(diretorio, "indice")
+
+    def caminho_objeto(self, conteudo_hash: str) -> str:
+        return os.path.join(self.diretorio_objetos, f"{conteudo_hash}.json.gz")
+
+    def _caminho_entrada(self, chave: str) -> str:
+        return os.path.join(self.diretorio_indice, f"{chave}.json")
+
+    def entrada(self, chave: str) -> Optional[EntradaCacheSidra]:
+        try:
+            with open(self._caminho_entrada(chave)) as f:
+                entrada = EntradaCacheSidra.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(self.caminho_objeto(entrada.hash)):
+            return None
+        return entrada
+
+    def gravar_entrada(self, entrada: EntradaCacheSidra) -> None:
+        os.makedirs(self.diretorio_indice, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(
+            dir=self.diretorio_indice, suffix=".tmp"
+        )
+        with os.fdopen(descritor, "w") as f:
+            f.write(entrada.model_dump_json())
+        os.replace(temporario, self._caminho_entrada(entrada.chave))
+
+    def remover(self, chave: str) -> None:
+        try:
+            os.remove(self._caminho_entrada(chave))
+        except FileNotFoundError:
+            pass
+
+    def fresca(self, entrada: EntradaCacheSidra) -> bool:
+        return time.time() - entrada.buscado_em < self.ttl
+
+    def renovar(self, entrada: EntradaCacheSidra) -> EntradaCacheSidra:
+        entrada = entrada.model_copy(update={"buscado_em": time.time()})
+        self.gravar_entrada(entrada)
+        return entrada
+
+    def cabecalhos_condicionais(
+        self, entrada: Optional[EntradaCacheSidra]
+    ) -> Dict[str, str]:
+        cabecalhos = {}
+        if entrada and entrada.etag:
+            cabecalhos["If-None-Match"] = entrada.etag
+        if entrada and entrada.ultima_modificacao:
+            cabecalhos["If-Modified-Since"] = entrada.ultima_modificacao
+        return cabecalhos
+
+    def gravador(self, chave: str) -> GravadorCacheSidra:
+        os.makedirs(self.diretorio_objetos, exist_ok=True)
+        return GravadorCacheSidra(self, chave)
+
+
+cache_sidra = CacheSidra(SIDRA_CACHE_DIR, SIDRA_CACHE_TTL, SIDRA_OFFLINE)
@@ -0,0 +1,75 @@
+"""
+Registro das cargas do SIDRA em cargas_sidra: o hash do último retorno
+processado de cada consulta, com o ano consultado. Um retorno com o mesmo
+hash da última carga é ignorado sem ser lido; excluir um ano esquece as
+cargas dele. Usado pela carga do produto padrão (src.view) e pela de vários
+produtos (src.produtos).
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, List, Union
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.database import CargasSidra
+from src.service import RetornoSidra, RetornoSidraPorUF
+
+# período nas chaves das consultas (src.service e src.produtos)
+_ANO_CHAVE = re.compile(r"-p(\d+)-")
+
+
+def hashes_processados(chaves: List[str], db: Session) -> Dict[str, str]:
+    """{chave: hash} da última carga registrada de cada chave."""
+    return dict(
+        db.query(CargasSidra.cs_chave, CargasSidra.cs_hash)
+        .filter(CargasSidra.cs_chave.in_(chaves))
+        .all()
+    )
+
+
+def registrar_processamento(
+    ano: int, retornos: List[Union[RetornoSidra, RetornoSidraPorUF]], db: Session
+) -> None:
+    for retorno in retornos:
+        db.merge(
+            CargasSidra(
+                cs_chave=retorno.chave,
+                cs_hash=retorno.hash,
+                cs_processado_em=datetime.now(),
+                cs_ano=ano,
+            )
+        )
+    db.commit()
+
+
+def esquecer_cargas(ano: int, db: Session) -> None:
+    """
+    Remove os registros das cargas do ano, de todos os produtos: a próxima
+    carga do ano volta a ser gravada. Não faz commit.
+    """
+    db.query(CargasSidra).filter(CargasSidra.cs_ano == ano).delete(
+        synchronize_session=False
+    )
+
+
+def preencher_anos(conexao: Connection) -> None:
+    """Preenche cs_ano dos registros que não o têm a partir da chave (-p<ano>-)."""
+    tabela = CargasSidra.__table__
+    chaves = conexao.execute(
+        select(tabela.c.cs_chave).where(tabela.c.cs_ano.is_(None))
+    ).scalars()
+    registros = []
+    for chave in chaves:
+        ano = _ANO_CHAVE.search(chave)
+        if ano:
+            registros.append({"chave": chave, "ano": int(ano.group(1))})
+    if registros:
+        conexao.execute(
+            update(tabela)
+            .where(tabela.c.cs_chave == bindparam("chave"))
+            .values(cs_ano=bindparam("ano")),
+            registros,
+        )
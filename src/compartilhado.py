@@ -0,0 +1,163 @@
+"""
+Snapshot de producao_municipios compartilhado entre os workers de src.servidor.
+
+Cada publicação grava uma nova geração em DADOS_COMPARTILHADOS_DIR (um .npy
+por coluna e as versões dos anos) e troca o ponteiro atual.json de forma
+atômica. Os workers mapeiam os arquivos (mmap) e, a cada requisição, verificam
+o ponteiro no máximo a cada DADOS_COMPARTILHADOS_INTERVALO segundos.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from src.cache import cache_municipios
+from src.memoria import SnapshotProducao, motor_memoria
+from src.versoes import versoes_dados, versoes_produtos
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+DADOS_COMPARTILHADOS_DIR = os.environ.get("DADOS_COMPARTILHADOS_DIR")
+DADOS_COMPARTILHADOS_INTERVALO = float(
+    os.environ.get("DADOS_COMPARTILHADOS_INTERVALO", 1)
+)
+# gerações antigas mantidas para workers que ainda não trocaram
+GERACOES_MANTIDAS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class DadosCompartilhados:
+    def __init__(self, diretorio: Optional[str], intervalo: float):
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.geracao: Optional[int] = None
+        self._verificado_em = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self.diretorio is not None
+
+    def _caminho(self, *partes: str) -> str:
+        return os.path.join(self.diretorio, *partes)
+
+    @contextmanager
+    def _trava(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(self._caminho(".trava"), "w") as arquivo:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_EX)
+            yield
+
+    def ler_atual(self) -> Optional[dict]:
+        try:
+            with open(self._caminho("atual.json")) as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return None
+
+    def publicar(
+        self,
+        snapshot: SnapshotProducao,
+        versoes: Dict[int, Tuple[int, datetime]],
+        versoes_produtos: Optional[Dict[int, Tuple[int, datetime]]] = None,
+    ) -> int:
+        """
+        Grava uma nova geração e a torna a atual. Retorna o número dela.
+        `versoes_produtos` são as versões de producao_produtos (src.versoes).
+        """
+        with self._trava():
+            atual = self.ler_atual()
+            geracao = 1 if atual is None else atual["geracao"] + 1
+            nome = f"g{geracao}"
+            temporario = self._caminho(f"{nome}.tmp")
+            shutil.rmtree(temporario, ignore_errors=True)
+            snapshot.gravar(temporario)
+            _gravar_versoes(os.path.join(temporario, "versoes.json"), versoes)
+            _gravar_versoes(
+                os.path.join(temporario, "versoes_produtos.json"),
+                versoes_produtos or {},
+            )
+            os.replace(temporario, self._caminho(nome))
+
+            with open(self._caminho("atual.json.tmp"), "w") as arquivo:
+                json.dump({"geracao": geracao, "diretorio": nome}, arquivo)
+            os.replace(self._caminho("atual.json.tmp"), self._caminho("atual.json"))
+
+            # os arquivos já mapeados continuam válidos depois de removidos
+            for antiga in range(geracao - GERACOES_MANTIDAS, 0, -1):
+                caminho = self._caminho(f"g{antiga}")
+                if not os.path.isdir(caminho):
+                    break
+                shutil.rmtree(caminho, ignore_errors=True)
+        logger.info(
+            "Geração %s dos dados publicada (%s linhas)", geracao, len(snapshot)
+        )
+        return geracao
+
+    def sincronizar(self, forcar: bool = False) -> bool:
+        """
+        Adota a geração atual se ela mudou: troca o snapshot do motor em
+        memória, as versões dos anos e dos produtos (ETag) e limpa o cache de municípios.
+        """
+        agora = time.monotonic()
+        if not forcar and agora - self._verificado_em < self.intervalo:
+            return False
+        self._verificado_em = agora
+        atual = self.ler_atual()
+        if atual is None or atual["geracao"] == self.geracao:
+            return False
+        with self._lock:
+            if atual["geracao"] == self.geracao:
+                return False
+            diretorio = self._caminho(atual["diretorio"])
+            try:
+                snapshot = SnapshotProducao.abrir(diretorio)
+                versoes = _ler_versoes(os.path.join(diretorio, "versoes.json"))
+                versoes_de_produtos = _ler_versoes(
+                    os.path.join(diretorio, "versoes_produtos.json")
+                )
+            except FileNotFoundError:
+                # geração substituída e removida entre a leitura do ponteiro e
+                # a abertura; a próxima verificação pega a nova
+                return False
+            motor_memoria.snapshot = snapshot
+            versoes_dados.definir(versoes)
+            versoes_produtos.definir(versoes_de_produtos)
+            cache_municipios.limpar()
+            self.geracao = atual["geracao"]
+        return True
+
+
+def _gravar_versoes(caminho: str, versoes: Dict[int, Tuple[int, datetime]]) -> None:
+    with open(caminho, "w") as arquivo:
+        json.dump(
+            {
+                str(ano): [versao, atualizado_em.isoformat()]
+                for ano, (versao, atualizado_em) in versoes.items()
+            },
+            arquivo,
+        )
+
+
+def _ler_versoes(caminho: str) -> Dict[int, Tuple[int, datetime]]:
+    with open(caminho) as arquivo:
+        return {
+            int(ano): (versao, datetime.fromisoformat(atualizado_em))
+            for ano, (versao, atualizado_em) in json.load(arquivo).items()
+        }
+
+
+dados_compartilhados = DadosCompartilhados(
+    DADOS_COMPARTILHADOS_DIR, DADOS_COMPARTILHADOS_INTERVALO
+)
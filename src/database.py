@@ -1,22 +1,38 @@
 import os
 
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import (
+    create_engine,
+    Column,
+    Integer,
+    String,
+    DateTime,
+    BigInteger,
+    Index,
+)
 from sqlalchemy.types import DECIMAL
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from databases import Database
 
-DATABASE_URL = (
+DATABASE_URL = os.environ.get("DATABASE_URL") or (
     f"mysql+mysqlconnector://{os.environ['DB_USER']}"
     f":{os.environ['DB_PASS']}@"
     f"{os.environ['DB_HOST']}"
 )
 engine = create_engine(DATABASE_URL)
-database = Database(DATABASE_URL)
+# pool assíncrono (aiomysql) usado pelas rotas de leitura
+opcoes_pool = (
+    {}
+    if engine.dialect.name == "sqlite"
+    else {
+        "min_size": int(os.environ.get("DB_POOL_MIN", 1)),
+        "max_size": int(os.environ.get("DB_POOL_MAX", 20)),
+    }
+)
+database = Database(DATABASE_URL, **opcoes_pool)
 
 Base = declarative_base()
-Base.metadata.create_all(bind=engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -29,7 +45,10 @@ def get_db():
         db.close()
 
 
-# @todo index
+def get_database() -> Database:
+    return database
+
+
 class ProducaoMunicipios(Base):
     __tablename__ = "producao_municipios"
 
@@ -37,14 +56,107 @@ class ProducaoMunicipios(Base):
     pm_ano = Column(Integer, primary_key=True)
     pm_area = Column(Integer)
     pm_quantidade = Column(Integer)
+    # hash de (pm_area, pm_quantidade), ver src.digests
+    pm_hash = Column(BigInteger)
+
+    # a chave primária começa pelo município; as cargas, exclusões e agregações
+    # filtram só pelo ano. O índice cobre todas as colunas, então essas
+    # consultas não voltam à tabela.
+    __table_args__ = (
+        Index(
+            "ix_producao_municipios_ano",
+            "pm_ano",
+            "pm_municipio_id",
+            "pm_area",
+            "pm_quantidade",
+        ),
+    )
+
+
+class Municipios(Base):
+    __tablename__ = "municipios"
+
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(255), nullable=False)
+    uf = Column(String(2))
+    uf_id_ibge = Column(Integer, nullable=False)
 
+    __table_args__ = (Index("ix_municipios_uf_id_ibge", "uf_id_ibge", "id", "uf"),)
 
-# @todo index
-class ViewProdutividadeEstados(Base):
-    __tablename__ = "view_produtividade_estados"
+
+# resumo por estado e ano, recalculado a cada carga ou exclusão de um ano
+class ProdutividadeEstados(Base):
+    __tablename__ = "produtividade_estados"
 
     estado = Column(String(2), primary_key=True)
-    pm_ano = Column(Integer)
-    total_area = Column(DECIMAL(15, 10))
-    total_quantidade = Column(DECIMAL(15, 10))
-    produtividade = Column(DECIMAL(5, 10))
+    pm_ano = Column(Integer, primary_key=True)
+    total_area = Column(BigInteger)
+    total_quantidade = Column(BigInteger)
+    produtividade = Column(DECIMAL(20, 10))
+
+    __table_args__ = (Index("ix_produtividade_estados_ano", "pm_ano"),)
+
+
+# resumo do conteúdo de producao_municipios por ano e UF (src.digests); uma
+# carga com o mesmo resumo da anterior não lê nem grava as linhas da UF
+class DigestsProducao(Base):
+    __tablename__ = "digests_producao"
+
+    dp_ano = Column(Integer, primary_key=True)
+    dp_uf = Column(Integer, primary_key=True)
+    dp_digest = Column(BigInteger, nullable=False)
+    dp_linhas = Column(Integer, nullable=False)
+
+
+class CargasSidra(Base):
+    __tablename__ = "cargas_sidra"
+
+    cs_chave = Column(String(64), primary_key=True)
+    cs_hash = Column(String(64), nullable=False)
+    cs_processado_em = Column(DateTime, nullable=False)
+    # ano consultado, para esquecer as cargas de um ano excluído
+    cs_ano = Column(Integer)
+
+    __table_args__ = (Index("ix_cargas_sidra_ano", "cs_ano"),)
+
+
+# versão dos dados de cada ano, incrementada a cada carga ou exclusão que
+# altera producao_municipios; base dos ETags das rotas de leitura
+class VersoesAnos(Base):
+    __tablename__ = "versoes_anos"
+
+    va_ano = Column(Integer, primary_key=True)
+    va_versao = Column(Integer, nullable=False)
+    va_atualizado_em = Column(DateTime, nullable=False)
+
+
+class CargasReferencia(Base):
+    __tablename__ = "cargas_referencia"
+
+    cr_arquivo = Column(String(255), primary_key=True)
+    cr_hash = Column(String(64), nullable=False)
+    cr_carregado_em = Column(DateTime, nullable=False)
+
+
+# uma linha por produto, município e ano; o produto padrão (40124) continua
+# também em producao_municipios, que atende as rotas sem produto
+class ProducaoProdutos(Base):
+    __tablename__ = "producao_produtos"
+
+    pp_produto = Column(Integer, primary_key=True)
+    pp_municipio_id = Column(Integer, primary_key=True)
+    pp_ano = Column(Integer, primary_key=True)
+    pp_area = Column(BigInteger)
+    pp_quantidade = Column(BigInteger)
+
+    __table_args__ = (Index("ix_producao_produtos_ano", "pp_ano"),)
+
+
+# versão de producao_produtos por ano, separada de versoes_anos para que uma
+# carga de produtos não mude o ETag das rotas do produto padrão
+class VersoesProdutos(Base):
+    __tablename__ = "versoes_produtos"
+
+    vp_ano = Column(Integer, primary_key=True)
+    vp_versao = Column(Integer, nullable=False)
+    vp_atualizado_em = Column(DateTime, nullable=False)
@@ -0,0 +1,58 @@
+"""
+Hashes de conteúdo de producao_municipios.
+
+Cada linha guarda em pm_hash um hash de 64 bits de (pm_area, pm_quantidade) e
+cada par (ano, UF) guarda em digests_producao um resumo das linhas da UF: a
+soma, módulo 2**64, dos hashes combinados com o código do município, e a
+quantidade de linhas. O resumo não depende da ordem das linhas, então o de
+uma carga é comparado com o gravado sem ler producao_municipios.
+
+Os valores ficam gravados no banco: mudar as funções abaixo exige recalcular
+pm_hash e apagar digests_producao.
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+_INCREMENTO = np.uint64(0x9E3779B97F4A7C15)
+_MULTIPLICADOR_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MULTIPLICADOR_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _misturar(valores: np.ndarray) -> np.ndarray:
+    """Finalizador do splitmix64 sobre um array uint64."""
+    valores = (valores ^ (valores >> np.uint64(30))) * _MULTIPLICADOR_1
+    valores = (valores ^ (valores >> np.uint64(27))) * _MULTIPLICADOR_2
+    return valores ^ (valores >> np.uint64(31))
+
+
+def _uint64(valores: Iterable[int]) -> np.ndarray:
+    return np.ascontiguousarray(valores, dtype=np.int64).view(np.uint64)
+
+
+def hash_linhas(areas: Iterable[int], quantidades: Iterable[int]) -> np.ndarray:
+    """Hash de cada linha, como int64 (o BIGINT com sinal de pm_hash)."""
+    # o incremento evita que a linha (0, 0) tenha hash 0
+    areas = _misturar(_uint64(areas) + _INCREMENTO)
+    return _misturar(areas ^ _uint64(quantidades)).view(np.int64)
+
+
+def digests_uf(
+    municipios: Iterable[int], hashes: Iterable[int]
+) -> Dict[int, Tuple[int, int]]:
+    """{código da UF: (digest, linhas)} das linhas informadas."""
+    municipios = np.ascontiguousarray(municipios, dtype=np.int64)
+    if not len(municipios):
+        return {}
+    folhas = _misturar(municipios.view(np.uint64) ^ _uint64(hashes))
+    ufs = municipios // 100000
+    ordem = np.argsort(ufs, kind="stable")
+    ufs, folhas = ufs[ordem], folhas[ordem]
+    inicios = np.flatnonzero(np.r_[True, ufs[1:] != ufs[:-1]])
+    somas = np.add.reduceat(folhas, inicios).view(np.int64)
+    linhas = np.diff(np.r_[inicios, len(ufs)])
+    return {
+        int(uf): (int(soma), int(total))
+        for uf, soma, total in zip(ufs[inicios], somas, linhas)
+    }
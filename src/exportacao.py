@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List, Optional
+
+from databases import Database
+from sqlalchemy import and_, or_, select
+
+from src.database import ProducaoMunicipios
+from src.schemas import FormatoExportacao
+from src.utils import codigos_uf, intervalo_uf
+
+TAMANHO_PARTE = int(os.environ.get("EXPORTACAO_TAMANHO_PARTE", 10000))
+
+COLUNAS = ("municipio_id", "ano", "area_colhida", "quantidade_produzida")
+
+TIPOS_CONTEUDO = {
+    FormatoExportacao.ndjson: "application/x-ndjson",
+    FormatoExportacao.csv: "text/csv; charset=utf-8",
+    FormatoExportacao.parquet: "application/vnd.apache.parquet",
+}
+
+
+def parquet_disponivel() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def normalizar_estados(estados: Optional[List[str]]) -> Optional[List[str]]:
+    return [estado.upper().strip() for estado in estados] if estados else estados
+
+
+def estados_invalidos(estados: List[str]) -> List[str]:
+    return [
+        estado for estado in normalizar_estados(estados) if estado not in codigos_uf
+    ]
+
+
+def _consulta(ano_inicio: int, ano_fim: int, estados: Optional[List[str]]):
+    consulta = select(
+        ProducaoMunicipios.pm_municipio_id,
+        ProducaoMunicipios.pm_ano,
+        ProducaoMunicipios.pm_area,
+        ProducaoMunicipios.pm_quantidade,
+    ).where(ProducaoMunicipios.pm_ano.between(ano_inicio, ano_fim))
+    if estados:
+        # o código do município começa pelo código da UF, então cada estado é
+        # um intervalo contínuo da chave primária
+        consulta = consulta.where(
+            or_(
+                *(
+                    ProducaoMunicipios.pm_municipio_id.between(
+                        *intervalo_uf(codigos_uf[estado])
+                    )
+                    for estado in estados
+                )
+            )
+        )
+    return consulta.order_by(
+        ProducaoMunicipios.pm_municipio_id, ProducaoMunicipios.pm_ano
+    ).limit(TAMANHO_PARTE)
+
+
+async def _partes(
+    database: Database,
+    ano_inicio: int,
+    ano_fim: int,
+    estados: Optional[List[str]],
+) -> AsyncIterator[List[tuple]]:
+    """
+    Lê producao_municipios em partes de TAMANHO_PARTE linhas, paginando pela
+    chave primária (municipio, ano): cada parte retoma da última linha lida,
+    então a memória não cresce com o tamanho do resultado.
+    """
+    consulta = _consulta(ano_inicio, ano_fim, estados)
+    ultima = None
+    while True:
+        parte = consulta
+        if ultima is not None:
+            # sem comparação de tuplas: o MySQL nem sempre a usa como intervalo
+            # da chave primária
+            municipio_id, ano = ultima
+            parte = parte.where(
+                or_(
+                    ProducaoMunicipios.pm_municipio_id > municipio_id,
+                    and_(
+                        ProducaoMunicipios.pm_municipio_id == municipio_id,
+                        ProducaoMunicipios.pm_ano > ano,
+                    ),
+                )
+            )
+        linhas = [tuple(linha) for linha in await database.fetch_all(parte)]
+        if not linhas:
+            return
+        yield linhas
+        if len(linhas) < TAMANHO_PARTE:
+            return
+        ultima = linhas[-1][:2]
+
+
+async def _ndjson(partes: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    async for linhas in partes:
+        yield "".join(
+            json.dumps(dict(zip(COLUNAS, linha))) + "\n" for linha in linhas
+        ).encode()
+
+
+async def _csv(partes: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    saida = io.StringIO()
+    escritor = csv.writer(saida, lineterminator="\n")
+    escritor.writerow(COLUNAS)
+    async for linhas in partes:
+        escritor.writerows(linhas)
+        yield saida.getvalue().encode()
+        saida.seek(0)
+        saida.truncate()
+    if saida.tell():
+        yield saida.getvalue().encode()
+
+
+class _SaidaParquet(io.RawIOBase):
+    """Arquivo só de escrita que acumula os bytes até serem consumidos."""
+
+    def __init__(self):
+        self.blocos: List[bytes] = []
+        self.posicao = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        self.blocos.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self.posicao
+
+    def consumir(self) -> bytes:
+        dados = b"".join(self.blocos)
+        self.blocos = []
+        return dados
+
+
+async def _parquet(partes: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema(
+        [
+            ("municipio_id", pa.int32()),
+            ("ano", pa.int16()),
+            ("area_colhida", pa.int64()),
+            ("quantidade_produzida", pa.int64()),
+        ]
+    )
+    saida = _SaidaParquet()
+    # cada parte vira um row group, enviado assim que é escrito
+    with pq.ParquetWriter(saida, esquema) as escritor:
+        async for linhas in partes:
+            escritor.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(coluna) for coluna in zip(*linhas)], schema=esquema
+                )
+            )
+            yield saida.consumir()
+    yield saida.consumir()
+
+
+_SERIALIZADORES = {
+    FormatoExportacao.ndjson: _ndjson,
+    FormatoExportacao.csv: _csv,
+    FormatoExportacao.parquet: _parquet,
+}
+
+
+def exportar_producao(
+    database: Database,
+    formato: FormatoExportacao,
+    ano_inicio: int,
+    ano_fim: int,
+    estados: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    return _SERIALIZADORES[formato](
+        _partes(database, ano_inicio, ano_fim, normalizar_estados(estados))
+    )
@@ -0,0 +1,164 @@
+import os
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.utils import codigos_uf
+
+MOTOR_MEMORIA = os.environ.get("MOTOR_MEMORIA", "").lower() in ("1", "true", "sim")
+_COLUNAS = ("municipios", "anos", "areas", "quantidades", "ufs")
+
+
+class SnapshotProducao:
+    """
+    Cópia imutável de producao_municipios em arrays NumPy ordenados por
+    (município, ano), com o intervalo de linhas de cada município indexado.
+    A UF de cada linha vem do mapa de municípios (src.municipios), como na
+    agregação de produtividade_estados; municípios fora do mapa ficam com 0.
+    """
+
+    def __init__(
+        self,
+        municipios: np.ndarray,
+        anos: np.ndarray,
+        areas: np.ndarray,
+        quantidades: np.ndarray,
+        ufs: np.ndarray,
+    ):
+        ordem = np.lexsort((anos, municipios))
+        self.municipios = np.ascontiguousarray(municipios[ordem], dtype=np.int32)
+        self.anos = np.ascontiguousarray(anos[ordem], dtype=np.int16)
+        self.areas = np.ascontiguousarray(areas[ordem], dtype=np.int64)
+        self.quantidades = np.ascontiguousarray(quantidades[ordem], dtype=np.int64)
+        self.ufs = np.ascontiguousarray(ufs[ordem], dtype=np.int8)
+        self._indexar()
+
+    def _indexar(self) -> None:
+        self.ids, inicios = np.unique(self.municipios, return_index=True)
+        fins = np.append(inicios[1:], len(self.municipios))
+        self.intervalos: Dict[int, Tuple[int, int]] = dict(
+            zip(self.ids.tolist(), zip(inicios.tolist(), fins.tolist()))
+        )
+
+    @classmethod
+    def de_linhas(
+        cls, linhas: Sequence[tuple], municipios_uf: Dict[int, Tuple[str, str]]
+    ) -> "SnapshotProducao":
+        """
+        Linhas (municipio, ano, area, quantidade); NULL em valores vira 0.
+        municipios_uf é o mapa código -> (nome, UF) de src.municipios.
+        """
+        colunas = np.nan_to_num(np.array(linhas, dtype=np.float64).reshape(-1, 4))
+        colunas = colunas.astype(np.int64)
+        ids, posicoes = np.unique(colunas[:, 0], return_inverse=True)
+        ufs = np.array(
+            [
+                codigos_uf.get(municipios_uf.get(codigo, (None, None))[1], 0)
+                for codigo in ids.tolist()
+            ],
+            dtype=np.int8,
+        )
+        return cls(
+            colunas[:, 0], colunas[:, 1], colunas[:, 2], colunas[:, 3], ufs[posicoes]
+        )
+
+    def gravar(self, diretorio: str) -> None:
+        """Grava os arrays ordenados em diretorio, um .npy por coluna."""
+        os.makedirs(diretorio, exist_ok=True)
+        for coluna in _COLUNAS:
+            np.save(os.path.join(diretorio, f"{coluna}.npy"), getattr(self, coluna))
+
+    @classmethod
+    def abrir(cls, diretorio: str) -> "SnapshotProducao":
+        """
+        Mapeia (mmap, somente leitura) os arrays gravados por `gravar`: os
+        processos que abrem o mesmo diretório compartilham as páginas em memória.
+        """
+        snapshot = cls.__new__(cls)
+        for coluna in _COLUNAS:
+            setattr(
+                snapshot,
+                coluna,
+                np.load(os.path.join(diretorio, f"{coluna}.npy"), mmap_mode="r"),
+            )
+        snapshot._indexar()
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.municipios)
+
+    def _linha(self, i: int) -> tuple:
+        return (
+            int(self.municipios[i]),
+            int(self.anos[i]),
+            int(self.areas[i]),
+            int(self.quantidades[i]),
+        )
+
+    def linhas_municipio(self, municipio_id: int) -> List[tuple]:
+        inicio, fim = self.intervalos.get(municipio_id, (0, 0))
+        return [self._linha(i) for i in range(inicio, fim)]
+
+    def linha(self, ano: int, municipio_id: int) -> Optional[tuple]:
+        inicio, fim = self.intervalos.get(municipio_id, (0, 0))
+        i = inicio + int(np.searchsorted(self.anos[inicio:fim], ano))
+        if i < fim and self.anos[i] == ano:
+            return self._linha(i)
+        return None
+
+    def linhas(self, municipios: Iterable[int], anos: Iterable[int]) -> List[tuple]:
+        posicoes = [
+            np.arange(*self.intervalos[m]) for m in municipios if m in self.intervalos
+        ]
+        if not posicoes:
+            return []
+        posicoes = np.concatenate(posicoes)
+        posicoes = posicoes[np.isin(self.anos[posicoes], list(anos))]
+        return [self._linha(i) for i in posicoes]
+
+    def produtividade_estados(
+        self, ano: int, estados: Iterable[str]
+    ) -> List[Tuple[str, Optional[Decimal]]]:
+        do_ano = self.anos == ano
+        codigos = self.ufs[do_ano]
+        areas = self.areas[do_ano]
+        quantidades = self.quantidades[do_ano]
+        resultado = []
+        for estado in estados:
+            do_estado = codigos == codigos_uf.get(estado, -1)
+            if not do_estado.any():
+                continue
+            total_area = int(areas[do_estado].sum())
+            total_quantidade = int(quantidades[do_estado].sum())
+            resultado.append(
+                (
+                    estado,
+                    (
+                        Decimal(total_quantidade) / Decimal(total_area)
+                        if total_area
+                        else None
+                    ),
+                )
+            )
+        return resultado
+
+
+class MotorMemoria:
+    """
+    Mantém o snapshot atual de producao_municipios. A troca do snapshot é uma
+    única atribuição, então leitores concorrentes veem o conjunto antigo ou o
+    novo inteiro, nunca uma mistura.
+    """
+
+    def __init__(self, ativo: bool):
+        self.ativo = ativo
+        self.snapshot: Optional[SnapshotProducao] = None
+
+    def trocar(
+        self, linhas: Sequence[tuple], municipios_uf: Dict[int, Tuple[str, str]]
+    ) -> None:
+        self.snapshot = SnapshotProducao.de_linhas(linhas, municipios_uf)
+
+
+motor_memoria = MotorMemoria(MOTOR_MEMORIA)
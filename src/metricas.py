@@ -0,0 +1,161 @@
+"""
+Métricas no formato do Prometheus, expostas em /metrics quando METRICAS=1.
+
+Desligadas (padrão), nada é registrado: não há middleware nem eventos no
+SQLAlchemy, e `etapa` devolve um contexto vazio.
+"""
+
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Optional
+
+from databases import Database
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICAS = os.environ.get("METRICAS", "").lower() in ("1", "true", "sim")
+
+# [quantidade de consultas, segundos] da requisição atual
+_consultas_requisicao: ContextVar[Optional[List[float]]] = ContextVar(
+    "consultas_requisicao", default=None
+)
+_SEM_ETAPA = nullcontext()
+
+
+class Metricas:
+    def __init__(self):
+        from prometheus_client import CollectorRegistry, Counter, Histogram
+
+        self.registro = CollectorRegistry()
+        self.requisicoes = Histogram(
+            "http_requisicao_segundos",
+            "Latência das requisições por rota, método e status",
+            ["rota", "metodo", "status"],
+            registry=self.registro,
+        )
+        self.consultas_requisicao = Histogram(
+            "db_consultas_por_requisicao",
+            "Consultas ao banco feitas em cada requisição",
+            ["rota"],
+            buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+            registry=self.registro,
+        )
+        self.tempo_banco_requisicao = Histogram(
+            "db_tempo_por_requisicao_segundos",
+            "Tempo gasto no banco em cada requisição",
+            ["rota"],
+            registry=self.registro,
+        )
+        self.consultas = Histogram(
+            "db_consulta_segundos",
+            "Duração de cada consulta ao banco",
+            ["conexao"],
+            registry=self.registro,
+        )
+        self.etapas = Histogram(
+            "ingestao_etapa_segundos",
+            "Duração das etapas da carga do SIDRA",
+            ["etapa"],
+            buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+            registry=self.registro,
+        )
+        self.falhas_etapas = Counter(
+            "ingestao_etapa_falhas",
+            "Etapas da carga do SIDRA que terminaram com erro",
+            ["etapa"],
+            registry=self.registro,
+        )
+
+    def registrar_consulta(self, conexao: str, segundos: float) -> None:
+        self.consultas.labels(conexao).observe(segundos)
+        acumulado = _consultas_requisicao.get()
+        if acumulado is not None:
+            acumulado[0] += 1
+            acumulado[1] += segundos
+
+    @contextmanager
+    def medir_etapa(self, nome: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.falhas_etapas.labels(nome).inc()
+            raise
+        finally:
+            self.etapas.labels(nome).observe(time.perf_counter() - inicio)
+
+
+metricas: Optional[Metricas] = Metricas() if METRICAS else None
+
+
+def etapa(nome: str):
+    """Mede uma etapa da carga: sidra, parse, merge ou upsert."""
+    if metricas is None:
+        return _SEM_ETAPA
+    return metricas.medir_etapa(nome)
+
+
+def _instrumentar_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def antes(conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def depois(conexao, cursor, sql, parametros, contexto, executemany):
+        inicio = conexao.info["inicio_consultas"].pop()
+        metricas.registrar_consulta("sync", time.perf_counter() - inicio)
+
+
+def _instrumentar_database(database: Database) -> None:
+    # o `databases` não passa pelos eventos do engine; os métodos de consulta
+    # da instância são embrulhados para medir o tempo
+    for nome in ("execute", "execute_many", "fetch_all", "fetch_one", "fetch_val"):
+        original = getattr(database, nome)
+
+        async def medido(*args, _original=original, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return await _original(*args, **kwargs)
+            finally:
+                metricas.registrar_consulta("async", time.perf_counter() - inicio)
+
+        setattr(database, nome, medido)
+
+
+def instrumentar(app: FastAPI, engine: Engine, database: Database) -> None:
+    if metricas is None:
+        return
+    _instrumentar_engine(engine)
+    _instrumentar_database(database)
+
+    @app.middleware("http")
+    async def medir_requisicao(request: Request, call_next):
+        acumulado = [0, 0.0]
+        token = _consultas_requisicao.set(acumulado)
+        inicio = time.perf_counter()
+        status = 500
+        try:
+            resposta = await call_next(request)
+            status = resposta.status_code
+            return resposta
+        finally:
+            duracao = time.perf_counter() - inicio
+            _consultas_requisicao.reset(token)
+            rota = request.scope.get("route")
+            rota = rota.path if rota is not None else "desconhecida"
+            metricas.requisicoes.labels(rota, request.method, str(status)).observe(
+                duracao
+            )
+            metricas.consultas_requisicao.labels(rota).observe(acumulado[0])
+            metricas.tempo_banco_requisicao.labels(rota).observe(acumulado[1])
+
+
+def resposta_metricas() -> Optional[Response]:
+    if metricas is None:
+        return None
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return Response(generate_latest(metricas.registro), media_type=CONTENT_TYPE_LATEST)
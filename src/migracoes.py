@@ -0,0 +1,92 @@
+import logging
+
+from sqlalchemy import bindparam, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from src.cargas import preencher_anos
+from src.database import Base, ProducaoMunicipios
+from src.digests import hash_linhas
+from src.particoes import PARTICIONAR_POR_ANO, particoes_ano
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE_HASHES = 5000
+
+
+def aplicar_migracoes(engine: Engine) -> None:
+    """
+    Cria as tabelas, as colunas anuláveis e os índices declarados nos modelos
+    que ainda não existem no banco. Pode ser chamada a cada inicialização: o
+    que já existe não é alterado. Quando pm_hash ou cs_ano são criadas, elas
+    são preenchidas para as linhas existentes. Com PARTICIONAR_POR_ANO, producao_municipios é
+    particionada por ano no MySQL (src.particoes).
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        inspetor = inspect(conexao)
+        colunas_criadas = _adicionar_colunas(conexao, inspetor)
+        for tabela in Base.metadata.sorted_tables:
+            existentes = {
+                indice["name"] for indice in inspetor.get_indexes(tabela.name)
+            }
+            for indice in sorted(tabela.indexes, key=lambda indice: indice.name):
+                if indice.name not in existentes:
+                    logger.info("Criando índice %s em %s", indice.name, tabela.name)
+                    indice.create(conexao)
+        if ("producao_municipios", "pm_hash") in colunas_criadas:
+            preencher_hashes(conexao)
+        if ("cargas_sidra", "cs_ano") in colunas_criadas:
+            preencher_anos(conexao)
+    if PARTICIONAR_POR_ANO:
+        particoes_ano.particionar(engine)
+
+
+def _adicionar_colunas(conexao: Connection, inspetor) -> set:
+    """Retorna os pares (tabela, coluna) criados."""
+    criadas = set()
+    for tabela in Base.metadata.sorted_tables:
+        existentes = {coluna["name"] for coluna in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes or not coluna.nullable:
+                continue
+            logger.info("Criando coluna %s em %s", coluna.name, tabela.name)
+            tipo = coluna.type.compile(dialect=conexao.dialect)
+            conexao.exec_driver_sql(
+                f"ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}"
+            )
+            criadas.add((tabela.name, coluna.name))
+    return criadas
+
+
+def preencher_hashes(conexao: Connection) -> None:
+    """Calcula pm_hash das linhas de producao_municipios que não o têm."""
+    tabela = ProducaoMunicipios.__table__
+    linhas = conexao.execute(
+        select(
+            tabela.c.pm_municipio_id,
+            tabela.c.pm_ano,
+            tabela.c.pm_area,
+            tabela.c.pm_quantidade,
+        ).where(tabela.c.pm_hash.is_(None))
+    ).fetchall()
+    if not linhas:
+        return
+    logger.info("Calculando pm_hash de %s linhas", len(linhas))
+    hashes = hash_linhas(
+        [linha.pm_area or 0 for linha in linhas],
+        [linha.pm_quantidade or 0 for linha in linhas],
+    )
+    atualizacao = (
+        update(tabela)
+        .where(
+            tabela.c.pm_municipio_id == bindparam("municipio"),
+            tabela.c.pm_ano == bindparam("ano"),
+        )
+        .values(pm_hash=bindparam("hash"))
+    )
+    registros = [
+        {"municipio": linha.pm_municipio_id, "ano": linha.pm_ano, "hash": int(valor)}
+        for linha, valor in zip(linhas, hashes)
+    ]
+    for inicio in range(0, len(registros), TAMANHO_LOTE_HASHES):
+        conexao.execute(atualizacao, registros[inicio : inicio + TAMANHO_LOTE_HASHES])
@@ -0,0 +1,200 @@
+"""
+Carga da dimensão de municípios (código IBGE -> nome e UF) a partir de
+scripts_db.py/dct_municipio_uf.csv.
+
+    python -m src.municipios [caminho_do_csv]
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+if __name__ == "__main__":
+    # o .env precisa estar carregado antes de src.database montar a URL
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+from databases import Database
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.database import CargasReferencia, Municipios
+from src.versoes import versoes_dados
+
+ARQUIVO_MUNICIPIOS = os.environ.get(
+    "MUNICIPIOS_CSV",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "scripts_db.py",
+        "dct_municipio_uf.csv",
+    ),
+)
+TAMANHO_LOTE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+class MapaMunicipios:
+    """
+    Código IBGE -> (nome, UF) em memória, para não precisar do join com a
+    tabela municipios. É carregado do banco na primeira consulta e recarregado
+    a cada carga do arquivo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._municipios: Optional[Dict[int, Tuple[str, str]]] = None
+
+    def _definir(self, linhas) -> Dict[int, Tuple[str, str]]:
+        municipios = {codigo: (nome, uf) for codigo, nome, uf in linhas}
+        with self._lock:
+            self._municipios = municipios
+        return municipios
+
+    def carregar(self, db: Session) -> None:
+        self._definir(db.execute(select(Municipios.id, Municipios.nome, Municipios.uf)))
+
+    def municipios(self, db: Session) -> Dict[int, Tuple[str, str]]:
+        municipios = self._municipios
+        if municipios is None:
+            self.carregar(db)
+            municipios = self._municipios
+        return municipios
+
+    async def obter(self, database: Database) -> Dict[int, Tuple[str, str]]:
+        """Como `municipios`, pela conexão assíncrona."""
+        municipios = self._municipios
+        if municipios is None:
+            municipios = self._definir(
+                await database.fetch_all(
+                    select(Municipios.id, Municipios.nome, Municipios.uf)
+                )
+            )
+        return municipios
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._municipios = None
+
+
+mapa_municipios = MapaMunicipios()
+
+
+def ler_municipios(conteudo: bytes) -> List[dict]:
+    leitor = csv.DictReader(
+        io.StringIO(conteudo.decode("iso-8859-1"), newline=""), delimiter=";"
+    )
+    return [
+        {
+            "id": int(linha["id_municipio_ibge"]),
+            "nome": linha["nm_municipio"],
+            "uf": linha["sg_uf"],
+            "uf_id_ibge": int(linha["id_uf_ibge"]),
+        }
+        for linha in leitor
+    ]
+
+
+def _upsert_municipios(db: Session):
+    tabela = Municipios.__table__
+    if db.bind.dialect.name == "sqlite":
+        stmt = sqlite_insert(tabela)
+        return stmt.on_conflict_do_update(
+            index_elements=[tabela.c.id],
+            set_={
+                "nome": stmt.excluded.nome,
+                "uf": stmt.excluded.uf,
+                "uf_id_ibge": stmt.excluded.uf_id_ibge,
+            },
+        )
+    stmt = mysql_insert(tabela)
+    return stmt.on_duplicate_key_update(
+        nome=stmt.inserted.nome,
+        uf=stmt.inserted.uf,
+        uf_id_ibge=stmt.inserted.uf_id_ibge,
+    )
+
+
+def carregar_municipios(db: Session, caminho: str = ARQUIVO_MUNICIPIOS) -> int:
+    """
+    Grava os municípios do arquivo em lotes de TAMANHO_LOTE linhas e exclui
+    os que saíram dele, numa única transação. Se a UF de algum município
+    mudou (inclusive os novos e os excluídos), produtividade_estados dos anos
+    com produção dele é recalculada na mesma transação; o motor em memória é
+    recarregado por quem chama. Retorna quantos foram gravados; 0 quando o
+    arquivo é o mesmo (sha256) da última carga.
+    """
+    with open(caminho, "rb") as arquivo:
+        conteudo = arquivo.read()
+    hash_arquivo = hashlib.sha256(conteudo).hexdigest()
+    arquivo = os.path.basename(caminho)
+
+    carga = db.get(CargasReferencia, arquivo)
+    if carga is not None and carga.cr_hash == hash_arquivo:
+        return 0
+
+    registros = ler_municipios(conteudo)
+    anteriores = dict(db.execute(select(Municipios.id, Municipios.uf)).fetchall())
+    ufs = {registro["id"]: registro["uf"] for registro in registros}
+    removidos = sorted(set(anteriores) - set(ufs))
+    afetados = removidos + [
+        codigo for codigo, uf in ufs.items() if anteriores.get(codigo) != uf
+    ]
+    anos = []
+    try:
+        for inicio in range(0, len(removidos), TAMANHO_LOTE):
+            db.execute(
+                delete(Municipios).where(
+                    Municipios.id.in_(removidos[inicio : inicio + TAMANHO_LOTE])
+                )
+            )
+        upsert = _upsert_municipios(db)
+        for inicio in range(0, len(registros), TAMANHO_LOTE):
+            db.execute(upsert, registros[inicio : inicio + TAMANHO_LOTE])
+        if afetados:
+            # src.view importa este módulo
+            from src.view import recalcular_anos_dos_municipios
+
+            mapa_municipios.carregar(db)
+            anos = recalcular_anos_dos_municipios(afetados, db)
+        db.merge(
+            CargasReferencia(
+                cr_arquivo=arquivo,
+                cr_hash=hash_arquivo,
+                cr_carregado_em=datetime.now(),
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        mapa_municipios.limpar()
+        raise
+    mapa_municipios.carregar(db)
+    if anos:
+        logger.info("Produtividade dos estados recalculada para %s", anos)
+        versoes_dados.carregar(db, anos)
+    return len(registros)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    from src.database import SessionLocal, engine
+    from src.migracoes import aplicar_migracoes
+
+    aplicar_migracoes(engine)
+    with SessionLocal() as db:
+        total = carregar_municipios(db, *sys.argv[1:2])
+    if total:
+        logger.info("%s municípios carregados", total)
+    else:
+        logger.info("Arquivo de municípios sem alterações desde a última carga")
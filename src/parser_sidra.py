@@ -0,0 +1,132 @@
+import re
+from typing import Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+
+def _campo(nome: str):
+    # dentro de outros valores a chave apareceria escapada ("D1C\") e não casa
+    return re.compile(rb'"' + nome.encode() + rb'"\s*:\s*"([^"\\]*)"')
+
+
+_MUNICIPIO = _campo("D1C")
+_ANO = _campo("D3C")
+_VALOR = _campo("V")
+_VARIAVEL = _campo("D2C")
+_PRODUTO = _campo("D4C")
+
+
+class ColunasSidra(NamedTuple):
+    municipios: np.ndarray  # int32, D1C
+    anos: np.ndarray  # int16, D3C
+    valores: np.ndarray  # int64, V
+    # só com dimensoes=True (consultas com várias variáveis/produtos)
+    variaveis: Optional[np.ndarray] = None  # int32, D2C
+    produtos: Optional[np.ndarray] = None  # int32, D4C
+
+
+def _inteiros(textos: List[bytes], dtype) -> np.ndarray:
+    textos = np.array(textos, dtype=bytes)
+    inteiros = np.zeros(len(textos), dtype=dtype)
+    if not len(textos):
+        return inteiros
+    digitos = np.char.isdigit(textos)
+    inteiros[digitos] = textos[digitos].astype(dtype)
+    for i in np.flatnonzero(~digitos):
+        try:
+            inteiros[i] = int(float(textos[i]))
+        except ValueError:
+            # "-", "..", "...", "X": sem valor informado
+            pass
+    return inteiros
+
+
+class LeitorSidra:
+    """
+    Lê o JSON de /values do SIDRA de forma incremental, bloco a bloco, extraindo
+    apenas município (D1C), ano (D3C) e valor (V) direto para arrays tipados,
+    sem montar os objetos de cada linha.
+    A linha de cabeçalho ("Município (Código)", ...) é descartada e valores
+    não numéricos ("-", "...") viram 0. Com dimensoes=True também extrai a
+    variável (D2C) e o produto (D4C).
+    """
+
+    def __init__(self, dimensoes: bool = False):
+        self._buffer = b""
+        self._inicio = None
+        self._cabecalho = None
+        self._dimensoes = dimensoes
+        self._municipios = []
+        self._anos = []
+        self._valores = []
+        self._variaveis = []
+        self._produtos = []
+
+    def alimentar(self, dados: bytes) -> None:
+        if self._inicio is None and dados.strip():
+            self._inicio = dados.lstrip()[:1]
+        self._buffer += dados
+        # só processa até o fim do último objeto completo do buffer; cada objeto
+        # tem os três campos, então a i-ésima ocorrência de cada um é a mesma linha
+        fim = self._buffer.rfind(b"}") + 1
+        municipios = _MUNICIPIO.findall(self._buffer, 0, fim)
+        anos = _ANO.findall(self._buffer, 0, fim)
+        valores = _VALOR.findall(self._buffer, 0, fim)
+        variaveis = produtos = municipios
+        if self._dimensoes:
+            variaveis = _VARIAVEL.findall(self._buffer, 0, fim)
+            produtos = _PRODUTO.findall(self._buffer, 0, fim)
+        self._buffer = self._buffer[fim:]
+        if not (
+            len(municipios)
+            == len(anos)
+            == len(valores)
+            == len(variaveis)
+            == len(produtos)
+        ):
+            raise ValueError("Retorno do SIDRA com linhas sem D1C, D3C ou V")
+        if self._cabecalho is None and municipios:
+            self._cabecalho = not municipios[0].isdigit()
+            if self._cabecalho:
+                municipios, anos, valores = municipios[1:], anos[1:], valores[1:]
+                variaveis, produtos = variaveis[1:], produtos[1:]
+
+        self._municipios.append(_inteiros(municipios, np.int32))
+        self._anos.append(_inteiros(anos, np.int16))
+        self._valores.append(_inteiros(valores, np.int64))
+        if self._dimensoes:
+            self._variaveis.append(_inteiros(variaveis, np.int32))
+            self._produtos.append(_inteiros(produtos, np.int32))
+
+    def finalizar(self) -> ColunasSidra:
+        # depois do último objeto completo só pode restar o fechamento do array
+        restante = self._buffer.strip()
+        if self._cabecalho is None:
+            # nenhum objeto lido: o "[" de abertura ainda está no buffer
+            restante = restante[1:].lstrip()
+        if self._inicio != b"[" or restante != b"]":
+            raise ValueError("Retorno do SIDRA incompleto ou inválido")
+        return ColunasSidra(
+            municipios=np.concatenate(self._municipios),
+            anos=np.concatenate(self._anos),
+            valores=np.concatenate(self._valores),
+            variaveis=np.concatenate(self._variaveis) if self._dimensoes else None,
+            produtos=np.concatenate(self._produtos) if self._dimensoes else None,
+        )
+
+
+def ler_retorno_sidra(blocos: Iterable[bytes], dimensoes: bool = False) -> ColunasSidra:
+    leitor = LeitorSidra(dimensoes)
+    for bloco in blocos:
+        leitor.alimentar(bloco)
+    return leitor.finalizar()
+
+
+def concatenar_colunas(partes: List[ColunasSidra]) -> ColunasSidra:
+    """Junta retornos lidos em partes (ex.: um por UF) na ordem informada."""
+    return ColunasSidra(
+        *(
+            None if partes[0][i] is None else np.concatenate([p[i] for p in partes])
+            for i in range(len(ColunasSidra._fields))
+        )
+    )
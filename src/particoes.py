@@ -0,0 +1,170 @@
+"""
+Particionamento de producao_municipios por ano (MySQL).
+
+Com a tabela particionada por LIST (pm_ano), uma partição p<ano> por ano,
+excluir um ano é um TRUNCATE PARTITION e substituir um ano inteiro é carregar
+uma tabela de preparo e trocá-la com a partição (EXCHANGE PARTITION), de uma
+vez para os leitores. Sem particionamento (SQLite ou MySQL não particionado)
+src.view faz as mesmas operações com DELETE + INSERT numa transação.
+
+PARTICIONAR_POR_ANO=1 faz aplicar_migracoes particionar a tabela no MySQL.
+As operações daqui são DDL, que no MySQL encerra a transação corrente: rodam
+numa conexão própria, antes de a sessão de quem chama ler producao_municipios
+(senão o ALTER esperaria o metadata lock da própria sessão).
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Set
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from src.database import ProducaoMunicipios
+
+PARTICIONAR_POR_ANO = os.environ.get("PARTICIONAR_POR_ANO", "").lower() in (
+    "1",
+    "true",
+    "sim",
+)
+TABELA = ProducaoMunicipios.__tablename__
+TAMANHO_LOTE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _particao(ano: int) -> str:
+    return f"p{int(ano)}"
+
+
+class ParticoesAno:
+    """Partições de producao_municipios conhecidas por este processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._particionada: Optional[bool] = None
+        self._anos: Set[int] = set()
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._particionada = None
+            self._anos = set()
+
+    def _carregar(self, conexao: Connection) -> None:
+        nomes = conexao.execute(
+            text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS"
+                " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela"
+                " AND PARTITION_NAME IS NOT NULL"
+            ),
+            {"tabela": TABELA},
+        ).scalars()
+        anos = {int(nome[1:]) for nome in nomes if nome[1:].isdigit()}
+        self._particionada = bool(anos)
+        self._anos = anos
+
+    def particionada(self, engine: Engine) -> bool:
+        if engine.dialect.name != "mysql":
+            return False
+        if self._particionada is None:
+            with self._lock, engine.connect() as conexao:
+                self._carregar(conexao)
+        return self._particionada
+
+    def particionar(self, engine: Engine) -> None:
+        """Particiona a tabela pelos anos que ela já tem (operação única e longa)."""
+        if engine.dialect.name != "mysql" or self.particionada(engine):
+            return
+        with self._lock, engine.connect() as conexao:
+            anos = sorted(
+                conexao.execute(text(f"SELECT DISTINCT pm_ano FROM {TABELA}")).scalars()
+            ) or [datetime.now().year - 1]
+            logger.info("Particionando %s por ano (%s partições)", TABELA, len(anos))
+            particoes = ", ".join(
+                f"PARTITION {_particao(ano)} VALUES IN ({int(ano)})" for ano in anos
+            )
+            conexao.exec_driver_sql(
+                f"ALTER TABLE {TABELA} PARTITION BY LIST (pm_ano) ({particoes})"
+            )
+            self._carregar(conexao)
+
+    def garantir(self, engine: Engine, ano: int) -> None:
+        """Cria a partição do ano, se a tabela é particionada e ela não existe."""
+        if not self.particionada(engine) or ano in self._anos:
+            return
+        with self._lock, engine.connect() as conexao:
+            self._carregar(conexao)
+            if ano in self._anos:
+                return
+            try:
+                conexao.exec_driver_sql(
+                    f"ALTER TABLE {TABELA} ADD PARTITION"
+                    f" (PARTITION {_particao(ano)} VALUES IN ({int(ano)}))"
+                )
+            except DBAPIError:
+                # outro processo pode ter criado a mesma partição
+                self._carregar(conexao)
+                if ano not in self._anos:
+                    raise
+            self._anos.add(ano)
+
+    def truncar(self, engine: Engine, ano: int) -> bool:
+        """
+        Esvazia a partição do ano. Retorna False se a tabela não é
+        particionada (quem chama faz o DELETE).
+        """
+        if not self.particionada(engine):
+            return False
+        with self._lock, engine.connect() as conexao:
+            if ano not in self._anos:
+                self._carregar(conexao)
+            if ano not in self._anos:
+                # sem partição o ano não tem linhas
+                return True
+            conexao.exec_driver_sql(
+                f"ALTER TABLE {TABELA} TRUNCATE PARTITION {_particao(ano)}"
+            )
+        return True
+
+    @contextmanager
+    def trocar(self, engine: Engine, ano: int, registros: List[dict]) -> Iterator[None]:
+        """
+        Carrega os registros numa tabela de preparo e a troca com a partição
+        do ano. A tabela é particionada (ver `particionada`).
+
+        O EXCHANGE PARTITION não participa da transação de quem chama: as
+        tabelas derivadas do ano são gravadas dentro do bloco e, se ele
+        falhar, a partição é trocada de volta com a tabela de preparo (que
+        ficou com as linhas anteriores). Quem chama desfaz a própria transação
+        antes de sair do bloco, senão a volta esperaria o metadata lock dela.
+        """
+        self.garantir(engine, ano)
+        nome = f"{TABELA}_{_particao(ano)}"
+        preparo = ProducaoMunicipios.__table__.to_metadata(MetaData(), name=nome)
+        troca = f"ALTER TABLE {TABELA} EXCHANGE PARTITION {_particao(ano)} WITH TABLE {nome}"
+        with engine.connect() as conexao:
+            conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {nome}")
+            conexao.exec_driver_sql(f"CREATE TABLE {nome} LIKE {TABELA}")
+            try:
+                conexao.exec_driver_sql(f"ALTER TABLE {nome} REMOVE PARTITIONING")
+                with conexao.begin():
+                    for inicio in range(0, len(registros), TAMANHO_LOTE):
+                        conexao.execute(
+                            preparo.insert(), registros[inicio : inicio + TAMANHO_LOTE]
+                        )
+                conexao.exec_driver_sql(troca)
+                try:
+                    yield
+                except BaseException:
+                    logger.error("Desfazendo a troca da partição de %s", ano)
+                    conexao.exec_driver_sql(troca)
+                    raise
+            finally:
+                conexao.exec_driver_sql(f"DROP TABLE IF EXISTS {nome}")
+
+
+particoes_ano = ParticoesAno()
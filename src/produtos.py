@@ -0,0 +1,341 @@
+"""
+Carga de vários produtos do SIDRA em producao_produtos, a partir de uma lista
+declarativa de consultas no arquivo JSON indicado em PRODUTOS_SIDRA:
+
+    [{"tabela": 5457, "variaveis": {"216": "area", "214": "quantidade"},
+      "classificacao": 782, "produtos": "todos"}]
+
+"todos" usa as categorias da classificação nos metadados da tabela (API de
+agregados do IBGE). Cada requisição traz todas as variáveis e tantos produtos
+quantos cabem em SIDRA_LIMITE_VALORES; as requisições de todos os lotes e anos
+rodam em paralelo (SIDRA_CONCORRENCIA), com o mesmo cache em disco das
+consultas do produto padrão.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Literal, NamedTuple, Optional, Tuple, Union
+
+import httpx
+import pandas as pd
+from databases import Database
+from pydantic import BaseModel, TypeAdapter, field_validator
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src import service
+from src.cargas import hashes_processados, registrar_processamento
+from src.database import ProducaoProdutos, VersoesProdutos
+from src.exceptions import ProcessamentoException
+from src.metricas import etapa
+from src.parser_sidra import ColunasSidra
+from src.service import RetornoSidra, baixar_sidra
+from src.versoes import incrementar_versao, versoes_produtos
+from src.view import TAMANHO_LOTE
+
+PRODUTO_PADRAO = 40124
+PRODUTOS_SIDRA = os.environ.get("PRODUTOS_SIDRA")
+# máximo de valores por requisição aceito pela API do SIDRA
+SIDRA_LIMITE_VALORES = int(os.environ.get("SIDRA_LIMITE_VALORES", 100000))
+IBGE_AGREGADOS_URL = os.environ.get(
+    "IBGE_AGREGADOS_URL", "https://servicodados.ibge.gov.br/api/v3/agregados"
+)
+SIDRA_URL_PRODUTOS = (
+    service.SIDRA_BASE_URL
+    + "/values/t/{tabela}/n6/all/v/{variaveis}/p/{ano}/c{classificacao}/{produtos}"
+    + "?formato=json"
+)
+TOTAL_MUNICIPIOS = 5570
+COLUNAS_VARIAVEIS = {"area": "pp_area", "quantidade": "pp_quantidade"}
+
+logger = logging.getLogger(__name__)
+
+
+class ConsultaProdutos(BaseModel):
+    tabela: int = 5457
+    # código da variável -> "area" ou "quantidade"
+    variaveis: Dict[int, str] = {216: "area", 214: "quantidade"}
+    classificacao: int = 782
+    produtos: Union[List[int], Literal["todos"]] = "todos"
+
+    @field_validator("variaveis")
+    def variaveis_val(cls, value):
+        for variavel, campo in value.items():
+            assert (
+                campo in COLUNAS_VARIAVEIS
+            ), f"Variável {variavel} deve ser 'area' ou 'quantidade'"
+        return value
+
+
+class LoteProdutos(NamedTuple):
+    consulta: ConsultaProdutos
+    ano: int
+    produtos: Tuple[int, ...]
+
+    @property
+    def chave(self) -> str:
+        variaveis = "-".join(str(variavel) for variavel in self.consulta.variaveis)
+        produtos = hashlib.sha256(
+            ",".join(str(produto) for produto in self.produtos).encode()
+        ).hexdigest()[:12]
+        return (
+            f"t{self.consulta.tabela}-v{variaveis}-p{self.ano}"
+            f"-c{self.consulta.classificacao}-{produtos}"
+        )
+
+    @property
+    def url(self) -> str:
+        return SIDRA_URL_PRODUTOS.format(
+            tabela=self.consulta.tabela,
+            variaveis=",".join(str(variavel) for variavel in self.consulta.variaveis),
+            ano=self.ano,
+            classificacao=self.consulta.classificacao,
+            produtos=",".join(str(produto) for produto in self.produtos),
+        )
+
+
+def carregar_consultas(caminho: Optional[str]) -> List[ConsultaProdutos]:
+    if not caminho:
+        return []
+    with open(caminho, "rb") as arquivo:
+        return TypeAdapter(List[ConsultaProdutos]).validate_json(arquivo.read())
+
+
+consultas_produtos = carregar_consultas(PRODUTOS_SIDRA)
+
+
+def produtos_por_lote(consulta: ConsultaProdutos) -> int:
+    return max(SIDRA_LIMITE_VALORES // (TOTAL_MUNICIPIOS * len(consulta.variaveis)), 1)
+
+
+def dividir_lotes(
+    consulta: ConsultaProdutos, produtos: Iterable[int], anos: Iterable[int]
+) -> List[LoteProdutos]:
+    produtos = sorted(set(produtos))
+    tamanho = produtos_por_lote(consulta)
+    return [
+        LoteProdutos(consulta, ano, tuple(produtos[inicio : inicio + tamanho]))
+        for ano in anos
+        for inicio in range(0, len(produtos), tamanho)
+    ]
+
+
+async def resolver_produtos(
+    client: httpx.AsyncClient, consulta: ConsultaProdutos
+) -> List[int]:
+    if consulta.produtos != "todos":
+        return consulta.produtos
+    # os metadados passam pelo cache do SIDRA (TTL e modo offline)
+    retorno = await baixar_sidra(
+        client,
+        f"metadados-t{consulta.tabela}",
+        f"{IBGE_AGREGADOS_URL}/{consulta.tabela}/metadados",
+    )
+    with gzip.open(retorno.caminho, "rb") as arquivo:
+        metadados = json.load(arquivo)
+    for classificacao in metadados["classificacoes"]:
+        if classificacao["id"] == consulta.classificacao:
+            return [
+                categoria["id"]
+                for categoria in classificacao["categorias"]
+                if categoria["nome"].lower() != "total"
+            ]
+    raise ProcessamentoException(
+        f"Classificação {consulta.classificacao} não encontrada na tabela"
+        f" {consulta.tabela}"
+    )
+
+
+async def consultar_produtos_async(
+    consultas: Iterable[ConsultaProdutos],
+    anos: Iterable[int],
+    transport: httpx.AsyncBaseTransport = None,
+) -> List[Tuple[LoteProdutos, Union[RetornoSidra, Exception]]]:
+    """
+    Divide as consultas em lotes por ano e baixa todos com um único cliente
+    HTTP, no máximo SIDRA_CONCORRENCIA requisições em voo.
+    """
+    semaforo = asyncio.Semaphore(service.SIDRA_CONCORRENCIA)
+    limites = httpx.Limits(
+        max_connections=service.SIDRA_CONCORRENCIA,
+        max_keepalive_connections=service.SIDRA_CONCORRENCIA,
+    )
+    anos = list(anos)
+    async with httpx.AsyncClient(
+        timeout=service.SIDRA_TIMEOUT, limits=limites, transport=transport
+    ) as client:
+        lotes = []
+        for consulta in consultas:
+            produtos = await resolver_produtos(client, consulta)
+            lotes.extend(dividir_lotes(consulta, produtos, anos))
+
+        async def baixar(lote: LoteProdutos):
+            async with semaforo:
+                return await baixar_sidra(client, lote.chave, lote.url)
+
+        retornos = await asyncio.gather(
+            *(baixar(lote) for lote in lotes), return_exceptions=True
+        )
+    return list(zip(lotes, retornos))
+
+
+def montar_dataframe_produtos(
+    consulta: ConsultaProdutos, colunas: ColunasSidra
+) -> pd.DataFrame:
+    """Uma linha por produto, município e ano, com uma coluna por variável."""
+    chaves = ["pp_produto", "pp_municipio_id", "pp_ano"]
+    df = None
+    for variavel, campo in consulta.variaveis.items():
+        da_variavel = colunas.variaveis == variavel
+        df_variavel = pd.DataFrame(
+            {
+                "pp_produto": colunas.produtos[da_variavel],
+                "pp_municipio_id": colunas.municipios[da_variavel],
+                "pp_ano": colunas.anos[da_variavel],
+                COLUNAS_VARIAVEIS[campo]: colunas.valores[da_variavel],
+            }
+        )
+        df = df_variavel if df is None else df.merge(df_variavel, on=chaves)
+    for coluna in COLUNAS_VARIAVEIS.values():
+        if coluna not in df:
+            df[coluna] = None
+    return df
+
+
+def _upsert_produtos(db: Session):
+    tabela = ProducaoProdutos.__table__
+    if db.bind.dialect.name == "sqlite":
+        stmt = sqlite_insert(tabela)
+        return stmt.on_conflict_do_update(
+            index_elements=[
+                tabela.c.pp_produto,
+                tabela.c.pp_municipio_id,
+                tabela.c.pp_ano,
+            ],
+            set_={
+                "pp_area": stmt.excluded.pp_area,
+                "pp_quantidade": stmt.excluded.pp_quantidade,
+            },
+        )
+    stmt = mysql_insert(tabela)
+    return stmt.on_duplicate_key_update(
+        pp_area=stmt.inserted.pp_area, pp_quantidade=stmt.inserted.pp_quantidade
+    )
+
+
+def _inteiro(valor) -> Optional[int]:
+    return None if valor is None else int(valor)
+
+
+def gravar_produtos(ano: int, df: pd.DataFrame, db: Session) -> int:
+    """Grava as linhas do lote e incrementa a versão do ano. Não faz commit."""
+    registros = [
+        {
+            "pp_produto": int(produto),
+            "pp_municipio_id": int(municipio_id),
+            "pp_ano": int(ano_linha),
+            "pp_area": _inteiro(area),
+            "pp_quantidade": _inteiro(quantidade),
+        }
+        for produto, municipio_id, ano_linha, area, quantidade in zip(
+            df["pp_produto"],
+            df["pp_municipio_id"],
+            df["pp_ano"],
+            df["pp_area"],
+            df["pp_quantidade"],
+        )
+    ]
+    upsert = _upsert_produtos(db)
+    for inicio in range(0, len(registros), TAMANHO_LOTE):
+        db.execute(upsert, registros[inicio : inicio + TAMANHO_LOTE])
+    if registros:
+        incrementar_versao(ano, db, VersoesProdutos)
+    return len(registros)
+
+
+def processar_produtos(
+    anos: Iterable[int],
+    db: Session,
+    consultas: Optional[List[ConsultaProdutos]] = None,
+    transport: httpx.AsyncBaseTransport = None,
+) -> Dict[int, int]:
+    """
+    Carrega os produtos declarados nos anos informados. Cada lote é gravado na
+    própria transação e ignorado se o retorno tem o mesmo hash da última
+    carga. Retorna {ano: linhas gravadas}.
+    """
+    consultas = consultas_produtos if consultas is None else consultas
+    anos = list(anos)
+    gravados = {ano: 0 for ano in anos}
+    if not consultas:
+        return gravados
+    with etapa("sidra"):
+        retornos = asyncio.run(consultar_produtos_async(consultas, anos, transport))
+
+    processados = hashes_processados(
+        [lote.chave for lote, retorno in retornos if isinstance(retorno, RetornoSidra)],
+        db,
+    )
+    falhas = []
+    for lote, retorno in retornos:
+        if isinstance(retorno, Exception):
+            logger.error("Falha ao consultar o SIDRA (%s): %s", lote.chave, retorno)
+            falhas.append(lote.chave)
+            continue
+        if processados.get(lote.chave) == retorno.hash:
+            continue
+        try:
+            with etapa("parse"):
+                colunas = retorno.colunas(dimensoes=True)
+            with etapa("merge"):
+                df = montar_dataframe_produtos(lote.consulta, colunas)
+        except ValueError:
+            retorno.descartar()
+            logger.error("Retorno do SIDRA inválido (%s)", lote.chave)
+            falhas.append(lote.chave)
+            continue
+        try:
+            with etapa("upsert"):
+                gravados[lote.ano] += gravar_produtos(lote.ano, df, db)
+            registrar_processamento(lote.ano, [retorno], db)
+        except Exception:
+            db.rollback()
+            raise
+    versoes_produtos.carregar(db, anos)
+    if falhas:
+        raise ProcessamentoException(
+            f"Falha ao carregar {len(falhas)} lote(s) de produtos: {', '.join(falhas)}"
+        )
+    return gravados
+
+
+async def get_municipio_produto(
+    produto: int, municipio_id: int, database: Database, ano: Optional[int] = None
+) -> List[dict]:
+    consulta = select(
+        ProducaoProdutos.pp_municipio_id,
+        ProducaoProdutos.pp_ano,
+        ProducaoProdutos.pp_area,
+        ProducaoProdutos.pp_quantidade,
+    ).where(
+        ProducaoProdutos.pp_produto == produto,
+        ProducaoProdutos.pp_municipio_id == municipio_id,
+    )
+    if ano is not None:
+        consulta = consulta.where(ProducaoProdutos.pp_ano == ano)
+    linhas = await database.fetch_all(consulta.order_by(ProducaoProdutos.pp_ano))
+    return [
+        {
+            "municipio_id": linha[0],
+            "ano": linha[1],
+            "area_colhida": linha[2],
+            "quantidade_produzida": linha[3],
+        }
+        for linha in linhas
+    ]
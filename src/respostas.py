@@ -0,0 +1,53 @@
+from decimal import Decimal
+from typing import Any, AsyncIterator, List
+
+import orjson
+from starlette.responses import Response
+
+
+def _padrao(valor: Any):
+    # Decimal sai como texto, igual à serialização do pydantic
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError
+
+
+class RespostaJSON(Response):
+    """
+    Resposta codificada direto com orjson. Retornar uma Response faz o FastAPI
+    pular a validação pelo response_model, que continua só documentando a rota.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+
+
+def padrao_retorno(
+    data: Any = None, success: bool = True, message: str = "", status_code: int = 200
+) -> RespostaJSON:
+    """Mesmo envelope de PadraoRetorno, sem montar os modelos."""
+    return RespostaJSON(
+        {"success": success, "data": data, "message": message},
+        status_code=status_code,
+    )
+
+
+async def padrao_retorno_em_partes(
+    partes: AsyncIterator[List[Any]],
+) -> AsyncIterator[bytes]:
+    """
+    Envelope de PadraoRetorno com `data` escrito em partes, para
+    StreamingResponse: cada lista recebida é codificada e enviada na hora.
+    """
+    yield b'{"success":true,"data":['
+    separador = b""
+    async for itens in partes:
+        if itens:
+            yield separador + b",".join(
+                orjson.dumps(item, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+                for item in itens
+            )
+            separador = b","
+    yield b'],"message":""}'
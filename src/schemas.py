@@ -1,8 +1,9 @@
 from datetime import datetime
 from decimal import Decimal
+from enum import Enum
 
 from pydantic import BaseModel, field_validator, Field, RootModel
-from typing import List, Optional
+from typing import List, Optional, Union
 
 
 class DadosPlantacao(BaseModel):
@@ -21,6 +22,12 @@ class DadosPlantacao(BaseModel):
     D4N: str  # "Produto das lavouras temporárias e permanentes"
 
 
+class FormatoExportacao(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    parquet = "parquet"
+
+
 class RetornoConsultaPlantacoes(RootModel):
     root: List[DadosPlantacao]
 
@@ -32,10 +39,6 @@ class ProducaoMunicipios(BaseModel):
     quantidade_produzida: int
 
 
-class ListProducaoMunicipios(BaseModel):
-    dados: Optional[List[ProducaoMunicipios]] = None
-
-
 class ProdutividadePorEstado(BaseModel):
     estado: str
     produtividade: Decimal
@@ -86,6 +89,59 @@ class ProdutividadeAnoEstados(BaseModel):
         return [v.upper().strip() for v in value]
 
 
+class InputLoteMunicipios(BaseModel):
+    municipios: Optional[List[int]] = None
+    uf: Optional[str] = None
+    ano_inicio: int = 2018
+    ano_fim: Optional[int] = None
+
+    @field_validator("municipios")
+    def municipios_val(cls, value):
+        for v in value or []:
+            assert (
+                len(str(v)) <= 7
+            ), f"Código do município {v} deve ter no máximo 7 caracteres"
+        return value
+
+    @field_validator("uf")
+    def uf_val(cls, value):
+        return value.upper().strip() if value else value
+
+
+class ResultadoCarga(BaseModel):
+    ano: int
+    inseridos: int = 0
+    atualizados: int = 0
+    inalterados: int = 0
+    ignorado: bool = False  # retorno do SIDRA igual ao da última carga
+    # falha na carga dos demais produtos (PRODUTOS_SIDRA); a do produto padrão
+    # está nos contadores acima
+    erro_produtos: Optional[str] = None
+
+
+class SituacaoTarefa(str, Enum):
+    pendente = "pendente"
+    executando = "executando"
+    concluida = "concluida"
+    falhou = "falhou"
+
+
+class ProgressoAno(ResultadoCarga):
+    situacao: SituacaoTarefa = SituacaoTarefa.pendente
+    iniciado_em: Optional[datetime] = None
+    concluido_em: Optional[datetime] = None
+    duracao: Optional[float] = None  # segundos
+    erro: Optional[str] = None
+
+
+class Tarefa(BaseModel):
+    id: str
+    situacao: SituacaoTarefa
+    criada_em: datetime
+    substituir: bool = False  # troca os anos inteiros (substituir_ano)
+    anos: List[ProgressoAno]
+
+
 class PadraoRetorno(BaseModel):
     success: bool = False
     data: Optional[List] = None
@@ -100,6 +156,30 @@ class RetornoProdutividades(PadraoRetorno):
     data: Optional[List[ProdutividadePorEstado]] = None
 
 
+class AnaliseAno(BaseModel):
+    ano: int
+    area_colhida: Optional[int] = None
+    quantidade_produzida: Optional[int] = None
+    produtividade: Optional[float] = None  # quantidade / área
+    variacao_quantidade: Optional[int] = None  # em relação ao ano anterior
+    variacao_percentual: Optional[float] = None  # fração: 0.1 = 10%
+    media_movel_quantidade: Optional[float] = None
+
+
+class AnaliseSerie(BaseModel):
+    nivel: str  # municipio, uf ou brasil
+    codigo: Optional[Union[int, str]] = None
+    ano_inicio: int
+    ano_fim: int
+    janela: int
+    cagr_quantidade: Optional[float] = None
+    anos: List[AnaliseAno]
+
+
+class RetornoAnalise(PadraoRetorno):
+    data: Optional[List[AnaliseSerie]] = None
+
+
 class AreaColhida(BaseModel):
     area_colhida: int
 
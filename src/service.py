@@ -1,17 +1,226 @@
-import json
-import requests
-from src.schemas import RetornoConsultaPlantacoes
+import asyncio
+import gzip
+import hashlib
+import os
+from typing import Dict, Iterable, NamedTuple, Tuple, Union
 
+import httpx
+from src.cache_sidra import cache_sidra
+from src.exceptions import ProcessamentoException
+from src.parser_sidra import ColunasSidra, concatenar_colunas, ler_retorno_sidra
+from src.utils import UFS_IBGE
 
-def consulta_area_colhida(year: int) -> json:
-    area_colhida = f"https://apisidra.ibge.gov.br/values/t/5457/n6/all/v/216/p/{year}/c782/40124?formato=json"
-    # exemplo modelo de retorno padrão com model do pydantic
-    consulta_plantacoes = RetornoConsultaPlantacoes.model_validate(
-        requests.get(area_colhida).json()
+# SIDRA_BASE_URL permite apontar para um servidor local (ex.: benchmarks)
+SIDRA_BASE_URL = os.environ.get("SIDRA_BASE_URL", "https://apisidra.ibge.gov.br")
+SIDRA_URL = (
+    SIDRA_BASE_URL
+    + "/values/t/5457/n6/all/v/{variavel}/p/{ano}/c782/40124?formato=json"
+)
+SIDRA_CHAVE = "t5457-v{variavel}-p{ano}-c782-40124"
+# uma requisição por UF (n6 in n3 XX) no lugar de n6/all
+SIDRA_URL_UF = (
+    SIDRA_BASE_URL
+    + "/values/t/5457/n6/in%20n3%20{uf}/v/{variavel}/p/{ano}/c782/40124?formato=json"
+)
+SIDRA_CHAVE_UF = SIDRA_CHAVE + "-n3{uf}"
+VARIAVEL_AREA_COLHIDA = 216
+VARIAVEL_QUANTIDADE_PRODUZIDA = 214
+
+SIDRA_CONCORRENCIA = int(os.environ.get("SIDRA_CONCORRENCIA", 4))
+SIDRA_TENTATIVAS = int(os.environ.get("SIDRA_TENTATIVAS", 3))
+SIDRA_TIMEOUT = float(os.environ.get("SIDRA_TIMEOUT", 60))
+SIDRA_BACKOFF = float(os.environ.get("SIDRA_BACKOFF", 1))
+SIDRA_POR_UF = os.environ.get("SIDRA_POR_UF", "").lower() in ("1", "true", "sim")
+TAMANHO_BLOCO = 64 * 1024
+
+
+class RetornoSidra(NamedTuple):
+    chave: str
+    hash: str
+    caminho: str
+
+    def colunas(self, dimensoes: bool = False) -> ColunasSidra:
+        with gzip.open(self.caminho, "rb") as arquivo:
+            return ler_retorno_sidra(
+                iter(lambda: arquivo.read(TAMANHO_BLOCO), b""), dimensoes
+            )
+
+    def descartar(self) -> None:
+        cache_sidra.remover(self.chave)
+
+
+class RetornoSidraPorUF(NamedTuple):
+    """
+    Consulta baixada em uma parte por UF. O hash combina os das partes, que
+    ficam cada uma na própria entrada do cache.
+    """
+
+    chave: str
+    hash: str
+    partes: Tuple[RetornoSidra, ...]
+
+    @classmethod
+    def de_partes(
+        cls, chave: str, partes: Iterable[RetornoSidra]
+    ) -> "RetornoSidraPorUF":
+        partes = tuple(partes)
+        hash_partes = hashlib.sha256(
+            ",".join(parte.hash for parte in partes).encode()
+        ).hexdigest()
+        return cls(chave=chave, hash=hash_partes, partes=partes)
+
+    def colunas(self, dimensoes: bool = False) -> ColunasSidra:
+        # partes em ordem de código da UF: mesma ordem de municípios do n6/all
+        return concatenar_colunas([parte.colunas(dimensoes) for parte in self.partes])
+
+    def descartar(self) -> None:
+        for parte in self.partes:
+            parte.descartar()
+
+
+def _pode_repetir(erro: Exception) -> bool:
+    if isinstance(erro, httpx.HTTPStatusError):
+        return erro.response.status_code == 429 or erro.response.status_code >= 500
+    return isinstance(erro, httpx.TransportError)
+
+
+def _retorno_cache(entrada) -> RetornoSidra:
+    return RetornoSidra(
+        chave=entrada.chave,
+        hash=entrada.hash,
+        caminho=cache_sidra.caminho_objeto(entrada.hash),
+    )
+
+
+async def consulta_sidra_async(
+    client: httpx.AsyncClient, variavel: int, ano: int
+) -> RetornoSidra:
+    """
+    Consulta uma variável do SIDRA para um ano passando pelo cache em disco:
+    dentro do TTL (ou no modo offline) a resposta vem do cache; depois dele a
+    requisição é condicional e um 304 só renova a entrada. O corpo é gravado
+    em streaming e a requisição é repetida com backoff exponencial em falhas
+    de rede, 429 e 5xx.
+    """
+    return await baixar_sidra(
+        client,
+        SIDRA_CHAVE.format(variavel=variavel, ano=ano),
+        SIDRA_URL.format(variavel=variavel, ano=ano),
+    )
+
+
+async def baixar_sidra(client: httpx.AsyncClient, chave: str, url: str) -> RetornoSidra:
+    """Busca `url` no SIDRA pelo cache em disco, registrada sob `chave`."""
+    entrada = cache_sidra.entrada(chave)
+    if entrada and (cache_sidra.offline or cache_sidra.fresca(entrada)):
+        return _retorno_cache(entrada)
+    if cache_sidra.offline:
+        raise ProcessamentoException(
+            f"Consulta {chave} não está no cache do SIDRA (modo offline)"
+        )
+
+    cabecalhos = cache_sidra.cabecalhos_condicionais(entrada)
+    for tentativa in range(1, SIDRA_TENTATIVAS + 1):
+        try:
+            async with client.stream("GET", url, headers=cabecalhos) as resposta:
+                if resposta.status_code == 304 and entrada:
+                    return _retorno_cache(cache_sidra.renovar(entrada))
+                resposta.raise_for_status()
+                gravador = cache_sidra.gravador(chave)
+                try:
+                    async for bloco in resposta.aiter_bytes(TAMANHO_BLOCO):
+                        gravador.escrever(bloco)
+                except BaseException:
+                    gravador.descartar()
+                    raise
+                return _retorno_cache(
+                    gravador.concluir(
+                        etag=resposta.headers.get("etag"),
+                        ultima_modificacao=resposta.headers.get("last-modified"),
+                    )
+                )
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if tentativa == SIDRA_TENTATIVAS or not _pode_repetir(e):
+                raise
+            await asyncio.sleep(SIDRA_BACKOFF * 2 ** (tentativa - 1))
+
+
+async def consulta_sidra_por_uf_async(
+    client: httpx.AsyncClient, semaforo: asyncio.Semaphore, variavel: int, ano: int
+) -> RetornoSidraPorUF:
+    """
+    Consulta uma variável do SIDRA para um ano em uma requisição por UF, todas
+    em paralelo (limitadas pelo semáforo). Cada parte é repetida sozinha em
+    caso de falha e fica no cache assim que termina: se alguma UF falhar, a
+    próxima execução baixa só as que faltam.
+    """
+
+    async def baixar(uf: int) -> RetornoSidra:
+        async with semaforo:
+            return await baixar_sidra(
+                client,
+                SIDRA_CHAVE_UF.format(variavel=variavel, ano=ano, uf=uf),
+                SIDRA_URL_UF.format(variavel=variavel, ano=ano, uf=uf),
+            )
+
+    partes = await asyncio.gather(
+        *(baixar(uf) for uf in sorted(UFS_IBGE)), return_exceptions=True
     )
-    return consulta_plantacoes.model_dump()
+    for parte in partes:
+        if isinstance(parte, BaseException):
+            raise parte
+    return RetornoSidraPorUF.de_partes(
+        SIDRA_CHAVE.format(variavel=variavel, ano=ano), partes
+    )
+
+
+async def consultar_plantacoes_async(
+    anos: Iterable[int],
+    transport: httpx.AsyncBaseTransport = None,
+    por_uf: bool = None,
+) -> Dict[int, Dict[int, Union[RetornoSidra, RetornoSidraPorUF, Exception]]]:
+    """
+    Consulta área colhida e quantidade produzida de todos os anos ao mesmo tempo,
+    com um único cliente HTTP e no máximo SIDRA_CONCORRENCIA requisições em voo.
+    Com por_uf (padrão SIDRA_POR_UF), cada consulta é dividida por UF.
+    Retorna {ano: {variavel: retorno ou exceção}}.
+    """
+    por_uf = SIDRA_POR_UF if por_uf is None else por_uf
+    semaforo = asyncio.Semaphore(SIDRA_CONCORRENCIA)
+    limites = httpx.Limits(
+        max_connections=SIDRA_CONCORRENCIA,
+        max_keepalive_connections=SIDRA_CONCORRENCIA,
+    )
+    pares = [
+        (ano, variavel)
+        for ano in anos
+        for variavel in (VARIAVEL_AREA_COLHIDA, VARIAVEL_QUANTIDADE_PRODUZIDA)
+    ]
+
+    async with httpx.AsyncClient(
+        timeout=SIDRA_TIMEOUT, limits=limites, transport=transport
+    ) as client:
+
+        async def consultar(ano: int, variavel: int):
+            if por_uf:
+                return await consulta_sidra_por_uf_async(
+                    client, semaforo, variavel, ano
+                )
+            async with semaforo:
+                return await consulta_sidra_async(client, variavel, ano)
+
+        retornos = await asyncio.gather(
+            *(consultar(ano, variavel) for ano, variavel in pares),
+            return_exceptions=True,
+        )
+
+    resultado = {}
+    for (ano, variavel), retorno in zip(pares, retornos):
+        resultado.setdefault(ano, {})[variavel] = retorno
+    return resultado
 
 
-def consulta_quantidade_produzida(year: int) -> json:
-    quantidade_produzida = f"https://apisidra.ibge.gov.br/values/t/5457/n6/all/v/214/p/{year}/c782/40124?formato=json"
-    return requests.get(quantidade_produzida).json()
+def consultar_plantacoes(
+    anos: Iterable[int],
+) -> Dict[int, Dict[int, Union[RetornoSidra, RetornoSidraPorUF, Exception]]]:
+    return asyncio.run(consultar_plantacoes_async(anos))
@@ -0,0 +1,72 @@
+"""
+Servidor de produção com vários workers do uvicorn.
+
+O processo principal aplica as migrações, carrega os municípios, publica o
+snapshot de producao_municipios em DADOS_COMPARTILHADOS_DIR (mapeado por todos
+os workers, ver src.compartilhado) e executa as tarefas de processamento. O
+pool de conexões DB_POOL_MAX é dividido entre os workers.
+
+    python -m src.servidor [--workers N] [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import logging
+import os
+
+if __name__ == "__main__":
+    # o .env precisa estar carregado antes de src.database montar a URL
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def configurar_ambiente(workers: int) -> None:
+    """Ambiente herdado pelos workers; precisa vir antes de importar src.*"""
+    os.environ.setdefault(
+        "DADOS_COMPARTILHADOS_DIR", os.path.join(".cache", "compartilhado")
+    )
+    os.environ["MOTOR_MEMORIA"] = "1"
+    pool_max = max(int(os.environ.get("DB_POOL_MAX", 20)) // workers, 1)
+    pool_min = min(int(os.environ.get("DB_POOL_MIN", 1)), pool_max)
+    os.environ["DB_POOL_MAX"] = str(pool_max)
+    os.environ["DB_POOL_MIN"] = str(pool_min)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de produção")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    argumentos = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    configurar_ambiente(argumentos.workers)
+
+    import uvicorn
+
+    from src.database import SessionLocal, engine
+    from src.migracoes import aplicar_migracoes
+    from src.municipios import carregar_municipios
+    from src.tarefas import TAREFAS_INTERVALO, fila_tarefas
+    from src.view import recarregar_motor_memoria
+
+    aplicar_migracoes(engine)
+    with SessionLocal() as db:
+        carregar_municipios(db)
+        recarregar_motor_memoria(db)
+    fila_tarefas.iniciar()
+    fila_tarefas.acompanhar(TAREFAS_INTERVALO)
+    try:
+        uvicorn.run(
+            "main:app",
+            host=argumentos.host,
+            port=argumentos.port,
+            workers=argumentos.workers,
+        )
+    finally:
+        fila_tarefas.encerrar()
+
+
+if __name__ == "__main__":
+    main()
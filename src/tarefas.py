@@ -0,0 +1,371 @@
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from itertools import groupby
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from src.database import SessionLocal
+from src.produtos import processar_produtos
+from src.schemas import ProgressoAno, ResultadoCarga, SituacaoTarefa, Tarefa
+from src.view import processar_anos, recarregar_motor_memoria
+
+TAREFAS_DB = os.environ.get("TAREFAS_DB", os.path.join(".cache", "tarefas.sqlite3"))
+TAREFAS_WORKERS = int(os.environ.get("TAREFAS_WORKERS", 4))
+TAREFAS_INTERVALO = float(os.environ.get("TAREFAS_INTERVALO", 2))
+
+logger = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id TEXT PRIMARY KEY,
+    criada_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tarefas_anos (
+    tarefa_id TEXT NOT NULL REFERENCES tarefas (id),
+    ano INTEGER NOT NULL,
+    situacao TEXT NOT NULL,
+    substituir INTEGER NOT NULL DEFAULT 0,
+    inseridos INTEGER NOT NULL DEFAULT 0,
+    atualizados INTEGER NOT NULL DEFAULT 0,
+    inalterados INTEGER NOT NULL DEFAULT 0,
+    ignorado INTEGER NOT NULL DEFAULT 0,
+    iniciado_em TEXT,
+    concluido_em TEXT,
+    erro TEXT,
+    erro_produtos TEXT,
+    PRIMARY KEY (tarefa_id, ano)
+);
+CREATE INDEX IF NOT EXISTS ix_tarefas_anos_situacao ON tarefas_anos (situacao);
+"""
+
+
+Resultados = Dict[int, Union[ResultadoCarga, Exception]]
+
+
+def processar_anos_em_sessao(anos: List[int], substituir: bool = False) -> Resultados:
+    db = SessionLocal()
+    try:
+        # o motor em memória é recarregado (e publicado aos workers, com as
+        # versões dos produtos) só depois dos produtos
+        resultados = processar_anos(anos, db, substituir, recarregar=False)
+        carregados = [
+            ano
+            for ano, resultado in resultados.items()
+            if not isinstance(resultado, Exception)
+        ]
+        if carregados:
+            # demais produtos declarados em PRODUTOS_SIDRA
+            try:
+                processar_produtos(carregados, db)
+            except Exception as e:
+                # o produto padrão desses anos já está gravado
+                logger.error("Falha ao carregar os produtos de %s: %s", carregados, e)
+                erro = str(e) or e.__class__.__name__
+                for ano in carregados:
+                    resultados[ano] = resultados[ano].model_copy(
+                        update={"erro_produtos": erro}
+                    )
+        return resultados
+    finally:
+        try:
+            recarregar_motor_memoria(db)
+        finally:
+            db.close()
+
+
+def _data(valor: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def _situacao(anos: List[ProgressoAno]) -> SituacaoTarefa:
+    situacoes = {ano.situacao for ano in anos}
+    if situacoes == {SituacaoTarefa.pendente}:
+        return SituacaoTarefa.pendente
+    if situacoes & {SituacaoTarefa.pendente, SituacaoTarefa.executando}:
+        return SituacaoTarefa.executando
+    if SituacaoTarefa.falhou in situacoes:
+        return SituacaoTarefa.falhou
+    return SituacaoTarefa.concluida
+
+
+class FilaTarefas:
+    """
+    Executa o processamento dos anos em segundo plano. Os anos que uma tarefa
+    coloca na fila rodam juntos num worker: uma consulta ao SIDRA para todos
+    e uma recarga dos dados em memória no fim (src.view.processar_anos).
+
+    Cada tarefa agrupa um ou mais anos e tem o progresso de cada ano gravado em
+    um SQLite local. Um ano já na fila ou em execução não é processado de novo:
+    a nova tarefa passa a acompanhar a execução existente. Anos pendentes ou
+    interrompidos são retomados em `iniciar`. Tarefas com substituir trocam o
+    ano inteiro e não se juntam às execuções normais do mesmo ano; as duas
+    execuções de um ano nunca rodam ao mesmo tempo.
+    """
+
+    def __init__(
+        self,
+        caminho: str,
+        workers: int,
+        processar: Callable[[List[int], bool], Resultados] = processar_anos_em_sessao,
+    ):
+        self.caminho = caminho
+        self.workers = workers
+        self.processar = processar
+        self._lock = threading.RLock()
+        self._conexao: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # (ano, substituir) -> tarefas que aguardam a execução daquele ano
+        self._inscritos: Dict[Tuple[int, bool], List[str]] = {}
+        self._executando: Set[Tuple[int, bool]] = set()
+        self._travas_anos: Dict[int, threading.Lock] = {}
+        self._parar: Optional[threading.Event] = None
+
+    def iniciar(self, executar: bool = True) -> None:
+        """
+        Com executar=False (workers de src.servidor), as tarefas só são
+        gravadas e consultadas; quem executa é o processo principal, que
+        chama `acompanhar` para pegar as tarefas criadas pelos workers.
+        """
+        diretorio = os.path.dirname(self.caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._conexao = sqlite3.connect(
+            self.caminho, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(_ESQUEMA)
+        colunas = {
+            linha[1]
+            for linha in self._conexao.execute("PRAGMA table_info(tarefas_anos)")
+        }
+        if "substituir" not in colunas:
+            self._conexao.execute(
+                "ALTER TABLE tarefas_anos"
+                " ADD COLUMN substituir INTEGER NOT NULL DEFAULT 0"
+            )
+        if "erro_produtos" not in colunas:
+            self._conexao.execute(
+                "ALTER TABLE tarefas_anos ADD COLUMN erro_produtos TEXT"
+            )
+        if not executar:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="tarefas"
+        )
+        with self._lock:
+            interrompidos = self._conexao.execute(
+                "SELECT tarefa_id, ano, substituir FROM tarefas_anos"
+                " WHERE situacao IN (?, ?) ORDER BY tarefa_id, ano",
+                (SituacaoTarefa.pendente.value, SituacaoTarefa.executando.value),
+            ).fetchall()
+            for tarefa_id, ano, _ in interrompidos:
+                self._atualizar(
+                    [tarefa_id],
+                    ano,
+                    situacao=SituacaoTarefa.pendente.value,
+                    iniciado_em=None,
+                )
+            self._inscrever_linhas(interrompidos)
+        if interrompidos:
+            logger.info(
+                "Retomando %s ano(s) de tarefas interrompidas", len(interrompidos)
+            )
+
+    def acompanhar(self, intervalo: float) -> None:
+        """Inscreve, a cada `intervalo` segundos, anos pendentes de outros processos."""
+        self._parar = threading.Event()
+
+        def laco():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.inscrever_pendentes()
+                except sqlite3.Error as e:
+                    logger.error("Falha ao buscar tarefas pendentes: %s", e)
+
+        threading.Thread(target=laco, name="tarefas-pendentes", daemon=True).start()
+
+    def inscrever_pendentes(self) -> None:
+        with self._lock:
+            pendentes = self._conexao.execute(
+                "SELECT tarefa_id, ano, substituir FROM tarefas_anos"
+                " WHERE situacao = ? ORDER BY tarefa_id, ano",
+                (SituacaoTarefa.pendente.value,),
+            ).fetchall()
+            self._inscrever_linhas(
+                [
+                    (tarefa_id, ano, substituir)
+                    for tarefa_id, ano, substituir in pendentes
+                    if tarefa_id not in self._inscritos.get((ano, bool(substituir)), ())
+                ]
+            )
+
+    def encerrar(self, aguardar: bool = False) -> None:
+        # anos não concluídos continuam pendentes no SQLite e são retomados no
+        # próximo `iniciar`
+        if self._parar is not None:
+            self._parar.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=aguardar)
+        if aguardar or self._executor is None:
+            self._conexao.close()
+
+    def criar(self, anos: Iterable[int], substituir: bool = False) -> Tarefa:
+        tarefa_id = uuid.uuid4().hex
+        anos = sorted(set(anos))
+        with self._lock:
+            self._conexao.execute("BEGIN")
+            self._conexao.execute(
+                "INSERT INTO tarefas (id, criada_em) VALUES (?, ?)",
+                (tarefa_id, datetime.now().isoformat()),
+            )
+            self._conexao.executemany(
+                "INSERT INTO tarefas_anos (tarefa_id, ano, situacao, substituir)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (tarefa_id, ano, SituacaoTarefa.pendente.value, int(substituir))
+                    for ano in anos
+                ],
+            )
+            self._conexao.execute("COMMIT")
+            if self._executor is not None:
+                self._inscrever(tarefa_id, anos, substituir)
+        return self.consultar(tarefa_id)
+
+    def consultar(self, tarefa_id: str) -> Optional[Tarefa]:
+        with self._lock:
+            tarefa = self._conexao.execute(
+                "SELECT id, criada_em FROM tarefas WHERE id = ?", (tarefa_id,)
+            ).fetchone()
+            if tarefa is None:
+                return None
+            linhas = self._conexao.execute(
+                "SELECT ano, situacao, inseridos, atualizados, inalterados, ignorado,"
+                " iniciado_em, concluido_em, erro, substituir, erro_produtos"
+                " FROM tarefas_anos"
+                " WHERE tarefa_id = ? ORDER BY ano",
+                (tarefa_id,),
+            ).fetchall()
+        anos = []
+        for linha in linhas:
+            iniciado_em, concluido_em = _data(linha[6]), _data(linha[7])
+            anos.append(
+                ProgressoAno(
+                    ano=linha[0],
+                    situacao=linha[1],
+                    inseridos=linha[2],
+                    atualizados=linha[3],
+                    inalterados=linha[4],
+                    ignorado=bool(linha[5]),
+                    iniciado_em=iniciado_em,
+                    concluido_em=concluido_em,
+                    duracao=(
+                        (concluido_em - iniciado_em).total_seconds()
+                        if iniciado_em and concluido_em
+                        else None
+                    ),
+                    erro=linha[8],
+                    erro_produtos=linha[10],
+                )
+            )
+        return Tarefa(
+            id=tarefa[0],
+            situacao=_situacao(anos),
+            criada_em=datetime.fromisoformat(tarefa[1]),
+            substituir=any(linha[9] for linha in linhas),
+            anos=anos,
+        )
+
+    def _atualizar(self, tarefas: List[str], ano: int, **campos) -> None:
+        atribuicoes = ", ".join(f"{campo} = ?" for campo in campos)
+        self._conexao.executemany(
+            f"UPDATE tarefas_anos SET {atribuicoes} WHERE tarefa_id = ? AND ano = ?",
+            [(*campos.values(), tarefa_id, ano) for tarefa_id in tarefas],
+        )
+
+    def _inscrever_linhas(self, linhas: List[Tuple[str, int, int]]) -> None:
+        """Inscreve linhas (tarefa_id, ano, substituir) ordenadas por tarefa."""
+        for (tarefa_id, substituir), grupo in groupby(
+            linhas, key=lambda linha: (linha[0], bool(linha[2]))
+        ):
+            self._inscrever(tarefa_id, [linha[1] for linha in grupo], substituir)
+
+    def _inscrever(self, tarefa_id: str, anos: List[int], substituir: bool) -> None:
+        novos = []
+        for ano in anos:
+            chave = (ano, substituir)
+            inscritos = self._inscritos.get(chave)
+            if inscritos is None:
+                self._inscritos[chave] = [tarefa_id]
+                novos.append(ano)
+                continue
+            inscritos.append(tarefa_id)
+            if chave in self._executando:
+                self._atualizar(
+                    [tarefa_id],
+                    ano,
+                    situacao=SituacaoTarefa.executando.value,
+                    iniciado_em=datetime.now().isoformat(),
+                )
+        if novos:
+            self._executor.submit(self._executar_anos, sorted(novos), substituir)
+
+    def _executar_anos(self, anos: List[int], substituir: bool) -> None:
+        with self._lock:
+            travas = [
+                self._travas_anos.setdefault(ano, threading.Lock()) for ano in anos
+            ]
+        # anos em ordem crescente: duas execuções nunca esperam uma pela outra
+        with ExitStack() as pilha:
+            for trava in travas:
+                pilha.enter_context(trava)
+            self._executar_chaves(anos, substituir)
+
+    def _executar_chaves(self, anos: List[int], substituir: bool) -> None:
+        chaves = [(ano, substituir) for ano in anos]
+        with self._lock:
+            iniciado_em = datetime.now().isoformat()
+            for ano, chave in zip(anos, chaves):
+                self._executando.add(chave)
+                self._atualizar(
+                    self._inscritos[chave],
+                    ano,
+                    situacao=SituacaoTarefa.executando.value,
+                    iniciado_em=iniciado_em,
+                )
+        try:
+            resultados = self.processar(anos, substituir)
+        except Exception as e:
+            logger.error("Falha ao processar os anos %s: %s", anos, e)
+            resultados = {ano: e for ano in anos}
+        with self._lock:
+            concluido_em = datetime.now().isoformat()
+            for ano, chave in zip(anos, chaves):
+                resultado, erro = resultados.get(ano, ResultadoCarga(ano=ano)), None
+                if isinstance(resultado, Exception):
+                    erro = str(resultado) or resultado.__class__.__name__
+                    resultado = ResultadoCarga(ano=ano)
+                self._executando.discard(chave)
+                self._atualizar(
+                    self._inscritos.pop(chave),
+                    ano,
+                    situacao=(
+                        SituacaoTarefa.falhou.value
+                        if erro
+                        else SituacaoTarefa.concluida.value
+                    ),
+                    inseridos=resultado.inseridos,
+                    atualizados=resultado.atualizados,
+                    inalterados=resultado.inalterados,
+                    ignorado=int(resultado.ignorado),
+                    concluido_em=concluido_em,
+                    erro=erro,
+                    erro_produtos=resultado.erro_produtos,
+                )
+
+
+fila_tarefas = FilaTarefas(TAREFAS_DB, TAREFAS_WORKERS)
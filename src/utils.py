@@ -1,11 +1,62 @@
+from typing import Tuple
+
 from fastapi import HTTPException
 
 from src.schemas import InputAnosMunicipios
 
+# código IBGE da UF -> sigla; os dois primeiros dígitos do código do município
+# são o código da UF
+UFS_IBGE = {
+    11: "RO",
+    12: "AC",
+    13: "AM",
+    14: "RR",
+    15: "PA",
+    16: "AP",
+    17: "TO",
+    21: "MA",
+    22: "PI",
+    23: "CE",
+    24: "RN",
+    25: "PB",
+    26: "PE",
+    27: "AL",
+    28: "SE",
+    29: "BA",
+    31: "MG",
+    32: "ES",
+    33: "RJ",
+    35: "SP",
+    41: "PR",
+    42: "SC",
+    43: "RS",
+    50: "MS",
+    51: "MT",
+    52: "GO",
+    53: "DF",
+}
+
+# sigla -> código IBGE da UF
+codigos_uf = {sigla: codigo for codigo, sigla in UFS_IBGE.items()}
+
+
+def codigo_uf(municipio_id: int) -> int:
+    return municipio_id // 100000
+
+
+def intervalo_uf(codigo: int) -> Tuple[int, int]:
+    """Menor e maior código de município possíveis na UF."""
+    return codigo * 100000, codigo * 100000 + 99999
+
+
+LIMITE_DADOS = 10000
+LIMITE_MUNICIPIOS = 10000
+
 
 def validar_solicitacao(dados: InputAnosMunicipios):
     total_dados = len(dados.municipios) * len(dados.anos)
-    if total_dados > 100:
+    if total_dados > LIMITE_DADOS:
         raise HTTPException(
-            status_code=400, detail="Solicitação excede limite de 100 dados"
+            status_code=400,
+            detail=f"Solicitação excede limite de {LIMITE_DADOS} dados",
         )
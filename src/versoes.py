@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.database import VersoesAnos, VersoesProdutos
+
+
+def incrementar_versao(ano: int, db: Session, modelo=VersoesAnos) -> None:
+    """
+    Incrementa a versão do ano em `modelo` (versoes_anos ou versoes_produtos).
+    Não faz commit: roda na transação de quem alterou os dados.
+    """
+    tabela = modelo.__table__
+    coluna_ano, coluna_versao, coluna_atualizado_em = tabela.columns
+    valores = {
+        coluna_ano.name: ano,
+        coluna_versao.name: 1,
+        coluna_atualizado_em.name: datetime.utcnow(),
+    }
+    if db.bind.dialect.name == "sqlite":
+        stmt = sqlite_insert(tabela).values(**valores)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[coluna_ano],
+            set_={
+                coluna_versao.name: coluna_versao + 1,
+                coluna_atualizado_em.name: stmt.excluded[coluna_atualizado_em.name],
+            },
+        )
+    else:
+        stmt = mysql_insert(tabela).values(**valores)
+        stmt = stmt.on_duplicate_key_update(
+            {
+                coluna_versao.name: coluna_versao + 1,
+                coluna_atualizado_em.name: stmt.inserted[coluna_atualizado_em.name],
+            }
+        )
+    db.execute(stmt)
+
+
+class VersoesDados:
+    """
+    Cópia em memória de versoes_anos (ou de `modelo`), para as rotas de
+    leitura calcularem o ETag sem consultar o banco.
+    """
+
+    def __init__(self, modelo=VersoesAnos):
+        self._colunas = tuple(modelo.__table__.columns)
+        self._lock = threading.Lock()
+        # ano -> (versão, atualizado_em em UTC)
+        self._versoes: Dict[int, Tuple[int, datetime]] = {}
+
+    def carregar(self, db: Session, anos: Optional[Iterable[int]] = None) -> None:
+        consulta = select(*self._colunas)
+        if anos is not None:
+            consulta = consulta.where(self._colunas[0].in_(list(anos)))
+        linhas = db.execute(consulta).fetchall()
+        with self._lock:
+            if anos is None:
+                self._versoes = {}
+            for ano, versao, atualizado_em in linhas:
+                self._versoes[ano] = (versao, atualizado_em)
+
+    def definir(self, versoes: Dict[int, Tuple[int, datetime]]) -> None:
+        with self._lock:
+            self._versoes = dict(versoes)
+
+    def versoes(
+        self, anos: Optional[Iterable[int]] = None
+    ) -> Dict[int, Tuple[int, datetime]]:
+        versoes = self._versoes
+        if anos is None:
+            return dict(versoes)
+        return {ano: versoes[ano] for ano in anos if ano in versoes}
+
+
+versoes_dados = VersoesDados()
+versoes_produtos = VersoesDados(VersoesProdutos)
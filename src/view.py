@@ -1,221 +1,793 @@
+import asyncio
+import logging
+import os
+
 import pandas as pd
 
-from datetime import datetime
+from contextlib import nullcontext
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
 
-from sqlalchemy import inspect
+from databases import Database
+from sqlalchemy import delete as sql_delete, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import Optional, List, Union
+from typing import AsyncIterator, Dict, Iterable, Optional, List, Union
 
-from src.database import ProducaoMunicipios, ViewProdutividadeEstados
+from src.analises import MatrizProducao, analisar, matriz_analises
+from src.cache import AUSENTE, cache_municipios
+from src.cargas import esquecer_cargas, hashes_processados, registrar_processamento
+from src.compartilhado import dados_compartilhados
+from src.digests import digests_uf, hash_linhas
+from src.memoria import SnapshotProducao, motor_memoria
+from src.metricas import etapa
+from src.municipios import mapa_municipios
+from src.particoes import particoes_ano
+from src.versoes import incrementar_versao, versoes_dados, versoes_produtos
+from src.database import (
+    DigestsProducao,
+    ProducaoMunicipios,
+    ProducaoProdutos,
+    ProdutividadeEstados,
+    VersoesProdutos,
+)
 from src.schemas import (
-    ListProducaoMunicipios,
     ProdutividadeAnoEstados,
-    ProdutividadePorEstado,
     InputAnosMunicipios,
+    ResultadoCarga,
+)
+from src.parser_sidra import ColunasSidra
+from src.service import (
+    RetornoSidra,
+    RetornoSidraPorUF,
+    consultar_plantacoes,
+    VARIAVEL_AREA_COLHIDA,
+    VARIAVEL_QUANTIDADE_PRODUZIDA,
 )
-from src.service import consulta_area_colhida, consulta_quantidade_produzida
 from src.exceptions import ProcessamentoException
+from src.utils import UFS_IBGE, codigo_uf, intervalo_uf
 
+logger = logging.getLogger(__name__)
 
-# @TODO melhorar essa função
-def insert_or_update(year, df_atualizado, db: Session) -> None:
-    consulta = (
-        db.query(ProducaoMunicipios).filter(ProducaoMunicipios.pm_ano == year).statement
-    )
-    df = pd.read_sql(consulta, db.bind)
-    if df.empty:
-        df_atualizado.to_sql(
-            "producao_municipios", db.bind, if_exists="append", index=False
+
+TAMANHO_LOTE = 1000
+# códigos por IN na consulta em lote de municípios e quantas dessas consultas
+# rodam ao mesmo tempo no pool
+TAMANHO_BLOCO_IN = 500
+CONCORRENCIA_BLOCOS = int(os.environ.get("LOTE_CONCORRENCIA", 4))
+
+
+def _upsert_producao(db: Session):
+    tabela = ProducaoMunicipios.__table__
+    if db.bind.dialect.name == "sqlite":
+        stmt = sqlite_insert(tabela)
+        return stmt.on_conflict_do_update(
+            index_elements=[tabela.c.pm_municipio_id, tabela.c.pm_ano],
+            set_={
+                "pm_area": stmt.excluded.pm_area,
+                "pm_quantidade": stmt.excluded.pm_quantidade,
+                "pm_hash": stmt.excluded.pm_hash,
+            },
         )
+    stmt = mysql_insert(tabela)
+    return stmt.on_duplicate_key_update(
+        pm_area=stmt.inserted.pm_area,
+        pm_quantidade=stmt.inserted.pm_quantidade,
+        pm_hash=stmt.inserted.pm_hash,
+    )
+
+
+def atualizar_produtividade_estados(
+    ano: int, municipios: Optional[Iterable[int]], db: Session
+) -> None:
+    """
+    Recalcula produtividade_estados para o ano, apenas nos estados dos
+    municípios informados (ou em todos, com municipios=None). Não faz commit:
+    roda na transação de quem alterou producao_municipios.
+    """
+    codigos = None if municipios is None else {codigo_uf(m) for m in municipios}
+    if codigos is not None and not codigos:
         return
 
-    df_insert = df_atualizado[
-        ~df_atualizado["pm_municipio_id"].isin(df["pm_municipio_id"])
-    ]
-    if not df_insert.empty:
-        df_insert.to_sql(
-            "producao_municipios", db.bind, if_exists="append", index=False
+    # a UF vem do mapa em memória, sem join com municipios
+    agregado = select(
+        ProducaoMunicipios.pm_municipio_id,
+        ProducaoMunicipios.pm_area,
+        ProducaoMunicipios.pm_quantidade,
+    ).where(ProducaoMunicipios.pm_ano == ano)
+    remocao = sql_delete(ProdutividadeEstados).where(ProdutividadeEstados.pm_ano == ano)
+    if codigos is not None:
+        agregado = agregado.where(
+            or_(
+                *(
+                    ProducaoMunicipios.pm_municipio_id.between(*intervalo_uf(codigo))
+                    for codigo in codigos
+                )
+            )
+        )
+        remocao = remocao.where(
+            ProdutividadeEstados.estado.in_(
+                [UFS_IBGE[codigo] for codigo in codigos if codigo in UFS_IBGE]
+            )
         )
 
-    df_update = df_atualizado.merge(
-        df, on="pm_municipio_id", how="inner", suffixes=("_novo", "_database")
-    )
-    df_update_diff = df_update[
-        (df_update["pm_area_novo"] != df_update["pm_area_database"])
-        | (df_update["pm_quantidade_novo"] != df_update["pm_quantidade_database"])
+    municipios_uf = mapa_municipios.municipios(db)
+    totais = {}
+    for municipio_id, area, quantidade in db.execute(agregado):
+        municipio = municipios_uf.get(municipio_id)
+        if municipio is None:
+            continue
+        total = totais.setdefault(municipio[1], [0, 0])
+        total[0] += area or 0
+        total[1] += quantidade or 0
+    linhas = [
+        (estado, area, quantidade) for estado, (area, quantidade) in totais.items()
     ]
-    for index, row in df_update_diff.iterrows():
-        db.query(ProducaoMunicipios).filter(
-            ProducaoMunicipios.pm_municipio_id == row["pm_municipio_id"],
-            ProducaoMunicipios.pm_ano == row["pm_ano_database"],
-        ).update(
-            {"pm_area": row["pm_area_novo"], "pm_quantidade": row["pm_quantidade_novo"]}
+
+    db.execute(remocao)
+    if linhas:
+        db.execute(
+            ProdutividadeEstados.__table__.insert(),
+            [
+                {
+                    "estado": estado,
+                    "pm_ano": ano,
+                    "total_area": total_area,
+                    "total_quantidade": total_quantidade,
+                    "produtividade": (
+                        Decimal(total_quantidade) / Decimal(total_area)
+                        if total_area
+                        else None
+                    ),
+                }
+                for estado, total_area, total_quantidade in linhas
+            ],
         )
-    db.commit()
 
 
-def processar_dados_retorno_plantacoes(ano: int) -> pd.DataFrame:
-    print("consultando ano: ", ano)
-    df_area_colhida = pd.DataFrame(consulta_area_colhida(ano))
-    print(f"{ano} - area_colhida")
-    df_quantidade_produzida = pd.DataFrame(consulta_quantidade_produzida(ano))
-    print(f"{ano} - quantidade_produzida")
+def recalcular_anos_dos_municipios(municipios: Iterable[int], db: Session) -> List[int]:
+    """
+    Recalcula produtividade_estados e incrementa a versão dos anos com produção
+    de algum dos municípios, cuja UF mudou em municipios (src.municipios). O
+    mapa de municípios já deve estar recarregado. Não faz commit; retorna os
+    anos recalculados.
+    """
+    municipios = sorted(set(municipios))
+    anos = set()
+    for inicio in range(0, len(municipios), TAMANHO_BLOCO_IN):
+        anos.update(
+            db.execute(
+                select(ProducaoMunicipios.pm_ano)
+                .distinct()
+                .where(
+                    ProducaoMunicipios.pm_municipio_id.in_(
+                        municipios[inicio : inicio + TAMANHO_BLOCO_IN]
+                    )
+                )
+            ).scalars()
+        )
+    for ano in sorted(anos):
+        # a UF antiga e a nova podem ser estados diferentes
+        atualizar_produtividade_estados(ano, None, db)
+        incrementar_versao(ano, db)
+    return sorted(anos)
+
 
-    df_area_colhida = df_area_colhida.drop(0)
-    df_area_colhida["V"] = (
-        pd.to_numeric(df_area_colhida["V"], errors="coerce").fillna(0).astype(int)
-    )
-    df_area_colhida["D1C"] = (
-        pd.to_numeric(df_area_colhida["D1C"], errors="coerce").fillna(0).astype(int)
+def _digests_gravados(year: int, db: Session) -> Dict[int, tuple]:
+    return {
+        uf: (digest, linhas)
+        for uf, digest, linhas in db.execute(
+            select(
+                DigestsProducao.dp_uf,
+                DigestsProducao.dp_digest,
+                DigestsProducao.dp_linhas,
+            ).where(DigestsProducao.dp_ano == year)
+        )
+    }
+
+
+def _gravar_digests(year: int, digests: Dict[int, tuple], db: Session) -> None:
+    if not digests:
+        return
+    db.execute(
+        sql_delete(DigestsProducao).where(
+            DigestsProducao.dp_ano == year,
+            DigestsProducao.dp_uf.in_(list(digests)),
+        )
     )
-    df_ac = df_area_colhida.loc[:, ["D1C", "V", "D3C"]].rename(
-        columns={"V": "pm_area", "D1C": "pm_municipio_id", "D3C": "pm_ano"}
+    db.execute(
+        DigestsProducao.__table__.insert(),
+        [
+            {"dp_ano": year, "dp_uf": uf, "dp_digest": digest, "dp_linhas": linhas}
+            for uf, (digest, linhas) in digests.items()
+        ],
     )
 
-    df_quantidade_produzida = df_quantidade_produzida.drop(0)
-    df_quantidade_produzida["V"] = (
-        pd.to_numeric(df_quantidade_produzida["V"], errors="coerce")
-        .fillna(0)
-        .astype(int)
+
+def _registros_producao(year: int, df: pd.DataFrame) -> List[dict]:
+    return [
+        {
+            "pm_municipio_id": int(municipio_id),
+            "pm_ano": int(year),
+            "pm_area": int(area),
+            "pm_quantidade": int(quantidade),
+            "pm_hash": int(valor),
+        }
+        for municipio_id, area, quantidade, valor in zip(
+            df["pm_municipio_id"], df["pm_area"], df["pm_quantidade"], df["pm_hash"]
+        )
+    ]
+
+
+def _encerrar_transacao(db: Session) -> None:
+    """
+    Encerra a transação da sessão antes de um DDL de src.particoes: no MySQL o
+    ALTER esperaria o metadata lock que ela mantém nas tabelas já lidas.
+    """
+    db.commit()
+
+
+def insert_or_update(year, df_atualizado, db: Session) -> ResultadoCarga:
+    """
+    Grava os dados de um ano numa única transação. O digest de cada UF
+    (src.digests) é comparado com o da última carga: UFs iguais são puladas
+    sem ler producao_municipios; das demais só se lê (município, pm_hash) e as
+    linhas novas ou com outro hash vão num INSERT ... ON DUPLICATE KEY UPDATE
+    em lotes de TAMANHO_LOTE linhas.
+    """
+    if particoes_ano.particionada(db.bind):
+        _encerrar_transacao(db)
+        particoes_ano.garantir(db.bind, year)
+    with etapa("merge"):
+        colunas = ["pm_municipio_id", "pm_area", "pm_quantidade"]
+        df = df_atualizado.loc[:, colunas].reset_index(drop=True)
+        df["pm_hash"] = hash_linhas(df["pm_area"], df["pm_quantidade"])
+        digests = digests_uf(df["pm_municipio_id"], df["pm_hash"])
+        gravados = _digests_gravados(year, db)
+        digests = {
+            uf: digest for uf, digest in digests.items() if gravados.get(uf) != digest
+        }
+        df = df[(df["pm_municipio_id"] // 100000).isin(list(digests))]
+
+        df_database = pd.DataFrame(
+            (
+                db.execute(
+                    select(
+                        ProducaoMunicipios.pm_municipio_id,
+                        ProducaoMunicipios.pm_hash,
+                    ).where(
+                        ProducaoMunicipios.pm_ano == year,
+                        or_(
+                            *(
+                                ProducaoMunicipios.pm_municipio_id.between(
+                                    *intervalo_uf(uf)
+                                )
+                                for uf in digests
+                            )
+                        ),
+                    )
+                ).fetchall()
+                if digests
+                else []
+            ),
+            columns=["pm_municipio_id", "pm_hash"],
+            # object evita que um pm_hash nulo converta a coluna para float
+            dtype=object,
+        ).astype({"pm_municipio_id": "int64", "pm_hash": "Int64"})
+        df = df.merge(
+            df_database,
+            on="pm_municipio_id",
+            how="left",
+            suffixes=("", "_database"),
+            indicator=True,
+        )
+        novos = df["_merge"] == "left_only"
+        # pm_hash nulo (linha gravada por fora) conta como alterada
+        alterados = ~novos & (
+            (df["pm_hash"] != df["pm_hash_database"]).fillna(True).astype(bool)
+        )
+        df_gravar = df[novos | alterados]
+        registros = _registros_producao(year, df_gravar)
+
+    try:
+        with etapa("upsert"):
+            upsert = _upsert_producao(db)
+            for inicio in range(0, len(registros), TAMANHO_LOTE):
+                db.execute(upsert, registros[inicio : inicio + TAMANHO_LOTE])
+            municipios = [registro["pm_municipio_id"] for registro in registros]
+            atualizar_produtividade_estados(year, municipios, db)
+            _gravar_digests(year, digests, db)
+            if registros:
+                incrementar_versao(year, db)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    _invalidar_cache(year, municipios)
+    if registros:
+        versoes_dados.carregar(db, [year])
+
+    return ResultadoCarga(
+        ano=year,
+        inseridos=int(novos.sum()),
+        atualizados=int(alterados.sum()),
+        inalterados=int(len(df_atualizado) - len(df_gravar)),
     )
-    df_quantidade_produzida["D1C"] = (
-        pd.to_numeric(df_quantidade_produzida["D1C"], errors="coerce")
-        .fillna(0)
-        .astype(int)
+
+
+def substituir_ano(year, df_atualizado, db: Session) -> ResultadoCarga:
+    """
+    Troca todas as linhas de um ano pelas de df_atualizado, sem compará-las
+    com o banco: linhas que não vieram deixam de existir. Com a tabela
+    particionada (src.particoes) o ano é trocado com EXCHANGE PARTITION, desfeito
+    se a gravação das tabelas derivadas falhar; senão, com DELETE + INSERT na
+    mesma transação. Os leitores veem o ano anterior ou
+    o novo, nunca um ano pela metade.
+    """
+    with etapa("merge"):
+        colunas = ["pm_municipio_id", "pm_area", "pm_quantidade"]
+        df = df_atualizado.loc[:, colunas].reset_index(drop=True)
+        df["pm_hash"] = hash_linhas(df["pm_area"], df["pm_quantidade"])
+        digests = digests_uf(df["pm_municipio_id"], df["pm_hash"])
+        registros = _registros_producao(year, df)
+
+    particionada = particoes_ano.particionada(db.bind)
+    if particionada:
+        _encerrar_transacao(db)
+        troca = particoes_ano.trocar(db.bind, year, registros)
+    else:
+        troca = nullcontext()
+    with etapa("upsert"), troca:
+        try:
+            if not particionada:
+                db.execute(
+                    sql_delete(ProducaoMunicipios).where(
+                        ProducaoMunicipios.pm_ano == year
+                    )
+                )
+                tabela = ProducaoMunicipios.__table__
+                for inicio in range(0, len(registros), TAMANHO_LOTE):
+                    db.execute(
+                        tabela.insert(), registros[inicio : inicio + TAMANHO_LOTE]
+                    )
+            atualizar_produtividade_estados(year, None, db)
+            db.execute(
+                sql_delete(DigestsProducao).where(DigestsProducao.dp_ano == year)
+            )
+            _gravar_digests(year, digests, db)
+            incrementar_versao(year, db)
+            db.commit()
+        except Exception:
+            # antes de a troca da partição ser desfeita
+            db.rollback()
+            raise
+    # o índice por ano acha as consultas dos municípios que já tinham o ano
+    # (inclusive os removidos); as dos que passaram a tê-lo, só pela chave
+    _invalidar_cache(year, None)
+    _invalidar_cache(year, df["pm_municipio_id"].tolist())
+    versoes_dados.carregar(db, [year])
+
+    return ResultadoCarga(ano=year, inseridos=len(registros))
+
+
+def montar_dataframe_plantacoes(
+    area_colhida: ColunasSidra, quantidade_produzida: ColunasSidra
+) -> pd.DataFrame:
+    df_ac = pd.DataFrame(
+        {
+            "pm_municipio_id": area_colhida.municipios,
+            "pm_area": area_colhida.valores,
+            "pm_ano": area_colhida.anos,
+        }
     )
-    df_qp = df_quantidade_produzida.loc[:, ["D1C", "V"]].rename(
-        columns={"V": "pm_quantidade", "D1C": "pm_municipio_id"}
+    df_qp = pd.DataFrame(
+        {
+            "pm_municipio_id": quantidade_produzida.municipios,
+            "pm_quantidade": quantidade_produzida.valores,
+        }
     )
     return df_ac.merge(df_qp, on="pm_municipio_id", how="inner")
 
 
-# @todo metodo asyncio
-def processar_dados_plantacoes(db: Session) -> None:
-    processados = []
-    nao_processados = []
-    for ano in range(2018, datetime.now().year):
-        df_para_atualizar = processar_dados_retorno_plantacoes(ano)
-        if df_para_atualizar.size <= 0:
-            nao_processados.append(ano)
-            continue
-        insert_or_update(ano, df_para_atualizar, db)
-        processados.append(ano)
+def processar_ano(
+    ano: int,
+    area_colhida: Union[RetornoSidra, RetornoSidraPorUF],
+    quantidade_produzida: Union[RetornoSidra, RetornoSidraPorUF],
+    db: Session,
+    substituir: bool = False,
+) -> Optional[ResultadoCarga]:
+    """
+    Grava um ano a partir dos retornos do SIDRA. Se os dois payloads têm o mesmo
+    hash da última carga registrada no banco, o ano é ignorado sem leitura do
+    payload nem comparação com o banco. Com substituir, o ano é sempre trocado
+    inteiro (substituir_ano). Retorna None quando não há dados.
+    """
+    retornos = [area_colhida, quantidade_produzida]
+    processados = hashes_processados([retorno.chave for retorno in retornos], db)
+    if not substituir and all(
+        processados.get(retorno.chave) == retorno.hash for retorno in retornos
+    ):
+        return ResultadoCarga(ano=ano, ignorado=True)
+
+    try:
+        with etapa("parse"):
+            colunas_area = area_colhida.colunas()
+            colunas_quantidade = quantidade_produzida.colunas()
+        with etapa("merge"):
+            df_para_atualizar = montar_dataframe_plantacoes(
+                colunas_area, colunas_quantidade
+            )
+    except ValueError as e:
+        for retorno in retornos:
+            retorno.descartar()
+        raise ProcessamentoException(
+            f"Retorno do SIDRA inválido para o ano de {ano}"
+        ) from e
+    if df_para_atualizar.size <= 0:
+        return None
+    gravar = substituir_ano if substituir else insert_or_update
+    resultado = gravar(ano, df_para_atualizar, db)
+    registrar_processamento(ano, retornos, db)
+    return resultado
 
-    if nao_processados:
-        msgm = (
-            f"Não há dados suficientes para processar o(s) ano(s) de {nao_processados}"
+
+def processar_anos(
+    anos: List[int], db: Session, substituir: bool = False, recarregar: bool = True
+) -> Dict[int, Union[ResultadoCarga, Exception]]:
+    """
+    Consulta o SIDRA para todos os anos de uma vez (um cliente, concorrência
+    limitada) e grava ano a ano. A falha de um ano fica no resultado dele sem
+    interromper os demais. O motor em memória e a matriz de /analises são
+    recarregados uma única vez, no fim; com recarregar=False, fica a cargo de
+    quem chama (src.tarefas, depois de carregar os produtos).
+    """
+    with etapa("sidra"):
+        retornos = consultar_plantacoes(anos)
+    resultados = {}
+    try:
+        for ano in anos:
+            try:
+                resultados[ano] = _processar_retornos(
+                    ano, retornos[ano], db, substituir
+                )
+            except Exception as e:
+                db.rollback()
+                logger.error("Falha ao processar o ano %s: %s", ano, e)
+                resultados[ano] = e
+    finally:
+        if recarregar:
+            recarregar_motor_memoria(db)
+    return resultados
+
+
+def _processar_retornos(
+    ano: int, retornos: dict, db: Session, substituir: bool
+) -> ResultadoCarga:
+    area_colhida = retornos[VARIAVEL_AREA_COLHIDA]
+    quantidade_produzida = retornos[VARIAVEL_QUANTIDADE_PRODUZIDA]
+    for retorno in (area_colhida, quantidade_produzida):
+        if isinstance(retorno, ProcessamentoException):
+            raise retorno
+        if isinstance(retorno, Exception):
+            raise ProcessamentoException(
+                f"Falha ao consultar o SIDRA para o ano de {ano}"
+            ) from retorno
+    resultado = processar_ano(ano, area_colhida, quantidade_produzida, db, substituir)
+    if resultado is None:
+        raise ProcessamentoException(
+            f"Não há dados suficientes para processar o ano de {ano}"
         )
-        if processados:
-            msgm = f"{msgm}. Os anos de {processados} foram processados com sucesso."
-        raise ProcessamentoException(msgm)
+    return resultado
+
+
+_COLUNAS_PRODUCAO = (
+    ProducaoMunicipios.pm_municipio_id,
+    ProducaoMunicipios.pm_ano,
+    ProducaoMunicipios.pm_area,
+    ProducaoMunicipios.pm_quantidade,
+)
 
 
-def processar_dados_plantacoes_por_ano(ano, db: Session) -> None:
-    df_para_atualizar = processar_dados_retorno_plantacoes(ano)
-    if df_para_atualizar.size > 0:
-        insert_or_update(ano, df_para_atualizar, db)
+def _dados_producao(linha: tuple) -> dict:
+    municipio_id, ano, area_colhida, quantidade_produzida = linha
+    return {
+        "municipio_id": municipio_id,
+        "ano": ano,
+        "area_colhida": area_colhida,
+        "quantidade_produzida": quantidade_produzida,
+    }
+
+
+def _invalidar_cache(ano: int, municipios: Optional[Iterable[int]]) -> None:
+    if municipios is None:
+        cache_municipios.invalidar_ano(ano)
         return
-    raise ProcessamentoException(
-        f"Não há dados suficientes para processar o ano de {ano}"
+    cache_municipios.invalidar(
+        chave
+        for municipio_id in municipios
+        for chave in (("municipio", municipio_id), ("municipio_ano", ano, municipio_id))
     )
 
 
-def get_municipio(municipio_id: int, db: Session) -> ListProducaoMunicipios:
-    municipios = (
-        db.query(ProducaoMunicipios)
-        .filter(ProducaoMunicipios.pm_municipio_id == municipio_id)
-        .all()
-    )
-    return ListProducaoMunicipios(
-        dados=[
-            {
-                "municipio_id": municipio.pm_municipio_id,
-                "ano": municipio.pm_ano,
-                "area_colhida": municipio.pm_area,
-                "quantidade_produzida": municipio.pm_quantidade,
-            }
-            for municipio in municipios
-        ]
+async def aquecer_cache(database: Database) -> None:
+    linhas = await database.fetch_all(
+        select(*_COLUNAS_PRODUCAO).order_by(
+            ProducaoMunicipios.pm_municipio_id, ProducaoMunicipios.pm_ano
+        )
     )
+    marca = cache_municipios.marca()
+    entradas = 0
+    for municipio_id, grupo in groupby(
+        (tuple(linha) for linha in linhas), key=itemgetter(0)
+    ):
+        if entradas >= cache_municipios.max_entradas:
+            break
+        grupo = tuple(grupo)
+        cache_municipios.gravar(
+            ("municipio", municipio_id), grupo, [linha[1] for linha in grupo], marca
+        )
+        for linha in grupo:
+            cache_municipios.gravar(
+                ("municipio_ano", linha[1], municipio_id), linha, [linha[1]], marca
+            )
+        entradas += 1 + len(grupo)
 
 
-def get_municipio_por_ano(
-    ano: int, municipio_id: int, db: Session
-) -> Optional[ListProducaoMunicipios]:
-    municipio = (
-        db.query(ProducaoMunicipios)
-        .filter(ProducaoMunicipios.pm_municipio_id == municipio_id)
-        .filter(ProducaoMunicipios.pm_ano == ano)
-        .first()
-    )
-    if municipio:
-        municipio = ListProducaoMunicipios(
-            dados=[
-                {
-                    "municipio_id": municipio.pm_municipio_id,
-                    "ano": municipio.pm_ano,
-                    "area_colhida": municipio.pm_area,
-                    "quantidade_produzida": municipio.pm_quantidade,
-                }
-            ]
+async def carregar_motor_memoria(database: Database) -> None:
+    if motor_memoria.ativo:
+        linhas = await database.fetch_all(select(*_COLUNAS_PRODUCAO))
+        motor_memoria.trocar(
+            [tuple(linha) for linha in linhas], await mapa_municipios.obter(database)
         )
-    return municipio
 
 
-def object_as_dict(obj):
-    return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
+def recarregar_motor_memoria(db: Session) -> None:
+    if dados_compartilhados.ativo:
+        # publica para os workers de src.servidor; este processo adota a nova
+        # geração na hora
+        versoes_dados.carregar(db)
+        versoes_produtos.carregar(db)
+        dados_compartilhados.publicar(
+            SnapshotProducao.de_linhas(
+                db.execute(select(*_COLUNAS_PRODUCAO)).fetchall(),
+                mapa_municipios.municipios(db),
+            ),
+            versoes_dados.versoes(),
+            versoes_produtos.versoes(),
+        )
+        dados_compartilhados.sincronizar(forcar=True)
+    elif motor_memoria.ativo:
+        motor_memoria.trocar(
+            db.execute(select(*_COLUNAS_PRODUCAO)).fetchall(),
+            mapa_municipios.municipios(db),
+        )
+    reconstruir_matriz_analises(db)
 
 
-def get_produtividade_estados_por_ano(
-    dados: ProdutividadeAnoEstados, db: Session
-) -> List[ProdutividadePorEstado]:
-    produtividade_estados = (
-        db.query(ViewProdutividadeEstados)
-        .filter(ViewProdutividadeEstados.estado.in_(dados.estados))
-        .filter(ViewProdutividadeEstados.pm_ano == dados.ano)
-        .all()
+def _chave_analises() -> tuple:
+    return tuple(
+        sorted((ano, versao) for ano, (versao, _) in versoes_dados.versoes().items())
     )
+
+
+def reconstruir_matriz_analises(db: Session) -> None:
+    """Remonta a matriz das rotas /analises depois de uma carga ou exclusão."""
+    snapshot = motor_memoria.snapshot
+    if snapshot is not None:
+        matriz = MatrizProducao.de_snapshot(snapshot)
+    else:
+        matriz = MatrizProducao.de_linhas(
+            db.execute(select(*_COLUNAS_PRODUCAO)).fetchall()
+        )
+    matriz_analises.trocar(_chave_analises(), snapshot, matriz)
+
+
+async def obter_matriz_analises(database: Database) -> MatrizProducao:
+    """
+    Matriz atual das rotas /analises. Só é remontada aqui se os dados mudaram
+    em outro processo (versões dos anos ou snapshot compartilhado).
+    """
+    snapshot = motor_memoria.snapshot
+    chave = _chave_analises()
+    matriz = matriz_analises.atual(chave, snapshot)
+    if matriz is None:
+        if snapshot is not None:
+            matriz = MatrizProducao.de_snapshot(snapshot)
+        else:
+            linhas = await database.fetch_all(select(*_COLUNAS_PRODUCAO))
+            matriz = MatrizProducao.de_linhas([tuple(linha) for linha in linhas])
+        matriz_analises.trocar(chave, snapshot, matriz)
+    return matriz
+
+
+async def get_analise(
+    nivel: str,
+    codigo: Optional[int],
+    ano_inicio: int,
+    ano_fim: int,
+    janela: int,
+    database: Database,
+) -> Optional[dict]:
+    matriz = await obter_matriz_analises(database)
+    return analisar(matriz, nivel, codigo, ano_inicio, ano_fim, janela)
+
+
+async def get_municipio(municipio_id: int, database: Database) -> List[dict]:
+    snapshot = motor_memoria.snapshot
+    chave = ("municipio", municipio_id)
+    if snapshot is not None:
+        municipios = snapshot.linhas_municipio(municipio_id)
+    else:
+        municipios = cache_municipios.obter(chave)
+    if municipios is AUSENTE:
+        marca = cache_municipios.marca()
+        municipios = tuple(
+            tuple(municipio)
+            for municipio in await database.fetch_all(
+                select(*_COLUNAS_PRODUCAO).where(
+                    ProducaoMunicipios.pm_municipio_id == municipio_id
+                )
+            )
+        )
+        cache_municipios.gravar(
+            chave, municipios, [municipio[1] for municipio in municipios], marca
+        )
+    return [_dados_producao(municipio) for municipio in municipios]
+
+
+async def get_municipio_por_ano(
+    ano: int, municipio_id: int, database: Database
+) -> Optional[dict]:
+    snapshot = motor_memoria.snapshot
+    chave = ("municipio_ano", ano, municipio_id)
+    if snapshot is not None:
+        municipio = snapshot.linha(ano, municipio_id)
+    else:
+        municipio = cache_municipios.obter(chave)
+    if municipio is AUSENTE:
+        marca = cache_municipios.marca()
+        municipio = await database.fetch_one(
+            select(*_COLUNAS_PRODUCAO)
+            .where(ProducaoMunicipios.pm_municipio_id == municipio_id)
+            .where(ProducaoMunicipios.pm_ano == ano)
+            .limit(1)
+        )
+        municipio = tuple(municipio) if municipio else None
+        cache_municipios.gravar(chave, municipio, [ano], marca)
+    return _dados_producao(municipio) if municipio else None
+
+
+async def get_producao_em_lote(
+    municipios: Optional[List[int]],
+    uf: Optional[int],
+    anos: range,
+    database: Database,
+) -> AsyncIterator[List[dict]]:
+    """
+    Produção dos municípios informados (ou de todos os da UF) nos anos, em
+    blocos ordenados por município e ano. A lista de códigos é dividida em
+    consultas de TAMANHO_BLOCO_IN códigos, até CONCORRENCIA_BLOCOS delas em
+    paralelo; cada bloco é entregue assim que ele e os anteriores terminam.
+    """
+    snapshot = motor_memoria.snapshot
+    if uf is not None:
+        inicio, fim = intervalo_uf(uf)
+        if snapshot is not None:
+            ids = snapshot.ids
+            municipios = ids[(ids >= inicio) & (ids <= fim)].tolist()
+        else:
+            linhas = await database.fetch_all(
+                select(*_COLUNAS_PRODUCAO)
+                .where(ProducaoMunicipios.pm_municipio_id.between(inicio, fim))
+                .where(ProducaoMunicipios.pm_ano.between(anos.start, anos.stop - 1))
+                .order_by(ProducaoMunicipios.pm_municipio_id, ProducaoMunicipios.pm_ano)
+            )
+            yield [_dados_producao(linha) for linha in linhas]
+            return
+
+    municipios = sorted(set(municipios))
+    if snapshot is not None:
+        linhas = snapshot.linhas(municipios, anos)
+        yield [_dados_producao(linha) for linha in linhas]
+        return
+
+    semaforo = asyncio.Semaphore(CONCORRENCIA_BLOCOS)
+
+    async def consultar(bloco: List[int]):
+        async with semaforo:
+            return await database.fetch_all(
+                select(*_COLUNAS_PRODUCAO)
+                .where(ProducaoMunicipios.pm_municipio_id.in_(bloco))
+                .where(ProducaoMunicipios.pm_ano.between(anos.start, anos.stop - 1))
+                .order_by(ProducaoMunicipios.pm_municipio_id, ProducaoMunicipios.pm_ano)
+            )
+
+    tarefas = [
+        asyncio.ensure_future(consultar(municipios[i : i + TAMANHO_BLOCO_IN]))
+        for i in range(0, len(municipios), TAMANHO_BLOCO_IN)
+    ]
+    try:
+        for tarefa in tarefas:
+            yield [_dados_producao(linha) for linha in await tarefa]
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+
+async def get_produtividade_estados_por_ano(
+    dados: ProdutividadeAnoEstados, database: Database
+) -> List[dict]:
+    snapshot = motor_memoria.snapshot
+    if snapshot is not None:
+        produtividade_estados = snapshot.produtividade_estados(dados.ano, dados.estados)
+    else:
+        produtividade_estados = await database.fetch_all(
+            select(ProdutividadeEstados.estado, ProdutividadeEstados.produtividade)
+            .where(ProdutividadeEstados.estado.in_(dados.estados))
+            .where(ProdutividadeEstados.pm_ano == dados.ano)
+        )
+    # mesmo valor que o ProdutividadePorEstado gerava a partir do float
     return [
-        ProdutividadePorEstado(
-            estado=produtividade_estado.estado,
-            produtividade=(
-                float(produtividade_estado.produtividade)
-                if produtividade_estado.produtividade
-                else 0
+        {
+            "estado": estado,
+            "produtividade": (
+                Decimal(repr(float(produtividade))) if produtividade else Decimal(0)
             ),
-        )
-        for produtividade_estado in produtividade_estados
+        }
+        for estado, produtividade in produtividade_estados
     ]
 
 
-def get_municipios_quantidade_produzida(
-    dados: InputAnosMunicipios, db: Session
+def montar_matriz_quantidades(linhas: Iterable[tuple]) -> Dict[int, dict]:
+    """
+    Monta a matriz ano x município de quantidade produzida direto das linhas
+    (municipio, ano, area, quantidade). Anos e municípios aparecem ordenados;
+    células sem dado ficam como None.
+    """
+    por_ano: Dict[int, Dict[int, int]] = {}
+    municipios = set()
+    for municipio, ano, _, quantidade in linhas:
+        por_ano.setdefault(ano, {})[municipio] = quantidade
+        municipios.add(municipio)
+    colunas = sorted(municipios)
+    return {
+        ano: {municipio: por_ano[ano].get(municipio) for municipio in colunas}
+        for ano in sorted(por_ano)
+    }
+
+
+async def get_municipios_quantidade_produzida(
+    dados: InputAnosMunicipios, database: Database
 ) -> dict:
-    consulta = (
-        db.query(ProducaoMunicipios)
-        .filter(ProducaoMunicipios.pm_municipio_id.in_(dados.municipios))
-        .filter(ProducaoMunicipios.pm_ano.in_(dados.anos))
-        .all()
+    snapshot = motor_memoria.snapshot
+    if snapshot is not None:
+        return montar_matriz_quantidades(snapshot.linhas(dados.municipios, dados.anos))
+    consulta = await database.fetch_all(
+        select(*_COLUNAS_PRODUCAO)
+        .where(ProducaoMunicipios.pm_municipio_id.in_(dados.municipios))
+        .where(ProducaoMunicipios.pm_ano.in_(dados.anos))
     )
-    if consulta:
-        consulta = [
-            {
-                "municipio_id": municipio.pm_municipio_id,
-                "ano": municipio.pm_ano,
-                "area_colhida": municipio.pm_area,
-                "quantidade_produzida": municipio.pm_quantidade,
-            }
-            for municipio in consulta
-        ]
-        df = pd.DataFrame(consulta)
-        df_transformado = df.pivot_table(
-            index="ano", columns="municipio_id", values="quantidade_produzida"
-        )
-        consulta = df_transformado.to_dict(orient="index")
-
-    return consulta
+    return montar_matriz_quantidades(consulta)
 
 
 def delete(year: int, db: Session) -> None:
-    db.query(ProducaoMunicipios).filter(ProducaoMunicipios.pm_ano == year).delete()
+    if particoes_ano.particionada(db.bind):
+        _encerrar_transacao(db)
+    if not particoes_ano.truncar(db.bind, year):
+        db.query(ProducaoMunicipios).filter(ProducaoMunicipios.pm_ano == year).delete()
+    db.query(DigestsProducao).filter(DigestsProducao.dp_ano == year).delete()
+    db.query(ProducaoProdutos).filter(ProducaoProdutos.pp_ano == year).delete(
+        synchronize_session=False
+    )
+    # sem os hashes da última carga, reprocessar o ano volta a gravá-lo
+    esquecer_cargas(year, db)
+    atualizar_produtividade_estados(year, None, db)
+    incrementar_versao(year, db)
+    incrementar_versao(year, db, VersoesProdutos)
     db.commit()
+    _invalidar_cache(year, None)
+    versoes_dados.carregar(db, [year])
+    versoes_produtos.carregar(db, [year])
+    recarregar_motor_memoria(db)
@@ -0,0 +1,75 @@
+import asyncio
+import math
+from datetime import datetime
+
+from src import view
+from src.analises import MatrizProducao, analisar, matriz_analises
+from src.versoes import versoes_dados
+
+LINHAS = [
+    (1100015, 2018, 100, 300),
+    (1100015, 2019, 100, 330),
+    (1100015, 2020, 110, 363),
+    (1100015, 2022, 100, 400),
+    (1100023, 2018, 10, 20),
+    (1100023, 2019, 10, 40),
+    (4200051, 2019, 5, 5),
+]
+
+
+def test_analisar_municipio():
+    serie = analisar(MatrizProducao.de_linhas(LINHAS), "municipio", 1100015, 2019, 2022)
+
+    assert (serie["ano_inicio"], serie["ano_fim"]) == (2019, 2022)
+    assert [ano["ano"] for ano in serie["anos"]] == [2019, 2020, 2022]
+    # a variação de 2019 usa 2018, fora do período pedido
+    assert serie["anos"][0]["variacao_quantidade"] == 30
+    assert serie["anos"][1]["variacao_percentual"] == 0.1
+    assert serie["anos"][1]["produtividade"] == 3.3
+    assert serie["anos"][1]["media_movel_quantidade"] == 331.0
+    # 2021 sem dado: nem variação nem média móvel em 2022
+    assert serie["anos"][2]["variacao_quantidade"] is None
+    assert serie["anos"][2]["media_movel_quantidade"] is None
+    assert math.isclose(
+        serie["cagr_quantidade"], (400 / 330) ** (1 / 3) - 1, rel_tol=1e-5
+    )
+
+
+def test_analisar_soma_uf_e_pais():
+    matriz = MatrizProducao.de_linhas(LINHAS)
+
+    uf = analisar(matriz, "uf", 11, 2018, 2019)
+    assert uf["codigo"] == "RO"
+    assert [
+        (ano["area_colhida"], ano["quantidade_produzida"]) for ano in uf["anos"]
+    ] == [
+        (110, 320),
+        (110, 370),
+    ]
+    brasil = analisar(matriz, "brasil", None, 2019, 2019)
+    assert brasil["anos"][0]["quantidade_produzida"] == 375
+    assert brasil["cagr_quantidade"] is None
+    assert analisar(matriz, "municipio", 4200051, 2020, 2022) is None
+    assert analisar(matriz, "uf", 35, 2018, 2022) is None
+
+
+def test_matriz_e_remontada_quando_as_versoes_mudam(monkeypatch):
+    consultas = []
+
+    class Database:
+        async def fetch_all(self, consulta):
+            consultas.append(consulta)
+            return LINHAS
+
+    matriz_analises.limpar()
+    monkeypatch.setattr(view.motor_memoria, "snapshot", None)
+    versoes_dados.definir({2018: (1, datetime(2024, 1, 1))})
+    try:
+        primeira = asyncio.run(view.obter_matriz_analises(Database()))
+        assert asyncio.run(view.obter_matriz_analises(Database())) is primeira
+        versoes_dados.definir({2018: (2, datetime(2024, 1, 2))})
+        assert asyncio.run(view.obter_matriz_analises(Database())) is not primeira
+        assert len(consultas) == 2
+    finally:
+        versoes_dados.definir({})
+        matriz_analises.limpar()
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from src import autenticacao_jwt
+from src.autenticacao_jwt import (
+    ChavesJWT,
+    cache_tokens,
+    create_jwt_token,
+    verificar_token,
+)
+
+
+@pytest.fixture
+def chaves(monkeypatch, tmp_path):
+    arquivo = tmp_path / "chaves.json"
+    arquivo.write_text(json.dumps({"atual": "a", "chaves": {"a": "segredo-a"}}))
+    chaves = ChavesJWT(str(arquivo), intervalo=0)
+    monkeypatch.setattr(autenticacao_jwt, "chaves_jwt", chaves)
+    chaves.carregar()
+    yield arquivo
+    cache_tokens.limpar()
+
+
+def _regravar(arquivo, conteudo):
+    arquivo.write_text(json.dumps(conteudo))
+    modificado_em = os.stat(arquivo).st_mtime + 1
+    os.utime(arquivo, (modificado_em, modificado_em))
+
+
+def test_token_verificado_fica_em_cache(chaves, monkeypatch):
+    token = create_jwt_token("username")
+    assert jwt.get_unverified_header(token)["kid"] == "a"
+    assert verificar_token(token)["sub"] == "username"
+
+    def decode(*args, **kwargs):
+        raise AssertionError("a assinatura não deveria ser verificada de novo")
+
+    monkeypatch.setattr(autenticacao_jwt.jwt, "decode", decode)
+    assert verificar_token(token)["sub"] == "username"
+
+
+def test_token_em_cache_expirado_e_recusado(chaves):
+    token = create_jwt_token("username")
+    payload = verificar_token(token)
+    payload["exp"] = time.time() - 1
+
+    with pytest.raises(HTTPException) as erro:
+        verificar_token(token)
+    assert erro.value.status_code == 401
+
+
+def test_rotacao_de_chaves_sem_reiniciar(chaves):
+    antigo = create_jwt_token("username")
+    verificar_token(antigo)
+
+    _regravar(chaves, {"atual": "b", "chaves": {"a": "segredo-a", "b": "segredo-b"}})
+    novo = create_jwt_token("username")
+    assert jwt.get_unverified_header(novo)["kid"] == "b"
+    assert verificar_token(novo)["sub"] == "username"
+    assert verificar_token(antigo)["sub"] == "username"
+
+    # removida do arquivo, a chave antiga deixa de valer mesmo com o token em cache
+    _regravar(chaves, {"atual": "b", "chaves": {"b": "segredo-b"}})
+    with pytest.raises(HTTPException):
+        verificar_token(antigo)
+    assert verificar_token(novo)["sub"] == "username"
+
+
+def test_token_com_assinatura_invalida(chaves):
+    token = jwt.encode({"sub": "x", "exp": time.time() + 60}, "outra", "HS256")
+    with pytest.raises(HTTPException) as erro:
+        verificar_token(token)
+    assert erro.value.status_code == 401
@@ -0,0 +1,30 @@
+from src.cache import AUSENTE, CacheLRU
+
+
+def test_cache_lru_descarta_e_invalida_por_ano():
+    cache = CacheLRU(max_entradas=2)
+    marca = cache.marca()
+    cache.gravar(
+        ("municipio", 1), ((1, 2018, 10, 30), (1, 2019, 11, 33)), [2018, 2019], marca
+    )
+    cache.gravar(("municipio_ano", 2018, 2), (2, 2018, 5, 15), [2018], marca)
+    assert cache.obter(("municipio", 1)) is not AUSENTE
+
+    cache.gravar(("municipio_ano", 2019, 3), None, [2019], marca)
+    assert cache.obter(("municipio_ano", 2018, 2)) is AUSENTE
+    assert cache.obter(("municipio_ano", 2019, 3)) is None
+
+    cache.invalidar_ano(2018)
+    assert cache.obter(("municipio", 1)) is AUSENTE
+    assert cache.obter(("municipio_ano", 2019, 3)) is None
+    assert cache.estatisticas()["descartes"] == 1
+
+
+def test_cache_ignora_gravacao_de_leitura_anterior_a_invalidacao():
+    cache = CacheLRU(max_entradas=10)
+    marca = cache.marca()
+    cache.invalidar([("municipio", 1)])
+    cache.gravar(("municipio", 1), (), [], marca)
+
+    assert cache.obter(("municipio", 1)) is AUSENTE
+    assert cache.estatisticas()["falhas"] == 1
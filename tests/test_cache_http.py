@@ -0,0 +1,78 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from src.cache_http import CondicaoCache, ano_da_rota, cache_http
+from src.respostas import padrao_retorno
+from src.database import VersoesProdutos
+from src.versoes import incrementar_versao, versoes_dados, versoes_produtos
+
+app = FastAPI()
+
+
+@app.get("/dados/{ano}")
+def dados(ano: int, cache: CondicaoCache = Depends(cache_http("teste", ano_da_rota))):
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    return cache.aplicar(padrao_retorno([ano]))
+
+
+@app.get("/produtos/{ano}")
+def produtos(
+    ano: int,
+    cache: CondicaoCache = Depends(cache_http("teste", ano_da_rota, produtos=True)),
+):
+    if cache.nao_modificado:
+        return cache.resposta_nao_modificada()
+    return cache.aplicar(padrao_retorno([ano]))
+
+
+def test_etag_muda_so_com_a_versao_do_ano(db):
+    cliente = TestClient(app)
+    incrementar_versao(2018, db)
+    incrementar_versao(2019, db)
+    db.commit()
+    versoes_dados.carregar(db)
+
+    resposta = cliente.get("/dados/2018")
+    etag = resposta.headers["etag"]
+    assert resposta.headers["cache-control"] == "no-cache"
+    assert "last-modified" in resposta.headers
+    resposta = cliente.get("/dados/2018", headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.content == b""
+
+    incrementar_versao(2019, db)
+    db.commit()
+    versoes_dados.carregar(db, [2019])
+    assert (
+        cliente.get("/dados/2018", headers={"If-None-Match": etag}).status_code == 304
+    )
+
+    incrementar_versao(2018, db)
+    db.commit()
+    versoes_dados.carregar(db, [2018])
+    resposta = cliente.get("/dados/2018", headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.headers["etag"] != etag
+
+
+def test_carga_de_produtos_so_muda_o_etag_das_consultas_com_produto(db):
+    cliente = TestClient(app)
+    incrementar_versao(2018, db)
+    incrementar_versao(2018, db, VersoesProdutos)
+    db.commit()
+    versoes_dados.carregar(db)
+    versoes_produtos.carregar(db)
+    padrao = cliente.get("/produtos/2018").headers["etag"]
+    milho = cliente.get("/produtos/2018?produto=40122").headers["etag"]
+
+    incrementar_versao(2018, db, VersoesProdutos)
+    db.commit()
+    versoes_produtos.carregar(db, [2018])
+    assert versoes_dados.versoes([2018])[2018][0] == 1
+    resposta = cliente.get("/produtos/2018", headers={"If-None-Match": padrao})
+    assert resposta.status_code == 304
+    resposta = cliente.get(
+        "/produtos/2018?produto=40122", headers={"If-None-Match": milho}
+    )
+    assert resposta.status_code == 200
@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src import service
+from src.cache_sidra import CacheSidra
+from src.exceptions import ProcessamentoException
+
+
+def _consultar(transport):
+    return asyncio.run(service.consultar_plantacoes_async([2018], transport=transport))[
+        2018
+    ]
+
+
+@pytest.fixture
+def area_colhida():
+    with open("./tests/area_colhida.json", "rb") as f:
+        return f.read()
+
+
+def test_revalida_com_etag_e_reaproveita_o_payload(monkeypatch, tmp_path, area_colhida):
+    cache = CacheSidra(str(tmp_path), ttl=0)
+    monkeypatch.setattr(service, "cache_sidra", cache)
+    condicionais = []
+
+    def handler(request):
+        if request.headers.get("if-none-match") == '"v1"':
+            condicionais.append(request.url.path)
+            return httpx.Response(304)
+        return httpx.Response(200, content=area_colhida, headers={"ETag": '"v1"'})
+
+    primeira = _consultar(httpx.MockTransport(handler))
+    segunda = _consultar(httpx.MockTransport(handler))
+
+    assert len(condicionais) == 2
+    assert primeira[216].hash == segunda[216].hash
+    # mesmo conteúdo para as duas variáveis: um único objeto no cache
+    assert primeira[216].caminho == primeira[214].caminho
+    assert segunda[216].colunas().valores[0] == 450
+
+
+def test_modo_offline_serve_somente_do_cache(monkeypatch, tmp_path, area_colhida):
+    cache = CacheSidra(str(tmp_path), ttl=3600)
+    monkeypatch.setattr(service, "cache_sidra", cache)
+    _consultar(
+        httpx.MockTransport(lambda request: httpx.Response(200, content=area_colhida))
+    )
+
+    def sem_rede(request):
+        raise AssertionError("modo offline não deve acessar a rede")
+
+    cache.offline = True
+    retornos = _consultar(httpx.MockTransport(sem_rede))
+    assert retornos[216].colunas().municipios[0] == 1100015
+
+    monkeypatch.setattr(
+        service, "cache_sidra", CacheSidra(str(tmp_path / "vazio"), 0, True)
+    )
+    retornos = _consultar(httpx.MockTransport(sem_rede))
+    assert isinstance(retornos[216], ProcessamentoException)
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import numpy as np
+
+from src.cache import AUSENTE, cache_municipios
+from src.compartilhado import DadosCompartilhados
+from src.memoria import SnapshotProducao, motor_memoria
+from src.versoes import versoes_dados, versoes_produtos
+
+
+def test_publicacao_e_troca_de_geracao(tmp_path, monkeypatch):
+    monkeypatch.setattr(motor_memoria, "snapshot", None)
+    monkeypatch.setattr(versoes_dados, "_versoes", {})
+    monkeypatch.setattr(versoes_produtos, "_versoes", {})
+    publicador = DadosCompartilhados(str(tmp_path), intervalo=0)
+    worker = DadosCompartilhados(str(tmp_path), intervalo=60)
+    assert not worker.sincronizar(forcar=True)
+
+    atualizado_em = datetime(2024, 1, 2, 3, 4, 5)
+    publicador.publicar(
+        SnapshotProducao.de_linhas(
+            [(3550308, 2020, 10, 30), (1100015, 2019, 4, 8)], {}
+        ),
+        {2019: (1, atualizado_em)},
+        {2019: (3, atualizado_em)},
+    )
+    assert worker.sincronizar(forcar=True)
+    assert isinstance(motor_memoria.snapshot.anos, np.memmap)
+    assert motor_memoria.snapshot.linha(2020, 3550308) == (3550308, 2020, 10, 30)
+    assert versoes_dados.versoes() == {2019: (1, atualizado_em)}
+    assert versoes_produtos.versoes() == {2019: (3, atualizado_em)}
+
+    marca = cache_municipios.marca()
+    cache_municipios.gravar(("municipio", 1100015), (), [2019], marca)
+    for geracao in range(2, 6):
+        publicador.publicar(
+            SnapshotProducao.de_linhas([(1100015, 2019, geracao, 8)], {}),
+            {2019: (geracao, atualizado_em)},
+        )
+    # dentro do intervalo, a geração nova ainda não é verificada
+    assert not worker.sincronizar()
+    assert worker.sincronizar(forcar=True)
+    assert worker.geracao == 5
+    assert motor_memoria.snapshot.linhas_municipio(3550308) == []
+    assert motor_memoria.snapshot.linha(2019, 1100015) == (1100015, 2019, 5, 8)
+    assert cache_municipios.obter(("municipio", 1100015)) is AUSENTE
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [
+        "g3",
+        "g4",
+        "g5",
+    ]
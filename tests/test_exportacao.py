@@ -0,0 +1,89 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+from databases import Database
+from sqlalchemy import create_engine
+
+from src import exportacao
+from src.database import Base, ProducaoMunicipios
+from src.schemas import FormatoExportacao
+
+
+async def _exportar(url, formato, *args):
+    database = Database(url)
+    await database.connect()
+    try:
+        return b"".join(
+            [
+                parte
+                async for parte in exportacao.exportar_producao(
+                    database, formato, *args
+                )
+            ]
+        )
+    finally:
+        await database.disconnect()
+
+
+def _banco(tmp_path):
+    url = f"sqlite:///{tmp_path / 'exportacao.sqlite3'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        conexao.execute(
+            ProducaoMunicipios.__table__.insert(),
+            [
+                {
+                    "pm_municipio_id": municipio,
+                    "pm_ano": ano,
+                    "pm_area": 10,
+                    "pm_quantidade": ano,
+                }
+                for municipio in (1100015, 1100023, 3550308)
+                for ano in (2018, 2019, 2020)
+            ],
+        )
+    engine.dispose()
+    return url
+
+
+def test_exportacao_pagina_pela_chave_e_filtra_estados(monkeypatch, tmp_path):
+    url = _banco(tmp_path)
+    monkeypatch.setattr(exportacao, "TAMANHO_PARTE", 2)
+
+    ndjson = asyncio.run(_exportar(url, FormatoExportacao.ndjson, 2019, 2020, [" ro"]))
+    linhas = [json.loads(linha) for linha in ndjson.decode().splitlines()]
+    assert [(linha["municipio_id"], linha["ano"]) for linha in linhas] == [
+        (1100015, 2019),
+        (1100015, 2020),
+        (1100023, 2019),
+        (1100023, 2020),
+    ]
+
+    texto = asyncio.run(_exportar(url, FormatoExportacao.csv, 2018, 2020)).decode()
+    registros = list(csv.DictReader(io.StringIO(texto)))
+    assert len(registros) == 9
+    assert registros[-1]["municipio_id"] == "3550308"
+
+
+def test_estados_invalidos_ignora_caixa_e_espacos():
+    assert exportacao.estados_invalidos(["sc", " Rs ", "XX"]) == ["XX"]
+
+
+def test_exportacao_parquet(monkeypatch, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    url = _banco(tmp_path)
+    monkeypatch.setattr(exportacao, "TAMANHO_PARTE", 4)
+
+    conteudo = asyncio.run(
+        _exportar(url, FormatoExportacao.parquet, 2018, 2020, ["sp", "RO"])
+    )
+    arquivo = pq.ParquetFile(io.BytesIO(conteudo))
+    assert arquivo.metadata.num_row_groups == 3
+    tabela = arquivo.read()
+    assert tabela.column_names == list(exportacao.COLUNAS)
+    assert tabela.num_rows == 9
+    assert tabela.column("municipio_id").to_pylist()[-1] == 3550308
@@ -1,48 +1,130 @@
+import asyncio
 import json
-import responses
 
-from fastapi.encoders import jsonable_encoder
+import httpx
 
-from src.schemas import RetornoConsultaPlantacoes
-from src.service import consulta_area_colhida, consulta_quantidade_produzida
+from src import service
+from src.cache_sidra import CacheSidra
+from src.parser_sidra import ler_retorno_sidra
 
 
-def test_payload_retorno_consulta_area_colhida():
-    year = 2018
+def test_consulta_async_usa_a_url_de_cada_variavel(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, "cache_sidra", CacheSidra(str(tmp_path), ttl=0))
     with open("./tests/area_colhida.json") as f:
-        retorno = RetornoConsultaPlantacoes(json.load(f))
+        area_colhida = json.load(f)
+    with open("./tests/quantidade_produzida.json") as f:
+        quantidade_produzida = json.load(f)
+
+    caminhos = []
+
+    def handler(request):
+        caminhos.append(request.url.path)
+        if "/v/216/" in request.url.path:
+            return httpx.Response(200, json=area_colhida)
+        return httpx.Response(200, json=quantidade_produzida)
 
-    with responses.RequestsMock() as rsps:
-        rsps.add(
-            responses.GET,
-            f"https://apisidra.ibge.gov.br/values/t/5457/n6/all/v/216/p/{year}/c782/40124?formato=json",
-            json=jsonable_encoder(retorno),
+    retornos = asyncio.run(
+        service.consultar_plantacoes_async(
+            [2018], transport=httpx.MockTransport(handler)
         )
-        consulta = consulta_area_colhida(2018)
+    )
 
-    assert consulta[0]["V"] == "Valor"
-    assert consulta[0]["D1C"] == "Município (Código)"
-    assert consulta[1]["V"] == "450"
-    assert consulta[1]["D1C"] == "1100015"
-    assert consulta[1]["D2N"] == "Área colhida"
+    assert sorted(caminhos) == [
+        "/values/t/5457/n6/all/v/214/p/2018/c782/40124",
+        "/values/t/5457/n6/all/v/216/p/2018/c782/40124",
+    ]
+    area = retornos[2018][216].colunas()
+    quantidade = retornos[2018][214].colunas()
+    assert (area.municipios[0], area.valores[0]) == (1100015, 450)
+    assert (quantidade.municipios[0], quantidade.valores[0]) == (1100015, 1350)
 
 
-def test_payload_retorno_consulta_quantidade_produzida():
-    year = 2018
+def test_consulta_plantacoes_async_repete_falhas_temporarias(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, "SIDRA_BACKOFF", 0)
+    monkeypatch.setattr(service, "cache_sidra", CacheSidra(str(tmp_path), ttl=0))
+    with open("./tests/area_colhida.json") as f:
+        area_colhida = json.load(f)
     with open("./tests/quantidade_produzida.json") as f:
-        retorno_json = json.load(f)
-    with responses.RequestsMock() as rsps:
-        rsps.add(
-            responses.GET,
-            f"https://apisidra.ibge.gov.br/values/t/5457/n6/all/v/214/p/{year}/c782/40124?formato=json",
-            json=retorno_json,
+        quantidade_produzida = json.load(f)
+
+    chamadas = []
+
+    def handler(request):
+        chamadas.append(request.url.path)
+        if (
+            "/v/216/p/2018/" in request.url.path
+            and chamadas.count(request.url.path) == 1
+        ):
+            return httpx.Response(503)
+        if "/p/2019/" in request.url.path:
+            return httpx.Response(404)
+        if "/v/216/" in request.url.path:
+            return httpx.Response(200, json=area_colhida)
+        return httpx.Response(200, json=quantidade_produzida)
+
+    retornos = asyncio.run(
+        service.consultar_plantacoes_async(
+            [2018, 2019], transport=httpx.MockTransport(handler)
         )
-        consulta = consulta_quantidade_produzida(2018)
+    )
+
+    assert retornos[2018][216].colunas().valores[0] == 450
+    assert retornos[2018][214].colunas().valores[0] == 1350
+    assert isinstance(retornos[2019][216], httpx.HTTPStatusError)
+    assert len(chamadas) == 5
+
+
+def test_leitura_incremental_retorno_sidra():
+    with open("./tests/area_colhida.json", "rb") as f:
+        conteudo = f.read()
+
+    # blocos pequenos cortam objetos e caracteres multibyte no meio
+    colunas = ler_retorno_sidra(conteudo[i : i + 7] for i in range(0, len(conteudo), 7))
+
+    assert len(colunas.municipios) == 25
+    assert colunas.municipios.dtype == "int32"
+    assert colunas.anos.dtype == "int16"
+    assert colunas.valores.dtype == "int64"
+    assert colunas.municipios[0] == 1100015
+    assert colunas.anos[0] == 2018
+    assert colunas.valores[0] == 450
+    assert colunas.valores[7] == 0  # "-"
+
+
+def test_consulta_por_uf_repete_so_a_parte_que_falhou(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, "SIDRA_TENTATIVAS", 1)
+    monkeypatch.setattr(service, "cache_sidra", CacheSidra(str(tmp_path), ttl=3600))
+    with open("./tests/area_colhida.json") as f:
+        cabecalho, *linhas = json.load(f)
+    linhas_sp = [dict(linha, D1C=f"35{linha['D1C'][2:]}") for linha in linhas[:3]]
+    por_uf = {"11": linhas, "35": linhas_sp}
+
+    chamadas = []
+    falhar = {"35"}
+
+    def handler(request):
+        uf = request.url.path.split("/n6/in n3 ")[1].split("/")[0]
+        chamadas.append(uf)
+        if uf in falhar:
+            return httpx.Response(500)
+        return httpx.Response(200, json=[cabecalho] + por_uf.get(uf, []))
 
-    RetornoConsultaPlantacoes(retorno_json)
+    transport = httpx.MockTransport(handler)
+    retornos = asyncio.run(
+        service.consultar_plantacoes_async([2018], transport=transport, por_uf=True)
+    )
+    assert isinstance(retornos[2018][216], httpx.HTTPStatusError)
+    assert len(chamadas) == 2 * 27
 
-    assert consulta[0]["V"] == "Valor"
-    assert consulta[0]["D1C"] == "Município (Código)"
-    assert consulta[1]["V"] == "1350"
-    assert consulta[1]["D1C"] == "1100015"
-    assert consulta[1]["D2N"] == "Quantidade produzida"
+    chamadas.clear()
+    falhar.clear()
+    retornos = asyncio.run(
+        service.consultar_plantacoes_async([2018], transport=transport, por_uf=True)
+    )
+    # as outras 26 UFs de cada variável vieram do cache
+    assert chamadas == ["35", "35"]
+    colunas = retornos[2018][216].colunas()
+    assert len(colunas.municipios) == 28
+    assert colunas.municipios[0] == 1100015
+    assert colunas.municipios[25] == 3500015
+    assert colunas.valores[0] == 450
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from src.memoria import SnapshotProducao
+
+MUNICIPIOS = {
+    3550308: ("São Paulo", "SP"),
+    1100015: ("Alta Floresta D'Oeste", "RO"),
+    1100023: ("Ariquemes", "RO"),
+}
+
+
+def test_snapshot_producao():
+    snapshot = SnapshotProducao.de_linhas(
+        [
+            (3550308, 2020, 10, 30),
+            (1100015, 2019, 4, 8),
+            (3550308, 2019, 5, 10),
+            (3509502, 2019, 5, 20),
+        ],
+        MUNICIPIOS,
+    )
+
+    assert len(snapshot) == 4
+    assert snapshot.linhas_municipio(3550308) == [
+        (3550308, 2019, 5, 10),
+        (3550308, 2020, 10, 30),
+    ]
+    assert snapshot.linhas_municipio(9999999) == []
+    assert snapshot.linha(2020, 3550308) == (3550308, 2020, 10, 30)
+    assert snapshot.linha(2021, 3550308) is None
+    assert sorted(snapshot.linhas([3550308, 1100015], [2019])) == [
+        (1100015, 2019, 4, 8),
+        (3550308, 2019, 5, 10),
+    ]
+    # 3509502 não está no mapa de municípios: fica fora da soma de SP, como
+    # em produtividade_estados
+    assert snapshot.produtividade_estados(2019, ["SP", "RO", "MG", "XX"]) == [
+        ("SP", Decimal(2)),
+        ("RO", Decimal(2)),
+    ]
+
+
+def test_snapshot_producao_com_valores_nulos():
+    snapshot = SnapshotProducao.de_linhas(
+        [(1100015, 2019, None, 8), (1100023, 2019, 4, None)], MUNICIPIOS
+    )
+
+    assert snapshot.linha(2019, 1100015) == (1100015, 2019, 0, 8)
+    assert snapshot.linha(2019, 1100023) == (1100023, 2019, 4, 0)
+    assert snapshot.produtividade_estados(2019, ["RO"]) == [("RO", Decimal(2))]
@@ -0,0 +1,31 @@
+import pytest
+from prometheus_client import generate_latest
+
+from src import metricas as modulo
+from src.metricas import Metricas, etapa
+
+
+def test_etapa_sem_metricas_nao_registra_nada(monkeypatch):
+    monkeypatch.setattr(modulo, "metricas", None)
+    assert etapa("sidra") is etapa("parse")
+
+
+def test_metricas_de_etapas_e_consultas(monkeypatch):
+    metricas = Metricas()
+    monkeypatch.setattr(modulo, "metricas", metricas)
+
+    with etapa("parse"):
+        pass
+    with pytest.raises(ValueError):
+        with etapa("upsert"):
+            raise ValueError
+    acumulado = [0, 0.0]
+    token = modulo._consultas_requisicao.set(acumulado)
+    metricas.registrar_consulta("async", 0.25)
+    modulo._consultas_requisicao.reset(token)
+
+    texto = generate_latest(metricas.registro).decode()
+    assert 'ingestao_etapa_segundos_count{etapa="parse"} 1.0' in texto
+    assert 'ingestao_etapa_falhas_total{etapa="upsert"} 1.0' in texto
+    assert 'db_consulta_segundos_sum{conexao="async"} 0.25' in texto
+    assert acumulado == [1, 0.25]
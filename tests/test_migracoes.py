@@ -0,0 +1,264 @@
+import asyncio
+import re
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session
+
+from src import cargas, exportacao, view
+from src.analises import matriz_analises
+from src.database import Base, Municipios, ProducaoMunicipios
+from src.digests import hash_linhas
+from src.migracoes import aplicar_migracoes
+from src.produtos import get_municipio_produto
+from src.schemas import InputAnosMunicipios, ProdutividadeAnoEstados
+from src.service import RetornoSidra
+
+# SCAN sem restrição é leitura da tabela (ou índice) inteira; SEARCH usa a chave
+_VARREDURA = re.compile(r"^SCAN (?!CONSTANT ROW)")
+
+
+class _DatabaseSincrona:
+    """Faz as consultas das funções assíncronas pela mesma conexão síncrona."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def fetch_all(self, consulta):
+        return self.db.execute(consulta).fetchall()
+
+    async def fetch_one(self, consulta):
+        return self.db.execute(consulta).first()
+
+
+async def _consumir(blocos):
+    return [bloco async for bloco in blocos]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'planos.sqlite3'}")
+    yield engine
+    engine.dispose()
+
+
+def test_aplicar_migracoes_cria_indices_em_tabelas_existentes(engine):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql("DROP INDEX ix_producao_municipios_ano")
+
+    aplicar_migracoes(engine)
+    aplicar_migracoes(engine)
+
+    indices = {
+        indice["name"]
+        for tabela in ("producao_municipios", "municipios", "produtividade_estados")
+        for indice in inspect(engine).get_indexes(tabela)
+    }
+    assert {
+        "ix_producao_municipios_ano",
+        "ix_municipios_uf_id_ibge",
+        "ix_produtividade_estados_ano",
+    } <= indices
+
+
+def test_aplicar_migracoes_cria_e_preenche_pm_hash(engine):
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql(
+            "CREATE TABLE producao_municipios (pm_municipio_id INTEGER, "
+            "pm_ano INTEGER, pm_area INTEGER, pm_quantidade INTEGER, "
+            "PRIMARY KEY (pm_municipio_id, pm_ano))"
+        )
+        conexao.exec_driver_sql(
+            "INSERT INTO producao_municipios VALUES (1100015, 2019, 10, 30)"
+        )
+
+    aplicar_migracoes(engine)
+
+    with engine.connect() as conexao:
+        assert conexao.exec_driver_sql(
+            "SELECT pm_hash FROM producao_municipios"
+        ).scalar() == int(hash_linhas([10], [30])[0])
+
+
+def test_aplicar_migracoes_cria_e_preenche_cs_ano(engine):
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql(
+            "CREATE TABLE cargas_sidra (cs_chave VARCHAR(64) PRIMARY KEY, "
+            "cs_hash VARCHAR(64) NOT NULL, cs_processado_em DATETIME NOT NULL)"
+        )
+        conexao.exec_driver_sql(
+            "INSERT INTO cargas_sidra VALUES"
+            " ('t5457-v216-p2019-c782-40124', 'a', '2024-01-01 00:00:00'),"
+            " ('t5457-v216-214-p2020-c782-0123456789ab', 'b', '2024-01-01 00:00:00')"
+        )
+
+    aplicar_migracoes(engine)
+
+    with engine.connect() as conexao:
+        assert sorted(
+            conexao.exec_driver_sql("SELECT cs_ano FROM cargas_sidra").scalars()
+        ) == [2019, 2020]
+
+
+# municípios a mais por UF: com tabelas minúsculas o otimizador do MySQL
+# prefere ler a tabela inteira mesmo com o índice certo
+_SIGLAS = {11: "RO", 12: "AC", 35: "SP", 42: "SC"}
+_MUNICIPIOS_EXTRAS = 300
+
+
+def _consultas_da_view(engine, monkeypatch):
+    """
+    Executa as consultas da view, das cargas, dos produtos e da exportação e
+    retorna as que têm WHERE, com os parâmetros, e as tabelas lidas inteiras.
+    """
+    # um código por bloco: a consulta em lote vira várias consultas IN; a
+    # exportação de RO (604 linhas) fica em três partes paginadas pela chave
+    monkeypatch.setattr(view, "TAMANHO_BLOCO_IN", 1)
+    monkeypatch.setattr(exportacao, "TAMANHO_PARTE", 250)
+    aplicar_migracoes(engine)
+    municipios = [1100015, 3550308] + [
+        uf * 100000 + 10 * indice
+        for uf in _SIGLAS
+        for indice in range(_MUNICIPIOS_EXTRAS)
+    ]
+    with engine.begin() as conexao:
+        conexao.execute(
+            Municipios.__table__.insert(),
+            [
+                {
+                    "id": municipio,
+                    "nome": str(municipio),
+                    "uf": _SIGLAS[municipio // 100000],
+                    "uf_id_ibge": municipio // 100000,
+                }
+                for municipio in municipios
+            ],
+        )
+        conexao.execute(
+            ProducaoMunicipios.__table__.insert(),
+            [
+                {
+                    "pm_municipio_id": municipio,
+                    "pm_ano": ano,
+                    "pm_area": 10,
+                    "pm_quantidade": 30,
+                }
+                for municipio in municipios
+                for ano in (2018, 2019)
+            ],
+        )
+        if engine.dialect.name == "mysql":
+            conexao.exec_driver_sql("ANALYZE TABLE producao_municipios, municipios")
+
+    consultas = []
+
+    def registrar(conexao, cursor, sql, parametros, contexto, executemany):
+        if executemany:
+            parametros = parametros[0]
+        consultas.append((sql, parametros))
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    with Session(engine) as db:
+        database = _DatabaseSincrona(db)
+        view.insert_or_update(
+            2019,
+            pd.DataFrame(
+                [(1100015, 12, 36), (3550308, 10, 30)],
+                columns=["pm_municipio_id", "pm_area", "pm_quantidade"],
+            ).assign(pm_ano=2019),
+            db,
+        )
+        cargas.registrar_processamento(2018, [RetornoSidra("chave", "hash", None)], db)
+        cargas.hashes_processados(["chave"], db)
+        asyncio.run(view.aquecer_cache(database))
+        asyncio.run(view.get_municipio(1100015, database))
+        asyncio.run(view.get_municipio_por_ano(2019, 1100015, database))
+        asyncio.run(
+            view.get_produtividade_estados_por_ano(
+                ProdutividadeAnoEstados(ano=2019, estados=["RO"]), database
+            )
+        )
+        asyncio.run(
+            view.get_municipios_quantidade_produzida(
+                InputAnosMunicipios(municipios=[1100015], anos=[2019]), database
+            )
+        )
+        asyncio.run(
+            _consumir(
+                view.get_producao_em_lote(
+                    [1100015, 3550308], None, range(2018, 2020), database
+                )
+            )
+        )
+        asyncio.run(
+            _consumir(view.get_producao_em_lote(None, 11, range(2018, 2020), database))
+        )
+        asyncio.run(get_municipio_produto(40124, 1100015, database, 2019))
+        asyncio.run(_consumir(exportacao._partes(database, 2018, 2019, ["RO"])))
+        view.substituir_ano(
+            2019,
+            pd.DataFrame(
+                [(1100015, 12, 36)],
+                columns=["pm_municipio_id", "pm_area", "pm_quantidade"],
+            ).assign(pm_ano=2019),
+            db,
+        )
+        view.reconstruir_matriz_analises(db)
+        matriz_analises.limpar()
+        asyncio.run(view.obter_matriz_analises(database))
+        view.delete(2018, db)
+    event.remove(engine, "before_cursor_execute", registrar)
+    view.cache_municipios.limpar()
+    matriz_analises.limpar()
+
+    assert len(consultas) > 10
+    com_where = []
+    leituras_completas = set()
+    for sql, parametros in consultas:
+        # o SQL gerado quebra a linha antes do WHERE
+        texto = " ".join(sql.split())
+        if texto.startswith("INSERT"):
+            continue
+        if " WHERE " not in texto:
+            leituras_completas.add(re.search(r" FROM (\w+)", texto).group(1))
+            continue
+        com_where.append((sql, parametros))
+    # leituras intencionais da tabela inteira: aquecimento do cache, matriz de
+    # /analises e mapa de municípios
+    assert leituras_completas == {"producao_municipios", "municipios"}
+    return com_where
+
+
+def test_consultas_da_view_nao_fazem_varredura_completa(engine, monkeypatch):
+    """
+    Plano das consultas no SQLite, sempre executado. O plano do MySQL, que é
+    o banco de produção, é verificado por
+    test_consultas_da_view_nao_fazem_varredura_completa_no_mysql, só quando
+    MYSQL_TESTE_URL está definida.
+    """
+    consultas = _consultas_da_view(engine, monkeypatch)
+    varreduras = []
+    with engine.connect() as conexao:
+        for sql, parametros in consultas:
+            for linha in conexao.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + sql, parametros
+            ):
+                if _VARREDURA.match(linha[-1]):
+                    varreduras.append((linha[-1], " ".join(sql.split())))
+    assert varreduras == []
+
+
+def test_consultas_da_view_nao_fazem_varredura_completa_no_mysql(
+    mysql_engine, monkeypatch
+):
+    consultas = _consultas_da_view(mysql_engine, monkeypatch)
+    varreduras = []
+    with mysql_engine.connect() as conexao:
+        for sql, parametros in consultas:
+            for linha in conexao.exec_driver_sql("EXPLAIN " + sql, parametros):
+                # ALL lê a tabela inteira; index, o índice inteiro
+                if linha._mapping["type"] in ("ALL", "index"):
+                    varreduras.append((linha._mapping["table"], " ".join(sql.split())))
+    assert varreduras == []
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from src.database import Municipios, ProdutividadeEstados, VersoesAnos
+from src.municipios import carregar_municipios, mapa_municipios
+from src.view import insert_or_update
+
+
+def _csv(caminho, linhas):
+    caminho.write_bytes(
+        (
+            "id_uf_ibge;sg_uf;id_municipio_ibge;nm_municipio\r\n"
+            + "".join(f"{linha}\r\n" for linha in linhas)
+        ).encode("iso-8859-1")
+    )
+    return str(caminho)
+
+
+def test_carregar_municipios_ignora_arquivo_sem_alteracoes(db, tmp_path):
+    assert carregar_municipios(db) == 5570
+    assert carregar_municipios(db) == 0
+    assert db.query(Municipios).count() == 5570
+    assert mapa_municipios.municipios(db)[1100015] == ("Alta Floresta D'Oeste", "RO")
+
+    csv = _csv(
+        tmp_path / "dct_municipio_uf.csv", ["11;RO;1100015;Alta Floresta d'Oeste"]
+    )
+    assert carregar_municipios(db, csv) == 1
+    assert db.get(Municipios, 1100015).nome == "Alta Floresta d'Oeste"
+    # os que saíram do arquivo são excluídos
+    assert db.query(Municipios).count() == 1
+    assert mapa_municipios.municipios(db)[1100015] == ("Alta Floresta d'Oeste", "RO")
+
+
+def test_carregar_municipios_recalcula_os_estados_dos_anos_afetados(db, tmp_path):
+    carregar_municipios(
+        db,
+        _csv(
+            tmp_path / "v1.csv",
+            ["11;RO;1100015;Alta Floresta D'Oeste", "42;SC;4200051;Abdon Batista"],
+        ),
+    )
+    insert_or_update(
+        2018,
+        pd.DataFrame(
+            [(1100015, 450, 1350), (4200051, 10, 30)],
+            columns=["pm_municipio_id", "pm_area", "pm_quantidade"],
+        ).assign(pm_ano=2018),
+        db,
+    )
+
+    def estados():
+        return {
+            linha.estado: linha.total_quantidade
+            for linha in db.query(ProdutividadeEstados).filter_by(pm_ano=2018)
+        }
+
+    assert estados() == {"RO": 1350, "SC": 30}
+
+    # Abdon Batista sai do arquivo e Alta Floresta muda de UF
+    carregar_municipios(
+        db, _csv(tmp_path / "v2.csv", ["12;AC;1100015;Alta Floresta D'Oeste"])
+    )
+    assert db.query(Municipios.id).all() == [(1100015,)]
+    assert estados() == {"AC": 1350}
+    assert db.query(VersoesAnos.va_versao).filter_by(va_ano=2018).scalar() == 2
+
+    # só o nome muda: os anos não são recalculados
+    carregar_municipios(db, _csv(tmp_path / "v3.csv", ["12;AC;1100015;Alta Floresta"]))
+    assert db.query(VersoesAnos.va_versao).filter_by(va_ano=2018).scalar() == 2
@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+
+from src import view
+from src.database import Base, Municipios, ProducaoMunicipios, VersoesAnos
+from src.particoes import particoes_ano
+
+
+def _registro(municipio_id, ano, quantidade):
+    return {
+        "pm_municipio_id": municipio_id,
+        "pm_ano": ano,
+        "pm_area": quantidade,
+        "pm_quantidade": quantidade,
+        "pm_hash": None,
+    }
+
+
+def _ano(ano, linhas):
+    return pd.DataFrame(
+        linhas, columns=["pm_municipio_id", "pm_area", "pm_quantidade"]
+    ).assign(pm_ano=ano)
+
+
+def _particoes(engine):
+    with engine.connect() as conexao:
+        return set(
+            conexao.execute(
+                text(
+                    "SELECT PARTITION_NAME FROM information_schema.PARTITIONS"
+                    " WHERE TABLE_SCHEMA = DATABASE()"
+                    " AND TABLE_NAME = 'producao_municipios'"
+                )
+            ).scalars()
+        )
+
+
+def _linhas(engine):
+    with engine.connect() as conexao:
+        return conexao.execute(
+            select(
+                ProducaoMunicipios.pm_municipio_id,
+                ProducaoMunicipios.pm_ano,
+                ProducaoMunicipios.pm_quantidade,
+            ).order_by(ProducaoMunicipios.pm_ano, ProducaoMunicipios.pm_municipio_id)
+        ).fetchall()
+
+
+@pytest.fixture
+def particionada(mysql_engine):
+    Base.metadata.create_all(mysql_engine)
+    with mysql_engine.begin() as conexao:
+        conexao.execute(
+            ProducaoMunicipios.__table__.insert(),
+            [_registro(1100015, 2019, 1), _registro(1100015, 2020, 2)],
+        )
+    particoes_ano.particionar(mysql_engine)
+    return mysql_engine
+
+
+def test_garantir_truncar_e_trocar(particionada):
+    assert particoes_ano.particionada(particionada)
+    assert _particoes(particionada) == {"p2019", "p2020"}
+
+    particoes_ano.garantir(particionada, 2021)
+    # partição criada por outro processo
+    particoes_ano.limpar()
+    particoes_ano.garantir(particionada, 2021)
+    assert _particoes(particionada) == {"p2019", "p2020", "p2021"}
+
+    with particoes_ano.trocar(particionada, 2020, [_registro(1100023, 2020, 5)]):
+        pass
+    assert _linhas(particionada) == [(1100015, 2019, 1), (1100023, 2020, 5)]
+    assert not inspect(particionada).has_table("producao_municipios_p2020")
+
+    assert particoes_ano.truncar(particionada, 2019)
+    # sem partição o ano não tem linhas
+    assert particoes_ano.truncar(particionada, 2022)
+    assert _linhas(particionada) == [(1100023, 2020, 5)]
+
+
+def test_trocar_desfaz_a_troca_se_o_bloco_falhar(particionada):
+    with pytest.raises(RuntimeError):
+        with particoes_ano.trocar(particionada, 2020, [_registro(1100023, 2020, 5)]):
+            assert _linhas(particionada)[-1] == (1100023, 2020, 5)
+            raise RuntimeError("falha nas tabelas derivadas")
+
+    assert _linhas(particionada) == [(1100015, 2019, 1), (1100015, 2020, 2)]
+    assert not inspect(particionada).has_table("producao_municipios_p2020")
+
+
+def test_view_com_a_tabela_particionada(particionada, monkeypatch):
+    db = Session(bind=particionada)
+    db.add(Municipios(id=1100015, nome="Alta Floresta D'Oeste", uf="RO", uf_id_ibge=11))
+    db.commit()
+    try:
+        # ano novo: a partição é criada antes de a sessão ler a tabela
+        view.insert_or_update(2021, _ano(2021, [(1100015, 450, 1350)]), db)
+        assert "p2021" in _particoes(particionada)
+
+        def falhar(*args):
+            raise RuntimeError("falha nos digests")
+
+        monkeypatch.setattr(view, "_gravar_digests", falhar)
+        with pytest.raises(RuntimeError):
+            view.substituir_ano(2021, _ano(2021, [(1100015, 500, 1500)]), db)
+        assert _linhas(particionada)[-1] == (1100015, 2021, 1350)
+        assert db.query(VersoesAnos.va_versao).filter_by(va_ano=2021).scalar() == 1
+
+        monkeypatch.undo()
+        view.substituir_ano(2021, _ano(2021, [(1100015, 500, 1500)]), db)
+        assert _linhas(particionada)[-1] == (1100015, 2021, 1500)
+        assert db.query(VersoesAnos.va_versao).filter_by(va_ano=2021).scalar() == 2
+
+        view.delete(2021, db)
+        assert _linhas(particionada) == [(1100015, 2019, 1), (1100015, 2020, 2)]
+    finally:
+        db.close()
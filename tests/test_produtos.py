@@ -0,0 +1,94 @@
+import json
+
+import httpx
+
+from src import service
+from src.cache_sidra import CacheSidra
+from src.database import ProducaoProdutos
+from src.produtos import ConsultaProdutos, dividir_lotes, processar_produtos
+
+CABECALHO = {
+    "V": "Valor",
+    "D1C": "Município (Código)",
+    "D2C": "Variável (Código)",
+    "D3C": "Ano (Código)",
+    "D4C": "Produto das lavouras temporárias e permanentes (Código)",
+}
+
+
+def _linha(municipio, variavel, produto, valor):
+    return {
+        "V": valor,
+        "D1C": str(municipio),
+        "D2C": str(variavel),
+        "D3C": "2020",
+        "D4C": str(produto),
+    }
+
+
+def test_dividir_lotes_respeita_limite_de_valores():
+    consulta = ConsultaProdutos(produtos=list(range(40100, 40120)))
+    lotes = dividir_lotes(consulta, consulta.produtos, [2019, 2020])
+
+    # 100000 valores / (5570 municípios x 2 variáveis) = 8 produtos por lote
+    assert [len(lote.produtos) for lote in lotes] == [8, 8, 4, 8, 8, 4]
+    assert "/v/216,214/p/2019/c782/40100,40101," in lotes[0].url
+    assert len({lote.chave for lote in lotes}) == 6
+
+
+def test_processar_produtos(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(service, "cache_sidra", CacheSidra(str(tmp_path), ttl=0))
+    metadados = {
+        "id": 5457,
+        "classificacoes": [
+            {
+                "id": 782,
+                "categorias": [
+                    {"id": 0, "nome": "Total"},
+                    {"id": 40124, "nome": "Soja (em grão)"},
+                    {"id": 40122, "nome": "Milho (em grão)"},
+                ],
+            }
+        ],
+    }
+    valores = [CABECALHO] + [
+        _linha(1100015, 216, 40122, "10"),
+        _linha(1100015, 214, 40122, "50"),
+        _linha(1100015, 216, 40124, "450"),
+        _linha(1100015, 214, 40124, "1350"),
+        _linha(1100023, 216, 40124, "-"),
+        _linha(1100023, 214, 40124, "..."),
+    ]
+    chamadas = []
+
+    def handler(request):
+        chamadas.append(request.url.path)
+        if request.url.path.endswith("/metadados"):
+            return httpx.Response(200, json=metadados)
+        return httpx.Response(
+            200, content=json.dumps(valores, ensure_ascii=False).encode()
+        )
+
+    transport = httpx.MockTransport(handler)
+    gravados = processar_produtos(
+        [2020], db, consultas=[ConsultaProdutos()], transport=transport
+    )
+
+    assert gravados == {2020: 3}
+    assert chamadas[1].endswith("/v/216,214/p/2020/c782/40122,40124")
+    linhas = db.query(
+        ProducaoProdutos.pp_produto,
+        ProducaoProdutos.pp_municipio_id,
+        ProducaoProdutos.pp_area,
+        ProducaoProdutos.pp_quantidade,
+    ).order_by(ProducaoProdutos.pp_produto, ProducaoProdutos.pp_municipio_id)
+    assert linhas.all() == [
+        (40122, 1100015, 10, 50),
+        (40124, 1100015, 450, 1350),
+        (40124, 1100023, 0, 0),
+    ]
+
+    # retorno igual ao da última carga: nada é regravado
+    assert processar_produtos(
+        [2020], db, consultas=[ConsultaProdutos()], transport=transport
+    ) == {2020: 0}
@@ -0,0 +1,34 @@
+import asyncio
+import json
+from decimal import Decimal
+
+from src.respostas import padrao_retorno, padrao_retorno_em_partes
+from src.schemas import RetornoProdutividades
+
+
+def test_padrao_retorno_igual_ao_envelope_pydantic():
+    dados = [{"estado": "SP", "produtividade": Decimal("0.00001")}]
+    resposta = padrao_retorno(dados)
+
+    assert json.loads(resposta.body) == RetornoProdutividades(
+        success=True, data=dados
+    ).model_dump(mode="json")
+    assert padrao_retorno({2018: {1100015: 1}}).body == (
+        b'{"success":true,"data":{"2018":{"1100015":1}},"message":""}'
+    )
+
+
+def test_padrao_retorno_em_partes():
+    async def partes():
+        yield [{"ano": 2018}]
+        yield []
+        yield [{"ano": 2019}, {"ano": 2020}]
+
+    async def juntar():
+        return b"".join([parte async for parte in padrao_retorno_em_partes(partes())])
+
+    assert json.loads(asyncio.run(juntar())) == {
+        "success": True,
+        "data": [{"ano": 2018}, {"ano": 2019}, {"ano": 2020}],
+        "message": "",
+    }
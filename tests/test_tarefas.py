@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+
+from src import tarefas
+from src.exceptions import ProcessamentoException
+from src.schemas import ResultadoCarga, SituacaoTarefa
+from src.tarefas import FilaTarefas
+
+
+def test_fila_tarefas_deduplica_anos_e_reporta_progresso(tmp_path):
+    liberar = threading.Event()
+    chamadas = []
+
+    def processar(anos, substituir):
+        chamadas.append(anos)
+        liberar.wait(5)
+        return {
+            ano: (
+                ValueError("falha no SIDRA")
+                if ano == 2019
+                else ResultadoCarga(ano=ano, inseridos=10, atualizados=2)
+            )
+            for ano in anos
+        }
+
+    fila = FilaTarefas(str(tmp_path / "tarefas.sqlite3"), 2, processar)
+    fila.iniciar()
+    primeira = fila.criar([2018])
+    segunda = fila.criar([2018, 2019])
+    assert primeira.situacao != SituacaoTarefa.concluida
+    liberar.set()
+    fila.encerrar(aguardar=True)
+
+    fila = FilaTarefas(str(tmp_path / "tarefas.sqlite3"), 2, processar)
+    fila.iniciar()
+    # 2018 já estava na fila: a segunda tarefa só coloca 2019
+    assert sorted(chamadas) == [[2018], [2019]]
+    primeira = fila.consultar(primeira.id)
+    assert primeira.situacao == SituacaoTarefa.concluida
+    assert (primeira.anos[0].inseridos, primeira.anos[0].atualizados) == (10, 2)
+    assert primeira.anos[0].duracao is not None
+
+    segunda = fila.consultar(segunda.id)
+    assert segunda.situacao == SituacaoTarefa.falhou
+    assert segunda.anos[0].inseridos == 10
+    assert segunda.anos[1].erro == "falha no SIDRA"
+    assert fila.consultar("inexistente") is None
+    fila.encerrar(aguardar=True)
+
+
+def test_fila_tarefas_retoma_anos_interrompidos(tmp_path):
+    caminho = str(tmp_path / "tarefas.sqlite3")
+    fila = FilaTarefas(caminho, 1, lambda anos, substituir: {})
+    fila.iniciar()
+    fila.encerrar(aguardar=True)
+    # simula um processo encerrado no meio da execução do ano
+    with sqlite3.connect(caminho) as conexao:
+        conexao.execute("INSERT INTO tarefas VALUES ('t1', '2024-01-01T00:00:00')")
+        conexao.execute(
+            "INSERT INTO tarefas_anos (tarefa_id, ano, situacao)"
+            " VALUES ('t1', 2020, 'executando')"
+        )
+
+    processados = []
+    fila = FilaTarefas(
+        caminho,
+        1,
+        lambda anos, substituir: processados.append(anos) or {},
+    )
+    fila.iniciar()
+    fila.encerrar(aguardar=True)
+
+    assert processados == [[2020]]
+    fila = FilaTarefas(caminho, 1)
+    fila.iniciar()
+    assert fila.consultar("t1").situacao == SituacaoTarefa.concluida
+    fila.encerrar(aguardar=True)
+
+
+def test_tarefas_criadas_em_outro_processo_sao_executadas(tmp_path):
+    caminho = str(tmp_path / "tarefas.sqlite3")
+    processados = []
+    principal = FilaTarefas(
+        caminho,
+        1,
+        lambda anos, substituir: processados.append(anos) or {},
+    )
+    principal.iniciar()
+    worker = FilaTarefas(caminho, 1)
+    worker.iniciar(executar=False)
+
+    tarefa = worker.criar([2020, 2021])
+    assert processados == []
+    principal.inscrever_pendentes()
+    principal.inscrever_pendentes()
+    principal.encerrar(aguardar=True)
+
+    # os anos da tarefa rodam numa única execução
+    assert processados == [[2020, 2021]]
+    assert worker.consultar(tarefa.id).situacao == SituacaoTarefa.concluida
+    worker.encerrar()
+
+
+def test_substituir_nao_se_junta_a_execucao_normal_do_ano(tmp_path):
+    liberar = threading.Event()
+    chamadas = []
+    em_execucao = []
+
+    def processar(anos, substituir):
+        chamadas.append((anos, substituir, len(em_execucao)))
+        em_execucao.append(anos)
+        liberar.wait(5)
+        em_execucao.remove(anos)
+        return {}
+
+    fila = FilaTarefas(str(tmp_path / "tarefas.sqlite3"), 2, processar)
+    fila.iniciar()
+    normal = fila.criar([2020])
+    troca = fila.criar([2020], substituir=True)
+    liberar.set()
+    fila.encerrar(aguardar=True)
+
+    # execuções separadas, uma de cada vez
+    assert sorted(chamadas) == [([2020], False, 0), ([2020], True, 0)]
+    fila = FilaTarefas(str(tmp_path / "tarefas.sqlite3"), 2, processar)
+    fila.iniciar(executar=False)
+    assert fila.consultar(troca.id).substituir
+    assert not fila.consultar(normal.id).substituir
+    fila.encerrar()
+
+
+def test_falha_dos_produtos_nao_desfaz_o_resultado_do_ano(tmp_path, monkeypatch):
+    class Sessao:
+        def close(self):
+            pass
+
+    def processar_produtos(anos, db):
+        raise ProcessamentoException("Falha ao carregar 1 lote(s) de produtos")
+
+    monkeypatch.setattr(tarefas, "SessionLocal", Sessao)
+    monkeypatch.setattr(
+        tarefas,
+        "processar_anos",
+        lambda anos, db, substituir, recarregar: {
+            2020: ResultadoCarga(ano=2020, inseridos=5),
+            2021: ProcessamentoException("sem dados"),
+        },
+    )
+    monkeypatch.setattr(tarefas, "processar_produtos", processar_produtos)
+    monkeypatch.setattr(tarefas, "recarregar_motor_memoria", lambda db: None)
+
+    fila = FilaTarefas(
+        str(tmp_path / "tarefas.sqlite3"), 1, tarefas.processar_anos_em_sessao
+    )
+    fila.iniciar()
+    tarefa = fila.criar([2020, 2021])
+    fila.encerrar(aguardar=True)
+
+    fila = FilaTarefas(str(tmp_path / "tarefas.sqlite3"), 1)
+    fila.iniciar(executar=False)
+    carregado, falho = fila.consultar(tarefa.id).anos
+    assert carregado.situacao == SituacaoTarefa.concluida
+    assert carregado.inseridos == 5
+    assert carregado.erro_produtos == "Falha ao carregar 1 lote(s) de produtos"
+    assert (falho.situacao, falho.erro, falho.erro_produtos) == (
+        SituacaoTarefa.falhou,
+        "sem dados",
+        None,
+    )
+    fila.encerrar()
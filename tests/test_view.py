@@ -0,0 +1,270 @@
+import asyncio
+
+import pandas as pd
+from databases import Database
+from sqlalchemy import create_engine, event
+
+from src import cargas, view
+from src.cache import AUSENTE, cache_municipios
+from src.database import (
+    Base,
+    CargasSidra,
+    DigestsProducao,
+    Municipios,
+    ProducaoMunicipios,
+    ProducaoProdutos,
+    ProdutividadeEstados,
+    VersoesAnos,
+)
+
+from src.exceptions import ProcessamentoException
+from src.schemas import ResultadoCarga
+from src.service import RetornoSidra
+from src.view import (
+    delete,
+    insert_or_update,
+    montar_matriz_quantidades,
+    substituir_ano,
+)
+
+
+def _ano(ano, linhas):
+    return pd.DataFrame(
+        linhas, columns=["pm_municipio_id", "pm_area", "pm_quantidade"]
+    ).assign(pm_ano=ano)
+
+
+def _produtividade(db, ano):
+    return {
+        linha.estado: (linha.total_area, linha.total_quantidade)
+        for linha in db.query(ProdutividadeEstados).filter_by(pm_ano=ano)
+    }
+
+
+def test_insert_or_update_conta_e_atualiza_produtividade_dos_estados(db):
+    db.add_all(
+        [
+            Municipios(
+                id=1100015, nome="Alta Floresta D'Oeste", uf="RO", uf_id_ibge=11
+            ),
+            Municipios(id=1100023, nome="Ariquemes", uf="RO", uf_id_ibge=11),
+            Municipios(id=4200051, nome="Abdon Batista", uf="SC", uf_id_ibge=42),
+        ]
+    )
+    db.commit()
+
+    resultado = insert_or_update(
+        2018,
+        _ano(2018, [(1100015, 450, 1350), (1100023, 5600, 16800), (4200051, 10, 30)]),
+        db,
+    )
+    assert (resultado.inseridos, resultado.atualizados, resultado.inalterados) == (
+        3,
+        0,
+        0,
+    )
+    assert _produtividade(db, 2018) == {"RO": (6050, 18150), "SC": (10, 30)}
+
+    resultado = insert_or_update(
+        2018,
+        _ano(2018, [(1100015, 450, 1350), (1100023, 5600, 16800), (4200051, 20, 70)]),
+        db,
+    )
+    assert (resultado.inseridos, resultado.atualizados, resultado.inalterados) == (
+        0,
+        1,
+        2,
+    )
+    assert _produtividade(db, 2018) == {"RO": (6050, 18150), "SC": (20, 70)}
+
+    delete(2018, db)
+    assert _produtividade(db, 2018) == {}
+
+
+def test_insert_or_update_pula_ufs_com_mesmo_digest(db):
+    linhas = [(1100015, 450, 1350), (1100023, 5600, 16800), (4200051, 10, 30)]
+    insert_or_update(2018, _ano(2018, linhas), db)
+    assert db.query(DigestsProducao.dp_uf, DigestsProducao.dp_linhas).order_by(
+        DigestsProducao.dp_uf
+    ).all() == [(11, 2), (42, 1)]
+
+    instrucoes = []
+
+    def registrar(conexao, cursor, sql, *args):
+        instrucoes.append(sql)
+
+    event.listen(db.bind, "before_cursor_execute", registrar)
+    try:
+        # ordem diferente, mesmo conteúdo: só o SELECT dos digests
+        resultado = insert_or_update(2018, _ano(2018, linhas[::-1]), db)
+    finally:
+        event.remove(db.bind, "before_cursor_execute", registrar)
+    assert resultado.inalterados == 3
+    assert [sql.split()[0] for sql in instrucoes] == ["SELECT"]
+    assert "digests_producao" in instrucoes[0]
+
+    # linha gravada sem pm_hash é regravada mesmo com os mesmos valores
+    db.query(ProducaoMunicipios).filter_by(pm_municipio_id=1100023).update(
+        {"pm_hash": None}
+    )
+    db.query(DigestsProducao).delete()
+    db.commit()
+    resultado = insert_or_update(2018, _ano(2018, linhas), db)
+    assert (resultado.inseridos, resultado.atualizados, resultado.inalterados) == (
+        0,
+        1,
+        2,
+    )
+    assert (
+        db.query(ProducaoMunicipios.pm_hash).filter_by(pm_municipio_id=1100023).scalar()
+        is not None
+    )
+
+    delete(2018, db)
+    assert db.query(DigestsProducao).count() == 0
+
+
+def test_substituir_ano_troca_o_ano_inteiro(db):
+    insert_or_update(2018, _ano(2018, [(1100015, 450, 1350), (4200051, 10, 30)]), db)
+    insert_or_update(2019, _ano(2019, [(1100015, 1, 3)]), db)
+
+    marca = cache_municipios.marca()
+    cache_municipios.gravar(("municipio", 1100023), [], [], marca)
+    cache_municipios.gravar(("municipio", 4200051), [], [2018], marca)
+    cache_municipios.gravar(("municipio", 1100015), [], [2019], marca)
+
+    resultado = substituir_ano(
+        2018, _ano(2018, [(1100015, 500, 1500), (1100023, 5600, 16800)]), db
+    )
+
+    assert resultado.inseridos == 2
+    linhas = db.query(
+        ProducaoMunicipios.pm_municipio_id,
+        ProducaoMunicipios.pm_ano,
+        ProducaoMunicipios.pm_quantidade,
+    ).order_by(ProducaoMunicipios.pm_ano, ProducaoMunicipios.pm_municipio_id)
+    assert linhas.all() == [
+        (1100015, 2018, 1500),
+        (1100023, 2018, 16800),
+        (1100015, 2019, 3),
+    ]
+    assert db.query(DigestsProducao.dp_uf).filter_by(dp_ano=2018).all() == [(11,)]
+    assert db.query(VersoesAnos.va_versao).filter_by(va_ano=2018).scalar() == 2
+    # municípios que entraram, saíram ou mudaram no ano
+    for municipio_id in (1100023, 4200051, 1100015):
+        assert cache_municipios.obter(("municipio", municipio_id)) is AUSENTE
+    # o digest gravado é o da troca: a mesma carga não altera nada
+    resultado = insert_or_update(
+        2018, _ano(2018, [(1100015, 500, 1500), (1100023, 5600, 16800)]), db
+    )
+    assert resultado.inalterados == 2
+
+
+def test_delete_esquece_os_hashes_da_ultima_carga(db):
+    insert_or_update(2018, _ano(2018, [(1100015, 450, 1350)]), db)
+    db.add_all(
+        [
+            ProducaoProdutos(pp_produto=40124, pp_municipio_id=1100015, pp_ano=2018),
+            ProducaoProdutos(pp_produto=40124, pp_municipio_id=1100015, pp_ano=2019),
+        ]
+    )
+    cargas.registrar_processamento(
+        2018,
+        [
+            RetornoSidra("t5457-v216-p2018-c782-40124", "a", None),
+            RetornoSidra("t5457-v214-p2018-c782-40124", "b", None),
+            RetornoSidra("t5457-v216-214-p2018-c782-0123456789ab", "c", None),
+        ],
+        db,
+    )
+    cargas.registrar_processamento(
+        2019, [RetornoSidra("t5457-v216-p2019-c782-40124", "d", None)], db
+    )
+
+    delete(2018, db)
+
+    # os mesmos payloads de 2018 não são mais ignorados; 2019 continua
+    assert db.query(CargasSidra.cs_chave).all() == [("t5457-v216-p2019-c782-40124",)]
+    assert db.query(ProducaoProdutos.pp_ano).all() == [(2019,)]
+
+
+def test_processar_anos_consulta_e_recarrega_uma_vez(db, monkeypatch):
+    consultas = []
+    recargas = []
+    monkeypatch.setattr(
+        view,
+        "consultar_plantacoes",
+        lambda anos: consultas.append(anos)
+        or {
+            ano: {216: ValueError("timeout") if ano == 2019 else "area", 214: "qtd"}
+            for ano in anos
+        },
+    )
+    monkeypatch.setattr(
+        view,
+        "processar_ano",
+        lambda ano, *args: ResultadoCarga(ano=ano) if ano == 2018 else None,
+    )
+    monkeypatch.setattr(view, "recarregar_motor_memoria", recargas.append)
+
+    resultados = view.processar_anos([2018, 2019, 2020], db)
+
+    assert consultas == [[2018, 2019, 2020]]
+    assert recargas == [db]
+    assert resultados[2018] == ResultadoCarga(ano=2018)
+    assert isinstance(resultados[2019], ProcessamentoException)
+    assert "Não há dados" in str(resultados[2020])
+
+
+def test_montar_matriz_quantidades():
+    linhas = [
+        (1100023, 2018, 10, 16800),
+        (1100015, 2019, 3, 1500),
+        (1100015, 2018, 3, 1350),
+    ]
+
+    assert montar_matriz_quantidades(linhas) == {
+        2018: {1100015: 1350, 1100023: 16800},
+        2019: {1100015: 1500, 1100023: None},
+    }
+    assert montar_matriz_quantidades([]) == {}
+
+
+def test_get_producao_em_lote_divide_codigos_em_blocos(monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path / 'lote.sqlite3'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        conexao.execute(
+            ProducaoMunicipios.__table__.insert(),
+            [
+                {
+                    "pm_municipio_id": municipio,
+                    "pm_ano": ano,
+                    "pm_area": 1,
+                    "pm_quantidade": 2,
+                }
+                for municipio in (1100015, 1100023, 1100031, 3550308)
+                for ano in (2018, 2019)
+            ],
+        )
+    engine.dispose()
+    monkeypatch.setattr(view, "TAMANHO_BLOCO_IN", 2)
+
+    async def consultar(*args):
+        database = Database(url)
+        await database.connect()
+        try:
+            return [bloco async for bloco in view.get_producao_em_lote(*args, database)]
+        finally:
+            await database.disconnect()
+
+    blocos = asyncio.run(
+        consultar([1100031, 3550308, 1100015, 9999999], None, range(2019, 2020))
+    )
+    assert [[linha["municipio_id"] for linha in bloco] for bloco in blocos] == [
+        [1100015, 1100031],
+        [3550308],
+    ]
+    blocos = asyncio.run(consultar(None, 11, range(2018, 2020)))
+    assert sum(len(bloco) for bloco in blocos) == 6